@@ -0,0 +1,56 @@
+import asyncio
+import time
+from machine import Pin, SPI
+from lora import LoRa
+from lora_async import AsyncLoRa
+
+# LoRa PINs (same wiring as mbx-mon)
+LORA_EN = 15
+LORA_MISO = 16
+LORA_CS = 17
+LORA_SCK = 18
+LORA_MOSI = 19
+LORA_RST = 20
+LORA_G0 = 21  # DIO0
+
+en = Pin(LORA_EN, Pin.OUT, value=1)
+cs = Pin(LORA_CS, Pin.OUT, value=1)
+rst = Pin(LORA_RST, Pin.OUT)
+rx = Pin(LORA_G0, Pin.IN, Pin.PULL_DOWN)
+
+rst.value(0); time.sleep(0.1)
+rst.value(1); time.sleep(0.1)
+
+spi = SPI(0, baudrate=1_000_000, polarity=0, phase=0,
+          sck=Pin(LORA_SCK), mosi=Pin(LORA_MOSI), miso=Pin(LORA_MISO))
+lora = LoRa(spi, cs=cs, rx=rx, frequency=915.0, crc=True)
+alora = AsyncLoRa(lora)
+
+async def blink(led):
+    """Keeps blinking while the radio sends and receives"""
+    while True:
+        led.on()
+        await asyncio.sleep_ms(5)
+        led.off()
+        await asyncio.sleep_ms(500)
+
+async def sender():
+    n = 0
+    while True:
+        n += 1
+        await alora.send_async(f"ping #{n}")
+        print(f"Sent ping #{n}")
+        await asyncio.sleep_ms(5000)
+
+async def receiver():
+    async for pkt in alora.packets():
+        print(f"Received: {pkt}")
+
+async def main():
+    alora.recv()
+    asyncio.create_task(blink(Pin("LED", Pin.OUT)))
+    asyncio.create_task(sender())
+    await receiver()
+
+# Run it
+asyncio.run(main())
@@ -43,6 +43,8 @@ def main() -> None:
     logger.debug("main", f"Now debug appears: {'A'} {'B'}")
     # pre-format kwargs into the message using f-string
     logger.error("main", f"An error occurred: {'boom'}")
+    # lazy: formatted only when the level lets it through
+    logger.debug("main", "Lazy debug: {} {}", "A", 1)
 
     print("\n== named logger ==")
     named = get_logger(level=Logger.DEBUG)
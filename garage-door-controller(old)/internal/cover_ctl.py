@@ -3,7 +3,7 @@ import micropython
 import time
 from machine import Pin
 from internal.logging import Logger
-from internal.ha_api import HAClient
+from internal.ha_async import AsyncHAClient
 from config import GDO_RUN_ENTITY_ID
 
 class CoverCtl:
@@ -18,7 +18,7 @@ class CoverCtl:
         bar (str): todo bar
     """
     logger: Logger
-    ha_client: HAClient
+    ha_client: AsyncHAClient
     is_locked: bool
     od_cover_btn: Pin
     od_cover_led: Pin
@@ -33,7 +33,7 @@ class CoverCtl:
 
     def __init__(self,
                  logger: Logger,
-                 ha_client: HAClient,
+                 ha_client: AsyncHAClient,
                  od_cover_btn: Pin,
                  od_cover_led: Pin,
                  id_cover_btn: Pin,
@@ -41,16 +41,23 @@ class CoverCtl:
                  lock_led: Pin,
                  run_led: Pin,
                  cvr_open_led: Pin,
+                 refresh_ms: int = 20_000,
                  ) -> None:
         """
         Initializes the cover controller
+
+        refresh_ms: How often the door state is re-read from HA while no
+        button is pressed. Shorter than the client's cache TTL, a press
+        then acts on the cached state without waiting for HA.
         """
         # Logger
         self.logger = logger
 
 
-        # HA Client
+        # HA Client, the button handlers only set the flag, run() talks to HA
         self.ha_client = ha_client
+        self.toggle_flag = asyncio.ThreadSafeFlag()
+        self.refresh_ms = refresh_ms
 
         # Locked by default
         self.is_locked = True
@@ -129,7 +136,7 @@ class CoverCtl:
             self.logger.info("CoverCtl.od_cover_btn_handler","🔒 LOCKED outdoor cover is not enabled when door is locked")
         else:
             self.logger.info("CoverCtl.od_cover_btn_handler","🕹️ TOGGLE outdoor cover")
-            self.toggle_cover()
+            self.toggle_flag.set()
 
     def id_cover_btn_irq(self, pin):
         """IRQ-safe handler: schedule main-context work"""
@@ -147,13 +154,36 @@ class CoverCtl:
 
         self.logger.info("CoverCtl.id_cover_btn_handler",f"👉 PRESS indoor cover button pressed")
         self.logger.info("CoverCtl.od_cover_btn_handler","🕹️ TOGGLE indoor cover")
-        self.toggle_cover() 
+        self.toggle_flag.set()
         
-
-    def toggle_cover(self)->None:
+    async def run(self) -> None:
+        """Toggle the cover when a button asks for it. Presses while HA is
+        being asked count once. In between, keep the cached door state
+        (and the open LED) in step with HA."""
+        while True:
+            try:
+                await asyncio.wait_for_ms(self.toggle_flag.wait(), self.refresh_ms)
+            except asyncio.TimeoutError:
+                await self.refresh()
+                continue
+            await self.toggle_cover()
+
+    def state_changed(self, entity_id: str, state: str) -> None:
+        """HAWebSocket on_change: the door state changed, in HA or here"""
+        if entity_id == GDO_RUN_ENTITY_ID:
+            self.cvr_open_led.value(state == "on")
+
+    async def refresh(self) -> None:
+        """Re-read the door state from HA, it may have changed elsewhere.
+        No request while HAWebSocket keeps the cached state live."""
+        is_open,err = await self.ha_client.get_state(GDO_RUN_ENTITY_ID, max_age_ms=0)
+        if err is None:
+            self.cvr_open_led.value(is_open)
+
+    async def toggle_cover(self)->None:
         self.logger.info("CoverCtl.toggle_cover","Get state of entity_id: {GDO_RUN_ENTITY_ID}")
         
-        is_open,err = self.ha_client.get_state(GDO_RUN_ENTITY_ID)
+        is_open,err = await self.ha_client.get_state(GDO_RUN_ENTITY_ID)
 
         if err:
             self.logger.info("CoverCtl.toggle_cover","Oops! Something went wrong, do nothing, err: {err}")
@@ -162,9 +192,9 @@ class CoverCtl:
         if is_open:
             self.logger.info("CoverCtl.toggle_cover","Send CLOSE to HA")
             self.cvr_open_led.off()
-            self.ha_client.set_toggle_state(False)
+            await self.ha_client.set_toggle_state(False)
         else:
             self.logger.info("CoverCtl.toggle_cover","Send OPEN to HA")
             self.cvr_open_led.on()
-            self.ha_client.set_toggle_state(True)
+            await self.ha_client.set_toggle_state(True)
         
\ No newline at end of file
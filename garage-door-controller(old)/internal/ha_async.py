@@ -0,0 +1 @@
+../../shared/ha_async.py
\ No newline at end of file
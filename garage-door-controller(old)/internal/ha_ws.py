@@ -0,0 +1 @@
+../../shared/ha_ws.py
\ No newline at end of file
@@ -0,0 +1 @@
+../../shared/http_async.py
\ No newline at end of file
@@ -0,0 +1 @@
+../../shared/http_client.py
\ No newline at end of file
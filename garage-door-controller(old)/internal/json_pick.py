@@ -0,0 +1 @@
+../../shared/json_pick.py
\ No newline at end of file
@@ -1,7 +1,7 @@
-import time
-from machine import Pin, PWM
-from internal.ha_api import HAClient
+from machine import Pin
+from internal.ha_async import AsyncHAClient
 from internal.logging import Logger
+from internal.leds import LedPatterns, WINK, CONNECTING
 from config import GDO_RUN_ENTITY_ID
 
 def status(logger: Logger,
@@ -11,56 +11,42 @@ def status(logger: Logger,
            run_led: Pin,
            od_cvr_led: Pin) -> None:
 
-  logger.debug("util.status",f"cvr_open_led: {cvr_open_led.value()}")
-  logger.debug("util.status",f"tracking_led: {tracking_led.value()}")
-  logger.debug("util.status",f"lock_led: {lock_led.value()}")
-  logger.debug("util.status",f"run_led: {run_led.value()}")
-  logger.debug("util.status",f"od_cvr_led: {od_cvr_led.value()}")
+  logger.debug("util.status","cvr_open_led: {}",cvr_open_led.value())
+  logger.debug("util.status","tracking_led: {}",tracking_led.value())
+  logger.debug("util.status","lock_led: {}",lock_led.value())
+  logger.debug("util.status","run_led: {}",run_led.value())
+  logger.debug("util.status","od_cvr_led: {}",od_cvr_led.value())
   logger.debug("util.status","---------------------------------------------------")
 
-def wink(led: Pin) -> None:
-  led.on()
-  time.sleep(0.2)
-  led.off()
+def wink(leds: LedPatterns, led: Pin, delay_ms: int = 0) -> None:
+  # Played by the leds task, returns right away
+  leds.play(led, WINK, delay_ms=delay_ms)
 
-def connect_wifi(
-    ha_client: HAClient, 
-    led: Pin, 
-    pwm: PWM) -> None:
+async def connect_wifi(
+    ha_client: AsyncHAClient, 
+    leds: LedPatterns, 
+    led: Pin) -> None:
 
-  # Try to connect
-  if ha_client.connect_wifi():
-    pwm.deinit()
-    led.off()
-  else:
+  # Blink while connecting, the leds task keeps running
+  leds.play(led, CONNECTING, repeat=True)
+  connected = await ha_client.connect_wifi()
+  leds.stop(led)
+  if not connected:
     raise Exception("Unable to connect to WiFi!") 
 
-def connect_ha(ha_client: HAClient, led: Pin, pwm: PWM) -> None:
+async def connect_ha(ha_client: AsyncHAClient, leds: LedPatterns, led: Pin) -> None:
 
-  data, err = ha_client.get_state(entity_id=GDO_RUN_ENTITY_ID)
-  
+  leds.play(led, CONNECTING, repeat=True)
+  data, err = await ha_client.get_state(entity_id=GDO_RUN_ENTITY_ID)
+  leds.stop(led)
 
   if err is not None:
     raise Exception(f"Unable to connect to HA entity: {GDO_RUN_ENTITY_ID} error: {err}")
-  else:
-    pwm.deinit()
-    led.off()
 
-def stop_pwm(pwm: PWM, pin: Pin) -> None:
-  # Best-effort: deinit PWM, reconfigure pin as output and drive it low
-  try:
-    pwm.deinit()
-  except Exception:
-    pass
-  try:
-    pin.init(Pin.OUT)
-  except Exception:
-    pass
-  pin.off()
-
-def startup(
+async def startup(
 		logger: Logger,
-    ha_client: HAClient,
+    ha_client: AsyncHAClient,
+    leds: LedPatterns,
 		cvr_open_led: Pin,
 		tracking_led: Pin,
 		lock_led: Pin,
@@ -76,39 +62,21 @@ def startup(
   run_led.off()
   od_cvr_led.off()
 
-  logger.info("startup","Cover Open LED")
-  wink(cvr_open_led)
-
-  logger.info("startup","Tracking LED")
-  wink(tracking_led)
-
-  logger.info("startup","Lock LED")
-  wink(lock_led)
-
-  logger.info("startup","Run LED")
-  wink(run_led)
-
-  logger.info("startup","Outdoor Cover LED")
-  wink(od_cvr_led)
+  # Wink the LEDs one after the other: Cover Open, Tracking, Lock, Run, Outdoor Cover
+  logger.info("startup","Wink LEDs")
+  for i, led in enumerate((cvr_open_led, tracking_led, lock_led, run_led, od_cvr_led)):
+    wink(leds, led, delay_ms=i * 200)
+  # Other tasks run meanwhile, the WiFi/HA connects below do not block either
+  await leds.wait()
 
   logger.info("startup","Connecting to WiFi...")
-  pwm1 = PWM(od_cvr_led)
-  pwm1.init(freq=10,duty_u16=32768) # ~50% duty (0..65535)
-  connect_wifi(ha_client, od_cvr_led, pwm1)
+  await connect_wifi(ha_client, leds, od_cvr_led)
   logger.info("startup","Connected to WiFi...")
 
   logger.info("startup","Connecting to HA...")
-  pwm2 = PWM(run_led)
-  pwm2.init(freq=10,duty_u16=32768) # ~50% duty (0..65535)
-  connect_ha(ha_client, run_led, pwm2)
+  await connect_ha(ha_client, leds, run_led)
   logger.info("startup","Connected to HA!")
 
-  # Ensure PWMs are stopped and pins driven low
-  logger.info("startup","Turn off od_cvr_led")
-  stop_pwm(pwm1, od_cvr_led)
-  logger.info("startup","Turn off run_led")
-  stop_pwm(pwm2, run_led)
-
   # All off
   logger.info("startup","🧨 ALL Off")
   cvr_open_led.off()
@@ -1,11 +1,13 @@
 import asyncio
 import machine
-import time
 from machine import Pin
 from internal.logging import get_logger, Logger
 from internal.cover_ctl import CoverCtl
-from internal.ha_api import HAClient
+from internal.ha_async import AsyncHAClient
+from internal.ha_ws import HAWebSocket
+from internal.leds import LedPatterns
 import internal.util as util
+from config import GDO_RUN_ENTITY_ID
 
 
 #
@@ -43,13 +45,18 @@ async def main():
   logger.set_level(Logger.INFO)
   logger.info("main","Start")
 
-  # Create HA Client
-  ha_client = HAClient(logger=logger)
+  # Create HA Client, its calls do not block the loop
+  ha_client = AsyncHAClient(logger=logger)
+
+  # One task drives all LED patterns
+  leds = LedPatterns()
+  asyncio.create_task(leds.run())
 
   # Startup
-  util.startup(
+  await util.startup(
      logger=logger,
      ha_client=ha_client,
+     leds=leds,
      cvr_open_led=cvr_open_led,
      tracking_led=tracking_led,
      lock_led=lock_led,
@@ -69,6 +76,12 @@ async def main():
      lock_led=lock_led,
      run_led=run_led,
      cvr_open_led=cvr_open_led)
+  asyncio.create_task(cover.run())
+
+  # HA pushes the door state, toggles act on it without asking first
+  ha_ws = HAWebSocket(logger, ha_client.cache, [GDO_RUN_ENTITY_ID],
+                      on_change=cover.state_changed)
+  asyncio.create_task(ha_ws.run())
   
   # Run forever
   while True:
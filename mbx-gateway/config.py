@@ -0,0 +1,5 @@
+WIFI_SSID = "BBH-IOT"
+# WIFI_PASSWORD  - see config_private.py
+
+HA_URL = "http://192.168.40.12:8123"
+# HA_TOKEN - see config_private.py
@@ -0,0 +1 @@
+../../shared/ha_cache.py
\ No newline at end of file
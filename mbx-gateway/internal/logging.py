@@ -0,0 +1 @@
+../../shared/logging.py
\ No newline at end of file
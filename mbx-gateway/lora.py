@@ -0,0 +1 @@
+../shared/lora.py
\ No newline at end of file
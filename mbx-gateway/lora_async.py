@@ -0,0 +1 @@
+../shared/lora_async.py
\ No newline at end of file
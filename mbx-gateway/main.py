@@ -0,0 +1,88 @@
+"""
+Mailbox Gateway, receives the LoRa frames of the mailbox monitors and
+forwards their state to HA. Runs on a Pico W wired like mbx-mon.
+"""
+
+import asyncio
+import time
+from machine import Pin, SPI
+from lora import LoRa
+from lora_async import AsyncLoRa
+from internal.logging import get_logger, Logger, RingSink
+from internal.ha_async import AsyncHAClient
+from log_ship import ShipSink, ha_sender
+from mbxgw import MbxGateway
+
+# Logger
+logger = get_logger()
+logger.set_level(Logger.INFO)
+# The last lines stay in RAM, logger.sinks[1].dump() from the REPL
+logger.add_sink(RingSink(64))
+logger.info("global","Start")
+
+# LoRa PINs
+LORA_EN = 15
+LORA_MISO = 16
+LORA_CS = 17
+LORA_SCK = 18
+LORA_MOSI = 19
+LORA_RST = 20
+LORA_G0 = 21  # RX pin
+
+# Configure pins
+en = Pin(LORA_EN, Pin.OUT, value=1)
+cs = Pin(LORA_CS, Pin.OUT, value=1)
+rst = Pin(LORA_RST, Pin.OUT)
+rx = Pin(LORA_G0, Pin.IN, Pin.PULL_DOWN)
+
+# LED pins
+led_onboard = Pin("LED", Pin.OUT)
+
+# Reset
+rst.value(0); time.sleep(0.1)
+rst.value(1); time.sleep(0.1)
+
+# Configure SPI bus
+logger.info("global","Configure SPI bus")
+spi = SPI(0,
+          baudrate=1_000_000,
+          polarity=0,
+          phase=0,
+          sck=Pin(LORA_SCK),
+          mosi=Pin(LORA_MOSI),
+          miso=Pin(LORA_MISO))
+
+# Initialize LoRa module
+logger.info("global","Initialize LoRa module")
+# LoRa parameters must match the monitors
+lora = LoRa(spi, cs=cs, rx=rx, rst=rst,
+            frequency=915.0,
+            spreading_factor=10,
+            coding_rate=5,
+            bandwidth=250000,
+            preamble_length=8,
+            sync_word=0x12,
+            crc=True)
+
+# HA client, its requests do not hold up receiving. It logs like we do but
+# not to log_ship, or every batch shipped would queue a line about itself.
+ha_client = AsyncHAClient(logger=Logger(Logger.INFO, logger.sinks[:]))
+
+# Our log and the nodes' log lines go to HA in batches, as mbx_gateway_log events
+log_ship = ShipSink(ha_sender(ha_client, "mbx_gateway_log"))
+logger.add_sink(log_ship)
+
+# Create MbxGateway Instance
+gateway = MbxGateway(
+  log_ship=log_ship,
+  alora=AsyncLoRa(lora),
+  ha_client=ha_client,
+  logger=logger,
+  led=led_onboard)
+
+async def main():
+  if not await ha_client.connect_wifi():
+    raise Exception("Unable to connect to WiFi!")
+  await gateway.run()
+
+asyncio.run(main())
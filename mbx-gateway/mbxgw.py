@@ -0,0 +1,227 @@
+import asyncio
+import time
+from array import array
+from machine import Pin
+from internal.logging import Logger
+from internal.ha_async import AsyncHAClient
+from lora_async import AsyncLoRa
+from lora_reliable import ReliableLink
+from lora_frame import MSG_PING, MSG_MAILBOX, MSG_LOG, records, fields
+from log_ship import ShipSink
+
+# Node table flags
+DIRTY = 0x01    # changed since the last batch went to HA
+ONLINE = 0x02   # heard within offline_ms
+OPEN = 0x04     # mailbox door open in its last report
+
+class MbxGateway:
+  """
+  MbxGateway - receives the frames of all mailbox monitors and forwards their state to HA
+
+  Frames arrive through a ReliableLink, which acks the ones that ask for it
+  (with the RSSI/SNR they were heard with) and drops retransmissions, so
+  every frame is handled once per node/sequence number. Each node has a
+  slot in a fixed-size table of arrays (last seen, RSSI, SNR, frame count,
+  last ping, door opens); a slot is flagged DIRTY when it changes and every batch_ms
+  all dirty nodes go to HA in one event, so a burst of packets costs one
+  HTTP request. Log lines the nodes ship (MSG_LOG) are logged as
+  "node: line"; with a log_ship its queued lines go to HA after each
+  batch. The HA requests are awaited, frames keep being received and
+  acked meanwhile; a record that does not parse is counted and skipped,
+  and the link task is restarted should it end.
+
+  Attributes:
+    ids (bytearray): Node id per slot, 0 for a free slot (0 is the gateway).
+    seen_ms (array): ticks_ms a node was last heard.
+    rssi (array): RSSI of its last frame, dBm.
+    snr (array): SNR of its last frame, 1/4 dB.
+    frames (array): Frames received from it (wraps at 65536).
+    ping (array): Its last ping counter.
+    opens (array): Mailbox door openings it reported (wraps at 65536).
+    flags (bytearray): DIRTY, ONLINE and OPEN per slot.
+    batches (int): Events sent to HA.
+    updates (int): Node updates in those events.
+    bad_records (int): Records of new frames that did not parse.
+    link_restarts (int): Times the link task ended and was started again.
+  """
+
+  logger: Logger
+  ha_client: AsyncHAClient
+  link: ReliableLink
+  led: Pin
+  log_ship: ShipSink
+
+  def __init__(self,
+               alora: AsyncLoRa,
+               ha_client: AsyncHAClient,
+               logger: Logger,
+               led: Pin,
+               node_id: int = 0,
+               max_nodes: int = 16,
+               batch_ms: int = 10_000,
+               offline_ms: int = 3_600_000,
+               event_type: str = "mbx_gateway",
+               log_ship: ShipSink = None,
+               ) -> None:
+    """
+    Initializes the gateway
+
+    Args:
+      alora (AsyncLoRa): The radio.
+      ha_client (AsyncHAClient): Connected Home Assistant client.
+      logger (Logger): Logger.
+      led (Pin): Blinks on every new frame.
+      node_id (int): Our id in ACKs.
+      max_nodes (int): Size of the node table; when it is full the node
+        heard least recently is replaced.
+      batch_ms (int): How often dirty nodes are forwarded to HA.
+      offline_ms (int): Silence after which a node is reported offline.
+      event_type (str): HA event fired with {"nodes": [...]}.
+      log_ship (ShipSink): Sink of our logger shipped (ship_async) after every batch.
+    """
+    self.logger = logger
+    self.ha_client = ha_client
+    self.led = led
+    self.batch_ms = batch_ms
+    self.offline_ms = offline_ms
+    self.event_type = event_type
+    self.log_ship = log_ship
+    self.link = ReliableLink(alora, node_id, max_peers=max_nodes, on_frame=self.on_frame)
+
+    self.ids = bytearray(max_nodes)
+    self.seen_ms = array('L', [0] * max_nodes)
+    self.rssi = array('h', [0] * max_nodes)
+    self.snr = array('b', [0] * max_nodes)
+    self.frames = array('H', [0] * max_nodes)
+    self.ping = array('H', [0] * max_nodes)
+    self.opens = array('H', [0] * max_nodes)
+    self.flags = bytearray(max_nodes)
+    self.batches = 0
+    self.updates = 0
+    self.bad_records = 0
+    self.link_restarts = 0
+
+  def slot(self, node: int) -> int:
+    """Table slot of node, allocating (or recycling) one if it is new"""
+    ids = self.ids
+    free = -1
+    for i in range(len(ids)):
+      if ids[i] == node:
+        return i
+      if free < 0 and ids[i] == 0:
+        free = i
+    if free < 0:
+      # Full: recycle the node heard least recently
+      now = time.ticks_ms()
+      free = 0
+      for i in range(1, len(ids)):
+        if time.ticks_diff(now, self.seen_ms[i]) > time.ticks_diff(now, self.seen_ms[free]):
+          free = i
+      self.logger.info("MbxGateway.slot","Node table full, dropping node {}",ids[free])
+    ids[free] = node
+    self.frames[free] = 0
+    self.ping[free] = 0
+    self.opens[free] = 0
+    self.flags[free] = 0
+    return free
+
+  def on_frame(self, node: int, seq: int, frame) -> None:
+    """Called by the link for every new (not duplicate) frame"""
+    if node == 0:
+      return
+    i = self.slot(node)
+    peer = self.link.peers[node]
+    self.seen_ms[i] = peer.last_ms
+    self.rssi[i] = peer.rssi
+    self.snr[i] = int(peer.snr * 4)
+    self.frames[i] = (self.frames[i] + 1) & 0xffff
+    for msg_type, data in records(frame):
+      try:
+        if msg_type == MSG_PING:
+          self.ping[i] = fields(MSG_PING, data)[0]
+        elif msg_type == MSG_MAILBOX:
+          is_open, changes, opens = fields(MSG_MAILBOX, data)
+          self.flags[i] = (self.flags[i] | OPEN) if is_open else (self.flags[i] & ~OPEN)
+          if opens != self.opens[i]:
+            self.logger.info("MbxGateway.on_frame","📬 Node {} mailbox opened, {} opens",node,opens)
+          self.opens[i] = opens
+        elif msg_type == MSG_LOG:
+          self.logger.info("MbxGateway.node","{}: {}",node,bytes(data).decode())
+      except ValueError:
+        # Too short for its type, or not UTF-8 (UnicodeError); the other
+        # records of the frame still count
+        self.bad_records += 1
+    if not self.flags[i] & ONLINE:
+      self.logger.info("MbxGateway.on_frame","📬 Node {} online, RSSI {} dBm SNR {} dB",node,peer.rssi,peer.snr)
+    self.flags[i] |= DIRTY | ONLINE
+    self.led.toggle()
+
+  def check_offline(self) -> None:
+    """Flag nodes that have been silent for offline_ms"""
+    now = time.ticks_ms()
+    for i in range(len(self.ids)):
+      if self.ids[i] and self.flags[i] & ONLINE and time.ticks_diff(now, self.seen_ms[i]) > self.offline_ms:
+        self.logger.info("MbxGateway.check_offline","📭 Node {} offline",self.ids[i])
+        self.flags[i] = (self.flags[i] & ~ONLINE) | DIRTY
+
+  async def forward(self) -> int:
+    """Send all dirty nodes to HA in one event. Returns the number sent;
+    on failure they stay dirty and go with the next batch."""
+    now = time.ticks_ms()
+    nodes = []
+    slots = []
+    for i in range(len(self.ids)):
+      if self.ids[i] and self.flags[i] & DIRTY:
+        slots.append(i)
+        nodes.append({
+          "node": self.ids[i],
+          "online": bool(self.flags[i] & ONLINE),
+          "seen_s": time.ticks_diff(now, self.seen_ms[i]) // 1000,
+          "rssi": self.rssi[i],
+          "snr": self.snr[i] * 0.25,
+          "frames": self.frames[i],
+          "ping": self.ping[i],
+          "open": bool(self.flags[i] & OPEN),
+          "opens": self.opens[i],
+        })
+    if not nodes:
+      return 0
+    # Clean before awaiting: frames received meanwhile dirty their node again
+    for i in slots:
+      self.flags[i] &= ~DIRTY
+    if not await self.ha_client.fire_event(self.event_type, {"nodes": nodes}):
+      for i in slots:
+        self.flags[i] |= DIRTY
+      return 0
+    self.batches += 1
+    self.updates += len(nodes)
+    return len(nodes)
+
+  async def receive(self) -> None:
+    """Run the link, starting it again whenever it ends"""
+    while True:
+      try:
+        await self.link.run()
+        self.logger.error("MbxGateway.receive","Link task ended")
+      except Exception as e:
+        self.logger.error("MbxGateway.receive","Link task failed: {}",e)
+      self.link_restarts += 1
+      self.link.alora.recv()
+      await asyncio.sleep_ms(100)
+
+  async def run(self) -> None:
+    """Receive forever, forwarding a batch every batch_ms"""
+    self.logger.info("MbxGateway.run","Start receiving")
+    self.link.alora.recv()
+    asyncio.create_task(self.receive())
+    while True:
+      await asyncio.sleep_ms(self.batch_ms)
+      self.check_offline()
+      # Awaited: the link task keeps acking while HA answers
+      sent = await self.forward()
+      if sent:
+        self.logger.info("MbxGateway.run","🏠 Forwarded {} nodes to HA",sent)
+      if self.log_ship:
+        await self.log_ship.ship_async()
+      if self.logger.enabled(Logger.DEBUG):
+        self.logger.debug("MbxGateway.run","frames, duplicates: {}",[(n, p.frames, p.duplicates) for n, p in self.link.peers.items()])
@@ -0,0 +1 @@
+../shared/lora_reliable.py
\ No newline at end of file
@@ -0,0 +1 @@
+../shared/energy.py
\ No newline at end of file
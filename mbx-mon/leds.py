@@ -0,0 +1 @@
+../shared/leds.py
\ No newline at end of file
@@ -0,0 +1 @@
+../shared/log_ship.py
\ No newline at end of file
@@ -0,0 +1 @@
+../shared/lora_adr.py
\ No newline at end of file
@@ -0,0 +1 @@
+../shared/lora_frame.py
\ No newline at end of file
@@ -0,0 +1 @@
+../shared/lora_scheduler.py
\ No newline at end of file
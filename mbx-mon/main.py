@@ -7,12 +7,24 @@ Copy https://github.com/wybiral/micropython-lora/lora.py to lora.py
 import time
 from machine import Pin, SPI
 from lora import LoRa
-from logging import get_logger, Logger
+from lora_scheduler import TxScheduler
+from lora_adr import LinkAdr
+from logging import get_logger, Logger, FileSink
+from log_ship import ShipSink
 from mbxmon import MbxMon
 
+# Id of this monitor in the frames it sends
+NODE_ID = 1
+
 # Logger
 logger = get_logger()
 logger.set_level(Logger.INFO)
+# Runs headless on a battery: keep the log on flash as well, a block at a
+# time, binary (decode with tools/log_decode.py)
+logger.add_sink(FileSink("mbxmon.blog", max_bytes=65536, binary=True))
+# Errors also go to the gateway, in the spare room of frames sent anyway
+log_ship = ShipSink(level=Logger.ERROR, max_bytes=512)
+logger.add_sink(log_ship)
 logger.info("global","Start")
 
 # LoRa PINs
@@ -36,6 +48,9 @@ led_onboard = Pin(25, Pin.OUT)
 led_red = Pin(12, Pin.OUT)
 led_green = Pin(13, Pin.OUT)
 
+# Mailbox door reed switch, pulled up: reads 1 while the door is open
+door = Pin(14, Pin.IN, Pin.PULL_UP)
+
 # Reset
 rst.value(0); time.sleep(0.1)
 rst.value(1); time.sleep(0.1)
@@ -52,20 +67,37 @@ spi = SPI(0,
 
 # Initialize LoRa module
 logger.info("global","Initialize LoRa module")
-lora = LoRa(spi, cs=cs, rx=rx, rst=rst, frequency=915.0)
+# LoRa parameters must match your hub, each register is written once
+lora = LoRa(spi, cs=cs, rx=rx, rst=rst,
+            frequency=915.0,
+            spreading_factor=10,
+            coding_rate=5,
+            bandwidth=250000,
+            preamble_length=8,
+            sync_word=0x12,
+            crc=True)
+
+# Keep the radio within a 1% duty cycle
+scheduler = TxScheduler(lora, duty_cycle=0.01)
 
-# Configure LoRa parameters to match your hub
-lora.set_spreading_factor(10)
-lora.set_coding_rate(5)
-lora.set_bandwidth(250000)
-lora.set_preamble_length(8)
-lora.set_sync_word(0x12)
-lora.set_crc(True)
+# Lower the TX power while the gateway's ACKs report spare link margin.
+# The gateway listens on SF10 only, so the spreading factor stays put.
+adr = LinkAdr(lora, spreading_factor=10, tx_power=17)
 
 # Create MbxMon Instance
 mbxmon = MbxMon(
   logger=logger,
   lora=lora,
+  scheduler=scheduler,
+  adr=adr,
+  # Sleep radio and MCU between frames, on battery
+  low_power=True,
+  # Report door changes, otherwise a heartbeat every 30 minutes
+  door_pin=door,
+  open_level=1,
+  heartbeat_ms=1_800_000,
+  log_ship=log_ship,
+  node_id=NODE_ID,
   led_onboard=led_onboard,
   led_red=led_red,
   led_green=led_green)
@@ -1,14 +1,42 @@
 from logging import Logger
-from lora import LoRa
+from lora import LoRa, PacketRing
+from lora_scheduler import TxScheduler
+from lora_adr import LinkAdr
+from energy import EnergyMeter
+from leds import LedPatterns, BLINK3, FLASH
+from log_ship import ShipSink
+from lora_frame import FrameWriter, FLAG_ACK_REQ, MSG_ACK, MSG_PING, MSG_MAILBOX, MSG_LOG, RECORD_HEADER_LEN, header, records, fields
 from machine import Pin
 import time
 
+# Extra time the radio listens for an ACK beyond the airtime of frame and ACK
+ACK_SLACK_MS = 200
+# Airtime of an ACK frame: header and one MSG_ACK record
+ACK_LEN = 13
+# How often a wait without low_power looks for a wake-up
+WAKE_POLL_MS = 50
+# Pause after a failed loop, doubled while it keeps failing
+ERROR_BACKOFF_MS = 1000
+MAX_ERROR_BACKOFF_MS = 60_000
+
 class MbxMon:
   """
   MbxMon - Mailbox Monitor class used to monitor the mailbox out by the street
   """
 
   logger: Logger
+  scheduler: TxScheduler
+  adr: LinkAdr
+  energy: EnergyMeter
+  leds: LedPatterns
+  log_ship: ShipSink
+  low_power: bool
+  door_pin: Pin
+  door_open: bool
+  min_interval_ms: int
+  frames: FrameWriter
+  seq: int
+  events: list
   led_onboard: Pin
   led_red: Pin
   led_green: Pin
@@ -20,30 +48,273 @@ class MbxMon:
                led_onboard: Pin,
                led_red: Pin,
                led_green: Pin,
+               scheduler: TxScheduler = None,
+               min_interval_ms: int = 1000,
+               node_id: int = 1,
+               max_events: int = 32,
+               adr: LinkAdr = None,
+               low_power: bool = False,
+               wake_pin: Pin = None,
+               report_ms: int = 3_600_000,
+               door_pin: Pin = None,
+               open_level: int = 1,
+               debounce_ms: int = 50,
+               settle_ms: int = 5_000,
+               heartbeat_ms: int = 1_800_000,
+               log_ship: ShipSink = None,
                ) -> None:
     """
     Initializes the MbxMon
+
+    Events go out packed in lora_frame frames within the scheduler's
+    airtime budget. adr tunes SF and power from ACKs, low_power sleeps
+    radio and MCU between frames, door_pin reports the mailbox door with a
+    heartbeat in between, and log_ship lines fill spare frame room.
     """
     self.logger = logger
     self.lora = lora
+    self.scheduler = scheduler if scheduler else TxScheduler(lora)
+    self.min_interval_ms = min_interval_ms
+    self.frames = FrameWriter(node_id)
+    self.seq = 0
+    self.events = []
+    self.max_events = max_events
     self.led_onboard = led_onboard
     self.led_red = led_red
     self.led_green = led_green
+    self.log_ship = log_ship
+    # Blinks are stepped by wait(), between the sleeps
+    self.leds = LedPatterns(max_leds=3)
+
+    # Seq of the frame waiting for an ACK, -1 when none
+    self.adr = adr
+    self.ack_seq = -1
+    self._radio_by = 0
+    if adr:
+      self.acks = PacketRing(2)
+      self.lora.set_rx_ring(self.acks)
+
+    # Completion of non-blocking sends is reported by the DIO0 IRQ, which
+    # only counts it; monitor() logs from the main context
+    self.sent_frames = 0
+    self._sent_logged = 0
+    self.lora.on_tx_done(self.tx_done)
+
+    # Low power
+    self.low_power = low_power
+    self.energy = EnergyMeter(lora)
+    self.report_ms = report_ms
+    self._woken = False
+    if wake_pin:
+      wake_pin.irq(handler=self.wake, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
+
+    # Mailbox door
+    self.door_pin = door_pin
+    self.open_level = open_level
+    self.debounce_ms = debounce_ms
+    self.settle_ms = settle_ms
+    self.heartbeat_ms = heartbeat_ms
+    self.door_open = False
+    self.opens = 0
+    self._door_changes = 0
+    self._door_edge_ms = 0
+    self._sent_ms = time.ticks_ms()
+    if door_pin:
+      self.door_open = door_pin.value() == open_level
+      door_pin.irq(handler=self.door_irq, trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING)
+
+  def wake(self, pin=None) -> None:
+    """IRQ handler of wake_pin: ends the current wait"""
+    self._woken = True
+
+  def door_irq(self, pin) -> None:
+    """IRQ handler of door_pin: count the change and wake the loop, which
+    reads the settled state"""
+    now = time.ticks_ms()
+    # simple debounce: edges within debounce_ms of the last one are bounce
+    if time.ticks_diff(now, self._door_edge_ms) >= self.debounce_ms:
+      self._door_changes += 1
+    self._door_edge_ms = now
+    self._woken = True
+
+  def check_door(self) -> int:
+    """Queue a MSG_MAILBOX once the door has settled after some changes.
+    Returns ms until it settles, 0 when there is nothing pending."""
+    if not self._door_changes:
+      return 0
+    quiet = time.ticks_diff(time.ticks_ms(), self._door_edge_ms)
+    if quiet < self.settle_ms:
+      return self.settle_ms - quiet
+    changes = self._door_changes
+    self._door_changes -= changes
+    was_open = self.door_open
+    self.door_open = self.door_pin.value() == self.open_level
+    # Each open leaves two changes when the door is closed again
+    opens = (changes + (not was_open)) // 2
+    self.opens = (self.opens + opens) & 0xffff
+    self.logger.info("MbxMon.check_door","📬 Door {}, {} changes, {} opens","open" if self.door_open else "closed",changes,self.opens)
+    self.add_event(MSG_MAILBOX, int(self.door_open), min(changes, 255), self.opens)
+    return 0
+
+  def radio_off(self) -> None:
+    """Radio to sleep in low-power mode, standby otherwise"""
+    if self.low_power:
+      self.lora.sleep()
+    else:
+      self.lora.standby()
+
+  def nap(self, ms: int) -> None:
+    """Sleep up to ms (lightsleep in low-power mode), less when an LED
+    pattern has a step due"""
+    led_ms = self.leds.update()
+    if 0 <= led_ms < ms:
+      ms = led_ms
+    if self.low_power:
+      self.energy.lightsleep(ms)
+    else:
+      time.sleep_ms(min(ms, WAKE_POLL_MS))
+
+  def wait(self, ms: int) -> None:
+    """Wait ms, less if woken. In low-power mode lightsleep through it:
+    DIO0 (TxDone, the ACK) and wake_pin edges wake the MCU, and the radio
+    sleeps once the last frame and its ACK are through."""
+    deadline = time.ticks_add(time.ticks_ms(), ms)
+    if self.low_power:
+      while self.lora.tx_busy() or (self.ack_seq >= 0 and not self.acks.any()):
+        left = time.ticks_diff(self._radio_by, time.ticks_ms())
+        if left <= 0:
+          break
+        self.nap(left)
+      if self.ack_seq >= 0:
+        self.check_ack(final=True)
+      elif not self.lora.tx_busy():
+        self.radio_off()
+    left = time.ticks_diff(deadline, time.ticks_ms())
+    while left > 0 and not self._woken:
+      self.nap(left)
+      left = time.ticks_diff(deadline, time.ticks_ms())
+
+  def log_energy(self) -> None:
+    r = self.energy.report()
+    self.logger.info("MbxMon.energy","🔋 {} s: radio sleep/standby/tx/rx {}/{}/{}/{} ms, "
+                     "mcu run/sleep {}/{} ms, {:.3f} mAh, {:.0f} days on 2000 mAh",
+                     r['elapsed_ms'] // 1000, r['radio_sleep_ms'], r['radio_standby_ms'], r['radio_tx_ms'],
+                     r['radio_rx_ms'], r['mcu_run_ms'], r['mcu_sleep_ms'], r['mah'], self.energy.battery_days(2000))
 
-  def blink_led(self, led: Pin, times=3, duration=0.2):
-      """Blink an LED a specified number of times"""
-      for _ in range(times):
-          led.value(1)
-          time.sleep(duration)
-          led.value(0)
-          time.sleep(duration)
+  def tx_done(self) -> None:
+    """Called (via the DIO0 IRQ) when the radio has finished transmitting.
+    The driver never runs it during SPI of the main context, recv() is safe;
+    logging is not (the sinks may be mid-write), see log_sent()."""
+    self.sent_frames += 1
+    if self.ack_seq >= 0:
+      self.lora.recv()
+
+  def log_sent(self) -> None:
+    """Log the frames tx_done counted since the last call"""
+    n = self.sent_frames - self._sent_logged
+    if n:
+      self._sent_logged += n
+      self.logger.info("MbxMon.tx_done","✅ Sent successfully ({} frames)",n)
+
+  def check_ack(self, final: bool = False) -> bool:
+    """Hand the ACK of the last frame to the ADR. With final (the next
+    frame is about to go out) a missing ACK counts as a lost frame.
+    Returns True when the ADR changed the radio settings."""
+    if self.ack_seq < 0 or self.lora.tx_busy():
+      return False
+    acked = False
+    changed = False
+    while self.acks.any():
+      pkt = self.acks.get()
+      try:
+        header(pkt)
+      except ValueError:
+        continue
+      for msg_type, data in records(pkt):
+        if msg_type == MSG_ACK:
+          node, seq, rssi, snr = fields(MSG_ACK, data)
+          if node == self.frames.node_id and seq == self.ack_seq:
+            acked = True
+            changed = self.adr.on_ack(rssi, snr * 0.25)
+    if not acked:
+      if not final:
+        return False
+      changed = self.adr.on_loss()
+    # Done listening until the next frame
+    self.ack_seq = -1
+    self.radio_off()
+    if changed:
+      self.logger.info("MbxMon.check_ack","📶 ADR: SF{} {} dBm",self.adr.sf,self.adr.tx_power)
+    return changed
+
+  def add_event(self, msg_type: int, *fields) -> None:
+    """Queue an event for the next frame, fields as in lora_frame.FORMATS"""
+    if len(self.events) >= self.max_events:
+      self.events.pop(0)
+    self.events.append((msg_type, fields))
+
+  def send_events(self) -> int:
+    """Send as many pending events as fit in one frame, if the airtime
+    budget allows it now. Returns the number of events sent."""
+    if not self.events or self.lora.tx_busy():
+      return 0
+
+    self.frames.begin(self.seq, FLAG_ACK_REQ if self.adr else 0)
+    n = 0
+    for msg_type, fields in self.events:
+      if not self.frames.add_fields(msg_type, *fields):
+        break
+      n += 1
+
+    frame = self.frames.frame()
+    if self.scheduler.ready_in_ms(len(frame)) != 0:
+      return 0
+
+    # Fill the spare room with queued log lines while the budget covers
+    # about twice the frame, so the next sensor frame is not held up
+    logs = 0
+    ship = self.log_ship
+    while ship:
+      line = ship.peek(logs)
+      if line is None or len(line) > self.frames.space():
+        break
+      if self.scheduler.ready_in_ms(2 * (len(frame) + RECORD_HEADER_LEN + len(line))) != 0:
+        break
+      self.frames.add(MSG_LOG, line)
+      frame = self.frames.frame()
+      logs += 1
+
+    # Settle the previous frame's ACK before this one goes out; if the ADR
+    # moved to a slower SF the frame may have to wait for more budget
+    if self.check_ack(final=True) and self.scheduler.ready_in_ms(len(frame)) != 0:
+      return 0
+
+    # Returns right away, the radio finishes on its own and tx_done runs
+    self.scheduler.submit(bytes(frame))
+    radio_us = self.lora.airtime_us(len(frame))
+    if self.adr:
+      self.ack_seq = self.seq
+      radio_us += self.lora.airtime_us(ACK_LEN)
+    self._radio_by = time.ticks_add(time.ticks_ms(), radio_us // 1000 + ACK_SLACK_MS)
+    self.scheduler.poll()
+    self._sent_ms = time.ticks_ms()
+    del self.events[:n]
+    if logs:
+      ship.drop(logs)
+    self.seq = (self.seq + 1) & 0xffff
+    return n
 
   def monitor(self) -> None:
  
     self.logger.info("MbxMon.monitor","Start monitoring")
-    self.logger.info("MbxMon.monitor","Sending 'ping' every few seconds")
+    if self.door_pin:
+      self.logger.info("MbxMon.monitor","Reporting the door within a {}% duty cycle, heartbeat every {} ms",self.scheduler.duty_cycle * 100,self.heartbeat_ms)
+    else:
+      self.logger.info("MbxMon.monitor","Sending 'ping' within a {}% duty cycle",self.scheduler.duty_cycle * 100)
 
     message_count = 0
+    error_ms = 0
+    report_at = time.ticks_add(time.ticks_ms(), self.report_ms)
 
     # Turn off all LEDs at start
     self.led_onboard.value(0)
@@ -53,22 +324,50 @@ class MbxMon:
     while True:
       try:
 
-        # Create message
-        message_count += 1
-        message = f"ping #{message_count}"
-        
-        # Send message
-        self.logger.info("global",f"✉️ Sending: {message}")
+        # ACK of the last frame, if it came in while sleeping
+        self.log_sent()
+        self.check_ack()
+        self._woken = False
+
+        # Queue a ping, it waits with the other events for airtime budget.
+        # With a door switch the ping is only a heartbeat when all is quiet.
+        settle_ms = 0
+        if self.door_pin:
+          settle_ms = self.check_door()
+          heartbeat = time.ticks_diff(time.ticks_ms(), self._sent_ms) >= self.heartbeat_ms
+        if not self.door_pin or (heartbeat and not self.events):
+          message_count += 1
+          self.add_event(MSG_PING, message_count & 0xffff)
+
+        # Send pending events in one frame if the budget allows
+        sent = self.send_events()
+        if sent:
+          self.logger.info("global","✉️ Sending frame with {} events, last ping #{}",sent,message_count)
 
-        self.lora.send(message)
-        self.logger.info("global","✅ Sent successfully")
+          # Blink onboard LED to indicate transmission, while the radio transmits
+          self.leds.play(self.led_onboard, FLASH if self.low_power else BLINK3)
+          self.logger.debug("MbxMon.monitor","gc runs, total us, max us: {}",self.lora.gc_stats())
 
-        # Blink onboard LED to indicate transmission
-        self.blink_led(self.led_onboard)
+        # Sleep until the budget covers the next frame; with a door switch
+        # until it settles or the heartbeat is due, unless events are waiting
+        if not self.door_pin:
+          wait_ms = max(self.scheduler.ready_in_ms(len(self.frames.frame())), self.min_interval_ms)
+        elif self.events:
+          wait_ms = max(self.scheduler.ready_in_ms(len(self.frames.frame())), settle_ms, WAKE_POLL_MS)
+        else:
+          wait_ms = settle_ms or max(self.heartbeat_ms - time.ticks_diff(time.ticks_ms(), self._sent_ms), WAKE_POLL_MS)
+        self.logger.info("global","💤 ZZZzzz... {} ms",wait_ms)
+        self.wait(wait_ms)
 
-        self.logger.info("global","💤 ZZZzzz...")
-        time.sleep(5)
+        if time.ticks_diff(time.ticks_ms(), report_at) >= 0:
+          report_at = time.ticks_add(report_at, self.report_ms)
+          self.log_energy()
+        error_ms = 0
 
       except Exception as e:
-          self.logger.info("MbxMon.monitor",f"Error: {e}")
-          # blink_led(led_red)
\ No newline at end of file
+          # Every ERROR flushes the file log to flash, don't spin on a
+          # persistent failure
+          error_ms = min(error_ms * 2, MAX_ERROR_BACKOFF_MS) if error_ms else ERROR_BACKOFF_MS
+          self.logger.error("MbxMon.monitor","Error: {}, retrying in {} ms",e,error_ms)
+          time.sleep_ms(error_ms)
+          # self.leds.play(self.led_red, BLINK3)
\ No newline at end of file
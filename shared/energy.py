@@ -0,0 +1,87 @@
+import machine
+import time
+from lora import LoRa
+
+# Typical supply currents in mA, from the SX1276 and Raspberry Pi Pico datasheets
+RADIO_MA = (0.0002, 1.6, 87.0, 11.5)   # sleep, standby, TX at +17 dBm, RX
+MCU_MA = (25.0, 1.3)                   # running, lightsleep
+
+
+class EnergyMeter:
+    """
+    Energy accounting for a battery powered LoRa node.
+
+    The radio's time per operating mode comes from LoRa.mode_times(); MCU
+    time is split into running and lightsleep by doing the sleeping through
+    lightsleep(). Multiplied with typical currents this estimates the charge
+    used and the battery life:
+
+        meter = EnergyMeter(lora)
+        meter.lightsleep(60_000)
+        print(meter.report(), meter.battery_days(2000))
+
+    Attributes:
+        lora (LoRa): The radio.
+        elapsed_ms (int): Time accounted so far.
+        sleep_ms (int): Part of it the MCU spent in lightsleep.
+    """
+
+    lora: LoRa
+
+    def __init__(self, lora: LoRa, radio_ma: tuple = RADIO_MA, mcu_ma: tuple = MCU_MA) -> None:
+        """
+        Args:
+            lora (LoRa): The radio.
+            radio_ma (tuple): Radio current in sleep, standby, TX and RX, mA.
+            mcu_ma (tuple): MCU board current running and in lightsleep, mA.
+        """
+        self.lora = lora
+        self.radio_ma = radio_ma
+        self.mcu_ma = mcu_ma
+        self.elapsed_ms = 0
+        self.sleep_ms = 0
+        self._last = time.ticks_ms()
+        self._radio0 = lora.mode_times()
+
+    def _update(self) -> None:
+        # Accumulate in small steps so ticks_ms wrapping does not matter
+        now = time.ticks_ms()
+        self.elapsed_ms += time.ticks_diff(now, self._last)
+        self._last = now
+
+    def lightsleep(self, ms: int) -> None:
+        """machine.lightsleep(ms), counted as MCU sleep. Pin IRQs (the radio's
+        DIO0, a sensor) end it early."""
+        self._update()
+        t = time.ticks_ms()
+        machine.lightsleep(ms)
+        self.sleep_ms += time.ticks_diff(time.ticks_ms(), t)
+
+    def report(self) -> dict:
+        """ms per state and the charge used in mAh"""
+        self._update()
+        radio = tuple(t - t0 for t, t0 in zip(self.lora.mode_times(), self._radio0))
+        mcu = (self.elapsed_ms - self.sleep_ms, self.sleep_ms)
+        mah = 0.0
+        for ms, ma in zip(radio + mcu, self.radio_ma + self.mcu_ma):
+            mah += ms * ma
+        return {
+            "elapsed_ms": self.elapsed_ms,
+            "radio_sleep_ms": radio[0],
+            "radio_standby_ms": radio[1],
+            "radio_tx_ms": radio[2],
+            "radio_rx_ms": radio[3],
+            "mcu_run_ms": mcu[0],
+            "mcu_sleep_ms": mcu[1],
+            "mah": mah / 3_600_000,
+        }
+
+    def average_ma(self) -> float:
+        """Mean current so far"""
+        r = self.report()
+        return r["mah"] * 3_600_000 / r["elapsed_ms"] if r["elapsed_ms"] else 0.0
+
+    def battery_days(self, capacity_mah: float) -> float:
+        """Days a battery of capacity_mah lasts at the mean current so far"""
+        ma = self.average_ma()
+        return capacity_mah / ma / 24 if ma else 0.0
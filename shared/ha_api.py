@@ -1,21 +1,44 @@
 
 import network
-import urequests
 import time
 from machine import Pin
 from internal.logging import Logger
-from config import WIFI_SSID, HA_URL,GDO_RUN_ENTITY_ID
+from internal.http_client import HttpClient
+from internal.ha_cache import StateCache
+from config import WIFI_SSID, HA_URL
+try:
+  from config import GDO_RUN_ENTITY_ID
+except ImportError:
+  # Only the garage door controller has a toggle entity
+  GDO_RUN_ENTITY_ID = None
 from config_private import WIFI_PASSWORD, HA_TOKEN
 
 class HAClient:
-  """Home Assistant Client"""
+  """Home Assistant Client
+
+  Requests go over kept-alive connections (see HttpClient), so after the
+  first call a button press or event costs one round trip, not a new TCP
+  connection each. get_state answers from `cache` (see StateCache) while
+  the state is fresh, set_toggle_state updates it.
+  """
   led: Pin
   logger: Logger
+  http: HttpClient
+  cache: StateCache
 
-  def __init__(self,logger: Logger,) -> None:
+  def __init__(self,logger: Logger, cache_ttl_ms: int = 30_000) -> None:
       # Logger
       self.logger = logger
 
+      # Entity states, fresh for cache_ttl_ms (0: always ask HA)
+      self.cache = StateCache(cache_ttl_ms)
+
+      # The headers are the same for every call, encoded once
+      self.http = HttpClient(HA_URL, {
+          "Authorization": f"Bearer {HA_TOKEN}",
+          "Content-Type": "application/json"
+      })
+
   def connect_wifi(self) -> bool:
       """Connect to WiFi network"""
       wlan = network.WLAN(network.STA_IF)
@@ -41,84 +64,92 @@ class HAClient:
           self.logger.info("HAClient.connect_wifi",f"✓ Already connected: {wlan.ifconfig()[0]}")
           return True
 
-  def get_state(self, entity_id) -> tuple:
+  def get_state(self, entity_id, max_age_ms: int = None) -> tuple:
     """Get the state of any Home Assistant entity.
 
-    Returns a tuple (data, err). On success `data` is the parsed
-    JSON response and `err` is None. On failure `data` is None and
-    `err` is an Exception describing the failure.
+    Returns a tuple (data, err). On success `data` is True when the
+    state is "on" and `err` is None. On failure `data` is None and
+    `err` is an Exception describing the failure. Only the state is
+    read from the response (see get_fields).
+
+    A cached state younger than max_age_ms (the cache TTL by default)
+    is returned without asking HA; max_age_ms=0 always asks.
+    """
+    state = self.cache.get(entity_id, max_age_ms)
+    if state is not None:
+        self.logger.debug("HAClient.get_state","✓ Cached state of {}: {}",entity_id,state)
+        return state == "on", None
+
+    self.logger.info("HAClient.get_state",f"📡 Getting state of: {entity_id}")
+    data, err = self.get_fields(entity_id, ("state",))
+    if err:
+        return None, err
+    self.cache.put(entity_id, data['state'])
+    self.logger.info("HAClient.get_state",f"✓ State: {data['state']}")
+    if data['state'] == "on":
+      return True, None
+    else:
+      return False, None
+
+  def get_fields(self, entity_id, paths) -> tuple:
+    """Get fields of an entity's state object, e.g. ("state",
+    "attributes.friendly_name"), without the rest.
+
+    The response is parsed as it comes off the socket (see JsonPicker),
+    so large attributes never sit in RAM. Returns a tuple (data, err),
+    data maps each path found to its value.
     """
-    url = f"{HA_URL}/api/states/{entity_id}"
-    headers = {
-        "Authorization": f"Bearer {HA_TOKEN}",
-        "Content-Type": "application/json"
-    }
-    
     try:
-        self.logger.info("HAClient.get_state",f"📡 Getting state of: {entity_id}")
-        response = urequests.get(url, headers=headers, timeout=10)
-        
-        # Print raw response body
-        self.logger.debug("HAClient.get_state",f"Raw Response Body: {response.text}")
-
-        if response.status_code == 200:
-            data = response.json()
-            self.logger.info("HAClient.get_state",f"✓ State: {data['state']}")
-            self.logger.info("HAClient.get_state",f"  Attributes: {data.get('attributes', {})}")
-            response.close()
-            if data['state'] == "on":
-              return True, None
-            else:
-              return False, None
+        status, data = self.http.request("GET", f"/api/states/{entity_id}", pick=paths)
+        self.logger.debug("HAClient.get_fields","Picked: {}",data)
+
+        if status == 200:
+            if not isinstance(data, dict):
+              raise ValueError("response is not JSON")
+            if "state" in paths and "state" not in data:
+              raise ValueError("no state in response")
+            return data, None
         else:
-            err = Exception(f"HTTP {response.status_code}")
-            self.logger.info("HAClient.get_state",f"✗ Error: {err}")
-            response.close()
+            err = Exception(f"HTTP {status}")
+            self.logger.info("HAClient.get_fields",f"✗ Error: {err}")
             return None, err
             
     except Exception as e:
-        self.logger.info("HAClient.get_state",f"✗ Exception: {e}")
+        self.logger.info("HAClient.get_fields",f"✗ Exception: {e}")
         return None, e
 
-  def set_toggle_state(self, is_on: bool):
+  def set_toggle_state(self, is_on: bool, entity_id: str = GDO_RUN_ENTITY_ID):
       """Turn toggel entity on or off in Home Assistant"""
-      
-      headers = {
-          "Authorization": f"Bearer {HA_TOKEN}",
-          "Content-Type": "application/json"
-      }
-      payload = {"entity_id": GDO_RUN_ENTITY_ID}
+      payload = {"entity_id": entity_id}
 
       if is_on:
           self.logger.info("HAClient.set_toggle_state","🟢 ON Send turn_on to HA")
-          url = f"{HA_URL}/api/services/input_boolean/turn_on"
+          path = "/api/services/input_boolean/turn_on"
       else:
           self.logger.info("HAClient.set_toggle_state","🔴 OFF Send turn_off to HA")
-          url = f"{HA_URL}/api/services/input_boolean/turn_off"
+          path = "/api/services/input_boolean/turn_off"
 
       try:
-          response = urequests.post(url, headers=headers, json=payload, timeout=5)
+          status, _ = self.http.request("POST", path, payload)
           
-          if response.status_code == 200:
+          if status == 200:
               self.logger.info("HAClient.set_toggle_state",f"✅ Success!")
-              response.close()
+              # What HA has now, unless changed elsewhere meanwhile
+              self.cache.put(entity_id, "on" if is_on else "off")
               return
           else:
-              self.logger.info("HAClient.set_toggle_state",f"❌ Error: HTTP {response.status_code}")
-              response.close()
+              self.logger.info("HAClient.set_toggle_state",f"❌ Error: HTTP {status}")
+              self.cache.invalidate(entity_id)
               return
               
       except Exception as e:
           self.logger.info("HAClient.set_toggle_state",f"❌ Exception: {e}")
+          # The call may have reached HA, ask next time
+          self.cache.invalidate(entity_id)
           return
 
   def send_notification(self,title, message):
       """Send a notification to the Home Assistant mobile app"""
-      url = f"{HA_URL}/api/services/notify/notify"
-      headers = {
-          "Authorization": f"Bearer {HA_TOKEN}",
-          "Content-Type": "application/json"
-      }
       payload = {
           "title": title,
           "message": message
@@ -126,18 +157,37 @@ class HAClient:
       
       try:
           self.logger.info("HAClient.send_notification",f"📱 Sending notification: {title}")
-          response = urequests.post(url, headers=headers, json=payload, timeout=5)
+          status, _ = self.http.request("POST", "/api/services/notify/notify", payload)
           
-          if response.status_code == 200:
+          if status == 200:
               self.logger.info("HAClient.send_notification",f"✓ Notification sent!")
-              response.close()
               return True
           else:
-              self.logger.info("HAClient.send_notification",f"✗ Error: HTTP {response.status_code}")
-              response.close()
+              self.logger.info("HAClient.send_notification",f"✗ Error: HTTP {status}")
               return False
               
       except Exception as e:
           self.logger.info("HAClient.send_notification",f"✗ Exception: {e}")
           return False
 
+  def fire_event(self, event_type: str, data: dict) -> bool:
+      """Fire an event on the Home Assistant event bus.
+
+      One call carries any amount of data, so a batch of updates costs a
+      single HTTP request; HA automations and trigger-based template
+      sensors pick the values out of the event data.
+      """
+      try:
+          self.logger.info("HAClient.fire_event",f"📡 Firing event: {event_type}")
+          status, _ = self.http.request("POST", f"/api/events/{event_type}", data)
+
+          if status == 200:
+              self.logger.debug("HAClient.fire_event","✓ Event fired!")
+              return True
+          else:
+              self.logger.info("HAClient.fire_event",f"✗ Error: HTTP {status}")
+              return False
+
+      except Exception as e:
+          self.logger.info("HAClient.fire_event",f"✗ Exception: {e}")
+          return False
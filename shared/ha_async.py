@@ -0,0 +1,170 @@
+import asyncio
+import network
+from internal.logging import Logger
+from internal.http_async import AsyncHttpClient
+from internal.ha_cache import StateCache
+from config import WIFI_SSID, HA_URL
+try:
+    from config import GDO_RUN_ENTITY_ID
+except ImportError:
+    # Only the garage door controller has a toggle entity
+    GDO_RUN_ENTITY_ID = None
+from config_private import WIFI_PASSWORD, HA_TOKEN
+
+
+class AsyncHAClient:
+    """
+    Home Assistant client for asyncio programs.
+
+    HAClient with awaitable calls: the requests go over AsyncHttpClient,
+    so while HA answers the other tasks (buttons, LEDs, radio) keep
+    running, and every call has its own deadline instead of blocking for
+    the socket timeout.
+
+        ha_client = AsyncHAClient(logger)
+        await ha_client.connect_wifi()
+        is_on, err = await ha_client.get_state(GDO_RUN_ENTITY_ID)
+        await ha_client.call_service("input_boolean", "turn_on", {"entity_id": ...})
+
+    Failures are logged and returned (False, or err for get_state), like
+    HAClient does; nothing raises. States are cached like HAClient's.
+
+    Attributes:
+        http (AsyncHttpClient): Kept-alive connections to HA.
+        cache (StateCache): Entity states last read or set.
+    """
+
+    logger: Logger
+    http: AsyncHttpClient
+    cache: StateCache
+
+    def __init__(self, logger: Logger, timeout: float = 5, cache_ttl_ms: int = 30_000) -> None:
+        """
+        Args:
+            logger (Logger): Logger.
+            timeout (float): Seconds a call may take, unless it passes its own.
+            cache_ttl_ms (int): How long a state read or set stays fresh,
+                0 to always ask HA.
+        """
+        self.logger = logger
+        self.cache = StateCache(cache_ttl_ms)
+        self.http = AsyncHttpClient(HA_URL, {
+            "Authorization": f"Bearer {HA_TOKEN}",
+            "Content-Type": "application/json"
+        }, timeout=timeout)
+
+    async def connect_wifi(self, timeout_s: int = 10) -> bool:
+        """Connect to WiFi network, polling without blocking the loop"""
+        wlan = network.WLAN(network.STA_IF)
+        wlan.active(True)
+
+        if wlan.isconnected():
+            self.logger.info("AsyncHAClient.connect_wifi", "✓ Already connected: {}", wlan.ifconfig()[0])
+            return True
+
+        self.logger.info("AsyncHAClient.connect_wifi", "Connecting to WiFi...")
+        wlan.connect(WIFI_SSID, WIFI_PASSWORD)
+        for _ in range(timeout_s * 4):
+            if wlan.isconnected():
+                self.logger.info("AsyncHAClient.connect_wifi", "✓ WiFi connected! IP Address: {}", wlan.ifconfig()[0])
+                return True
+            await asyncio.sleep_ms(250)
+        self.logger.info("AsyncHAClient.connect_wifi", "✗ WiFi connection failed")
+        return False
+
+    async def _call(self, source: str, method: str, path: str, data=None, timeout: float = None, pick=None):
+        # (status, body), or (None, exception) after logging it
+        try:
+            return await self.http.request(method, path, data, timeout, pick)
+        except asyncio.TimeoutError as e:
+            self.logger.info(source, "✗ Timeout: {} {}", method, path)
+            return None, e
+        except Exception as e:
+            self.logger.info(source, "✗ Exception: {}", e)
+            return None, e
+
+    async def get_state(self, entity_id: str, timeout: float = None, max_age_ms: int = None) -> tuple:
+        """Get the state of a Home Assistant entity.
+
+        Returns a tuple (is_on, err) like HAClient.get_state: is_on is True
+        when the state is "on", err is None on success and an Exception
+        (asyncio.TimeoutError after timeout) on failure. A cached state
+        younger than max_age_ms (the cache TTL by default) is returned
+        without asking HA; max_age_ms=0 always asks.
+        """
+        state = self.cache.get(entity_id, max_age_ms)
+        if state is not None:
+            self.logger.debug("AsyncHAClient.get_state", "✓ Cached state of {}: {}", entity_id, state)
+            return state == "on", None
+        self.logger.info("AsyncHAClient.get_state", "📡 Getting state of: {}", entity_id)
+        data, err = await self.get_fields(entity_id, ("state",), timeout)
+        if err:
+            return None, err
+        self.cache.put(entity_id, data['state'])
+        self.logger.info("AsyncHAClient.get_state", "✓ State: {}", data['state'])
+        return data['state'] == "on", None
+
+    async def get_fields(self, entity_id: str, paths, timeout: float = None) -> tuple:
+        """Get fields of an entity's state object, e.g. ("state",
+        "attributes.friendly_name"), parsed as they arrive (see JsonPicker).
+        Returns a tuple (data, err), data maps each path found to its value."""
+        status, data = await self._call("AsyncHAClient.get_fields", "GET", f"/api/states/{entity_id}", None, timeout, paths)
+        if status is None:
+            return None, data
+        if status != 200:
+            err = Exception(f"HTTP {status}")
+            self.logger.info("AsyncHAClient.get_fields", "✗ Error: {}", err)
+            return None, err
+        if not isinstance(data, dict):
+            err = ValueError("response is not JSON")
+            self.logger.info("AsyncHAClient.get_fields", "✗ Error: {}", err)
+            return None, err
+        if "state" in paths and "state" not in data:
+            err = ValueError("no state in response")
+            self.logger.info("AsyncHAClient.get_fields", "✗ Error: {}", err)
+            return None, err
+        return data, None
+
+    async def call_service(self, domain: str, service: str, data: dict = None, timeout: float = None) -> bool:
+        """Call a Home Assistant service, True on success. The cached state
+        of the entity_id in data is dropped, the service may change it."""
+        if data and isinstance(data.get("entity_id"), str):
+            self.cache.invalidate(data["entity_id"])
+        status, _ = await self._call("AsyncHAClient.call_service", "POST", f"/api/services/{domain}/{service}", data or {}, timeout)
+        if status == 200:
+            self.logger.info("AsyncHAClient.call_service", "✅ {}.{}", domain, service)
+            return True
+        if status is not None:
+            self.logger.info("AsyncHAClient.call_service", "❌ Error: {}.{} HTTP {}", domain, service, status)
+        return False
+
+    async def set_toggle_state(self, is_on: bool, entity_id: str = GDO_RUN_ENTITY_ID, timeout: float = None) -> bool:
+        """Turn toggle entity on or off in Home Assistant"""
+        if is_on:
+            self.logger.info("AsyncHAClient.set_toggle_state", "🟢 ON Send turn_on to HA")
+        else:
+            self.logger.info("AsyncHAClient.set_toggle_state", "🔴 OFF Send turn_off to HA")
+        ok = await self.call_service("input_boolean", "turn_on" if is_on else "turn_off",
+                                     {"entity_id": entity_id}, timeout)
+        if ok:
+            # What HA has now, unless changed elsewhere meanwhile
+            self.cache.put(entity_id, "on" if is_on else "off")
+        else:
+            # The call may have reached HA, ask next time
+            self.cache.invalidate(entity_id)
+        return ok
+
+    async def notify(self, title: str, message: str, timeout: float = None) -> bool:
+        """Send a notification to the Home Assistant mobile app"""
+        self.logger.info("AsyncHAClient.notify", "📱 Sending notification: {}", title)
+        return await self.call_service("notify", "notify", {"title": title, "message": message}, timeout)
+
+    async def fire_event(self, event_type: str, data: dict, timeout: float = None) -> bool:
+        """Fire an event on the Home Assistant event bus"""
+        self.logger.info("AsyncHAClient.fire_event", "📡 Firing event: {}", event_type)
+        status, _ = await self._call("AsyncHAClient.fire_event", "POST", f"/api/events/{event_type}", data, timeout)
+        if status == 200:
+            return True
+        if status is not None:
+            self.logger.info("AsyncHAClient.fire_event", "✗ Error: HTTP {}", status)
+        return False
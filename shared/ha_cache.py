@@ -0,0 +1,87 @@
+import time
+
+
+class StateCache:
+    """
+    Entity states last read from (or written to) Home Assistant, each good
+    for a TTL.
+
+    HAClient answers get_state from it while the entry is fresh and updates
+    it optimistically after its own service calls, so a toggle can act
+    without a round trip; a refresh now and then (get_state with
+    max_age_ms=0) reconciles it with changes made elsewhere. Entities a
+    subscription keeps current (HAWebSocket) are marked live and stay
+    fresh, whatever their age or max_age_ms, until it ends.
+
+        cache = StateCache(ttl_ms=30_000)
+        cache.set_ttl("sensor.slow", 300_000)
+        cache.put("input_boolean.x", "on")
+        cache.get("input_boolean.x")     # "on", None once expired
+
+    Attributes:
+        hits (int): get() calls answered from the cache.
+        misses (int): get() calls finding no fresh entry.
+    """
+
+    def __init__(self, ttl_ms: int = 30_000) -> None:
+        """
+        Args:
+            ttl_ms (int): How long an entry stays fresh, unless set_ttl()
+                gave the entity its own; 0 disables caching.
+        """
+        self.ttl_ms = ttl_ms
+        self._ttl = {}
+        self._live = set()
+        # entity_id -> [state, ticks_ms when stored]
+        self._states = {}
+        self.hits = 0
+        self.misses = 0
+
+    def set_ttl(self, entity_id: str, ttl_ms: int) -> None:
+        """TTL of one entity, 0 to never cache it"""
+        self._ttl[entity_id] = ttl_ms
+
+    def set_live(self, entity_id: str, live: bool) -> None:
+        """Mark entity_id as kept current by pushed updates, or not any more"""
+        if live:
+            self._live.add(entity_id)
+        else:
+            self._live.discard(entity_id)
+
+    def get(self, entity_id: str, max_age_ms: int = None):
+        """Cached state of entity_id, None when there is no fresh one.
+        max_age_ms overrides the TTL for this call (0: always a miss,
+        unless the entity is live)."""
+        entry = self._states.get(entity_id)
+        if entry and entity_id in self._live:
+            self.hits += 1
+            return entry[0]
+        if max_age_ms is None:
+            max_age_ms = self._ttl.get(entity_id, self.ttl_ms)
+        if entry and time.ticks_diff(time.ticks_ms(), entry[1]) < max_age_ms:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return None
+
+    def peek(self, entity_id: str):
+        """Cached state of entity_id however old, None when there is none;
+        not counted as a hit or miss"""
+        entry = self._states.get(entity_id)
+        return entry[0] if entry else None
+
+    def put(self, entity_id: str, state: str) -> None:
+        """Store the state of entity_id, fresh from now"""
+        entry = self._states.get(entity_id)
+        if entry:
+            entry[0] = state
+            entry[1] = time.ticks_ms()
+        else:
+            self._states[entity_id] = [state, time.ticks_ms()]
+
+    def invalidate(self, entity_id: str = None) -> None:
+        """Forget entity_id, or every entity"""
+        if entity_id is None:
+            self._states.clear()
+        else:
+            self._states.pop(entity_id, None)
@@ -0,0 +1,278 @@
+import asyncio
+import binascii
+import json
+import os
+from internal.logging import Logger
+from internal.ha_cache import StateCache
+from config import HA_URL
+from config_private import HA_TOKEN
+
+# WebSocket opcodes
+OP_CONT = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# Id of the subscribe_entities request, its events carry it
+_SUB_ID = 1
+
+
+class HAWebSocket:
+    """
+    Home Assistant WebSocket API client keeping StateCache entries current.
+
+    One long-lived connection subscribes to the entities of interest
+    (subscribe_entities, HA 2022.4+); HA sends their states right away and
+    every change after that, so get_state is answered from the cache
+    without polling. The entities are marked live in the cache while
+    subscribed; while the connection is down they fall back to the
+    cache TTL (and REST), and it is re-established with exponential backoff.
+
+        ws = HAWebSocket(logger, ha_client.cache, [GDO_RUN_ENTITY_ID],
+                         on_change=cover.state_changed)
+        asyncio.create_task(ws.run())
+
+    A connection quiet for ping_ms gets a WebSocket ping; when nothing
+    comes back within another ping_ms it is dropped and reconnected.
+
+    Attributes:
+        connected (bool): Subscribed and the states received, the cache
+            entries are live.
+        updates (int): State changes received.
+        reconnects (int): Connections made after the first.
+    """
+
+    logger: Logger
+    cache: StateCache
+    entity_ids: list
+
+    def __init__(self,
+                 logger: Logger,
+                 cache: StateCache,
+                 entity_ids: list,
+                 on_change=None,
+                 url: str = HA_URL,
+                 ping_ms: int = 30_000,
+                 min_backoff_ms: int = 1_000,
+                 max_backoff_ms: int = 60_000,
+                 max_message: int = 4096,
+                 ) -> None:
+        """
+        Args:
+            logger (Logger): Logger.
+            cache (StateCache): Cache to keep current, e.g. ha_client.cache.
+            entity_ids (list): Entities to subscribe to.
+            on_change (callable): Called with (entity_id, state) when a
+                state arrives that differs from the cached one.
+            url (str): HA base URL, http(s)://host:port.
+            ping_ms (int): Quiet time before a ping, and to wait for it.
+            min_backoff_ms (int): First wait before reconnecting, doubled
+                after every failure up to max_backoff_ms.
+            max_backoff_ms (int): Longest wait before reconnecting.
+            max_message (int): Larger messages are skipped, not read into RAM.
+        """
+        self.logger = logger
+        self.cache = cache
+        self.entity_ids = list(entity_ids)
+        self.on_change = on_change
+        proto, _, rest = url.split("/", 2)
+        netloc = rest.split("/", 1)[0]
+        self.tls = proto == "https:"
+        host, _, port = netloc.partition(":")
+        self.host = host
+        self.port = int(port) if port else (443 if self.tls else 80)
+        self._handshake = (
+            "GET /api/websocket HTTP/1.1\r\n"
+            "Host: {}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            "Sec-WebSocket-Version: 13\r\n"
+            "Sec-WebSocket-Key: ".format(netloc)).encode()
+        self.ping_ms = ping_ms
+        self.min_backoff_ms = min_backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self.max_message = max_message
+        self.connected = False
+        self.updates = 0
+        self.reconnects = -1
+
+    async def run(self) -> None:
+        """Stay subscribed forever, reconnecting with backoff"""
+        backoff = self.min_backoff_ms
+        while True:
+            self.reconnects += 1
+            writer = None
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.tls or None)
+                await self._session(reader, writer)
+            except Exception as e:
+                self.logger.info("HAWebSocket.run", "✗ Connection lost: {!r}", e)
+            finally:
+                if self.connected:
+                    # Subscribed for a while, start over from the shortest wait
+                    backoff = self.min_backoff_ms
+                self._set_live(False)
+                if writer:
+                    writer.close()
+            self.logger.info("HAWebSocket.run", "Reconnecting in {} ms", backoff)
+            await asyncio.sleep_ms(backoff)
+            backoff = min(backoff * 2, self.max_backoff_ms)
+
+    def _set_live(self, live: bool) -> None:
+        self.connected = live
+        for entity_id in self.entity_ids:
+            self.cache.set_live(entity_id, live)
+
+    async def _session(self, reader, writer) -> None:
+        # Upgrade, authenticate, subscribe and apply events until it fails
+        key = binascii.b2a_base64(os.urandom(16))[:-1]
+        writer.write(self._handshake + key + b"\r\n\r\n")
+        await writer.drain()
+        line = await reader.readline()
+        if line[9:12] != b"101":
+            raise OSError("upgrade refused: {}".format(line.strip()))
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+
+        pinged = False
+        # Fragments of the data message being received, None while one
+        # over max_message is skipped
+        parts = []
+        size = 0
+        msg_op = OP_CONT
+        while True:
+            frame = await self._frame(reader, self.max_message - size if parts is not None else 0)
+            if frame is None:
+                # Quiet for ping_ms
+                if pinged:
+                    raise OSError("no pong")
+                await self._send(writer, OP_PING, b"")
+                pinged = True
+                continue
+            pinged = False
+            fin, op, payload = frame
+            # Control frames may come between the fragments of a message
+            if op == OP_PING:
+                await self._send(writer, OP_PONG, payload)
+                continue
+            if op == OP_CLOSE:
+                raise OSError("closed by HA")
+            if op > OP_CLOSE:
+                continue
+            if op != OP_CONT:
+                msg_op = op
+                parts = []
+                size = 0
+            if payload is None:
+                parts = None
+            elif parts is not None:
+                parts.append(payload)
+                size += len(payload)
+            if not fin:
+                continue
+            if parts is None:
+                self.logger.info("HAWebSocket.run", "✗ Skipped a message over {} bytes", self.max_message)
+            elif msg_op == OP_TEXT and size:
+                await self._message(writer, json.loads(b"".join(parts)))
+            parts = []
+            size = 0
+
+    async def _message(self, writer, msg: dict) -> None:
+        kind = msg.get("type")
+        if kind == "event" and msg.get("id") == _SUB_ID:
+            self._apply(msg["event"])
+            if not self.connected:
+                # The first event holds the current states
+                self._set_live(True)
+        elif kind == "auth_required":
+            await self._send_json(writer, {"type": "auth", "access_token": HA_TOKEN})
+        elif kind == "auth_ok":
+            await self._send_json(writer, {"id": _SUB_ID, "type": "subscribe_entities",
+                                           "entity_ids": self.entity_ids})
+        elif kind == "auth_invalid":
+            raise OSError("auth invalid: {}".format(msg.get("message")))
+        elif kind == "result" and msg.get("id") == _SUB_ID:
+            if not msg.get("success"):
+                raise OSError("subscribe failed: {}".format(msg.get("error")))
+            self.logger.info("HAWebSocket.run", "✓ Subscribed to {}", self.entity_ids)
+
+    def _apply(self, event: dict) -> None:
+        # subscribe_entities: "a" full states (first event), "c" changes
+        # ("+" new values, "s" the state), "r" removed entities
+        for entity_id, state in event.get("a", {}).items():
+            self._update(entity_id, state.get("s"))
+        for entity_id, diff in event.get("c", {}).items():
+            self._update(entity_id, diff.get("+", {}).get("s"))
+        for entity_id in event.get("r", ()):
+            self.cache.invalidate(entity_id)
+
+    def _update(self, entity_id: str, state) -> None:
+        if state is None:
+            # Only attributes changed
+            return
+        self.updates += 1
+        old = self.cache.peek(entity_id)
+        self.cache.put(entity_id, state)
+        self.logger.debug("HAWebSocket.run", "State of {}: {}", entity_id, state)
+        if self.on_change and state != old:
+            self.on_change(entity_id, state)
+
+    async def _frame(self, reader, room: int):
+        # (fin, opcode, payload) of the next frame, None when nothing arrived
+        # for ping_ms. Only the wait for its first byte may time out that
+        # way: read(1) returns it or nothing, while a longer read cut short
+        # by the timeout loses the bytes it got and the stream is out of step
+        try:
+            first = await asyncio.wait_for_ms(reader.read(1), self.ping_ms)
+        except asyncio.TimeoutError:
+            return None
+        if not first:
+            raise OSError("connection closed")
+        # The rest follows right away; a stall means the link is gone, the
+        # TimeoutError ends the session and run() reconnects
+        return await asyncio.wait_for_ms(self._payload(reader, first[0], room), self.ping_ms)
+
+    async def _payload(self, reader, b0: int, room: int) -> tuple:
+        # The rest of the frame starting with b0. A data payload longer
+        # than room is skipped (None)
+        b1 = (await reader.readexactly(1))[0]
+        n = b1 & 0x7f
+        if n == 126:
+            n = int.from_bytes(await reader.readexactly(2), "big")
+        elif n == 127:
+            n = int.from_bytes(await reader.readexactly(8), "big")
+        mask = await reader.readexactly(4) if b1 & 0x80 else None
+        op = b0 & 0x0f
+        if op >= OP_CLOSE and n > 125:
+            raise OSError("control frame of {} bytes".format(n))
+        if n > room:
+            # Skip it in small reads
+            while n:
+                n -= len(await reader.readexactly(min(n, 256)))
+            return b0 & 0x80, op, None
+        data = await reader.readexactly(n)
+        if mask:
+            data = bytes(b ^ mask[i & 3] for i, b in enumerate(data))
+        return b0 & 0x80, op, data
+
+    async def _send_json(self, writer, msg: dict) -> None:
+        await self._send(writer, OP_TEXT, json.dumps(msg).encode())
+
+    @staticmethod
+    async def _send(writer, op: int, payload: bytes) -> None:
+        # Client frames are masked (RFC 6455)
+        n = len(payload)
+        if n < 126:
+            head = bytes((0x80 | op, 0x80 | n))
+        elif n < 65536:
+            head = bytes((0x80 | op, 0x80 | 126)) + n.to_bytes(2, "big")
+        else:
+            head = bytes((0x80 | op, 0x80 | 127)) + n.to_bytes(8, "big")
+        mask = os.urandom(4)
+        data = bytearray(payload)
+        for i in range(n):
+            data[i] ^= mask[i & 3]
+        writer.write(head + mask + data)
+        await writer.drain()
@@ -0,0 +1,139 @@
+import asyncio
+import time
+from internal.http_client import HttpClient, ResponseHead, chunk_size, trailer_end
+from internal.json_pick import JsonPicker
+
+
+class AsyncHttpClient(HttpClient):
+    """
+    asyncio front end of HttpClient: the same keep-alive pool and
+    pre-encoded requests over asyncio streams, so a slow server only holds
+    up the task waiting for it.
+
+        http = AsyncHttpClient(HA_URL, headers)
+        status, body = await http.request("GET", "/api/states/sun.sun")
+
+    Each request has a deadline covering connect, send and the whole
+    response; when it passes the connection is closed and
+    asyncio.TimeoutError raised. Tasks may call request() at the same time,
+    each gets a connection of its own.
+    """
+
+    async def request(self, method: str, path: str, data=None, timeout: float = None, pick=None) -> tuple:
+        """
+        Send a request and read the response.
+
+        Args:
+            method (str): "GET", "POST" ...
+            path (str): Path after base_url, starting with "/".
+            data: dict/list sent as JSON, or str/bytes sent as is.
+            timeout (float): Seconds for the request, the client's timeout
+                by default.
+            pick (tuple): JSON paths to keep, see HttpClient.request.
+
+        Returns:
+            tuple: (status, body bytes), with pick and a 2xx JSON response
+            (status, {path: value}).
+            Raises OSError when the server cannot be reached,
+            asyncio.TimeoutError after timeout.
+        """
+        return await asyncio.wait_for(
+            self._request(self._encode(method, path, data), pick),
+            self.timeout if timeout is None else timeout)
+
+    async def _request(self, req: bytes, pick) -> tuple:
+        conn = self._take()
+        if conn:
+            self.reused += 1
+            res = await self._exchange(conn, req, pick)
+            if res:
+                return res
+            # Closed by the server while it was idle, try a new one
+            self.retried += 1
+        res = await self._exchange(await self._open(), req, pick)
+        if not res:
+            raise OSError("connection closed")
+        return res
+
+    async def _open(self) -> tuple:
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.tls or None)
+        self.opened += 1
+        # Writer first: close() and _take() close conn[0]
+        return writer, reader
+
+    async def _exchange(self, conn: tuple, req: bytes, pick=None):
+        # (status, body), None when the connection ended before a response
+        writer, reader = conn
+        try:
+            writer.write(req)
+            await writer.drain()
+            line = await reader.readline()
+        except OSError:
+            writer.close()
+            return None
+        except BaseException:
+            # Cancelled by the deadline
+            writer.close()
+            raise
+        if not line:
+            writer.close()
+            return None
+        try:
+            head = ResponseHead(line)
+            while head.header(await reader.readline()):
+                pass
+            if pick is not None and head.pickable():
+                picker = JsonPicker(pick)
+                await self._stream(reader, head, picker.feed)
+                body = picker.values
+            elif head.chunked:
+                parts = []
+                while True:
+                    n = chunk_size(await reader.readline())
+                    if not n:
+                        while not trailer_end(await reader.readline()):
+                            pass
+                        break
+                    parts.append(await reader.readexactly(n))
+                    await reader.readline()
+                body = b"".join(parts)
+            elif head.length >= 0:
+                body = await reader.readexactly(head.length)
+            else:
+                body = await reader.read(-1)
+        except BaseException:
+            writer.close()
+            raise
+        if head.keep and len(self._idle) < self.max_conns:
+            self._idle.append(conn)
+            self._used.append(time.ticks_ms())
+        else:
+            writer.close()
+        return head.status, body
+
+    async def _stream(self, reader, head: ResponseHead, feed) -> None:
+        # Hand the body to feed in pieces of up to 256 bytes
+        if not head.chunked:
+            await self._pump(reader, head.length, feed)
+            return
+        while True:
+            n = chunk_size(await reader.readline())
+            if not n:
+                while not trailer_end(await reader.readline()):
+                    pass
+                return
+            await self._pump(reader, n, feed)
+            await reader.readline()
+
+    @staticmethod
+    async def _pump(reader, n: int, feed) -> None:
+        # n bytes, or up to the end of the stream for n < 0
+        while n:
+            piece = await reader.read(256 if n < 0 else min(n, 256))
+            if not piece:
+                if n < 0:
+                    return
+                raise OSError("connection closed")
+            feed(piece)
+            if n > 0:
+                n -= len(piece)
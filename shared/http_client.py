@@ -0,0 +1,317 @@
+"""
+Keep-alive HTTP/1.1 client for one server, e.g. Home Assistant.
+
+urequests opens a new TCP connection per request and builds the request
+headers every time. HttpClient keeps a few connections open between calls,
+sends the headers that never change as one pre-encoded block and writes the
+whole request with a single write, so a call to a server it talked to
+recently costs one round trip. With pick, a JSON response is parsed as it
+is read and only the requested fields are kept (see JsonPicker).
+"""
+
+import json
+import socket
+import time
+from internal.json_pick import JsonPicker
+
+# errno of a socket timeout: ETIMEDOUT on MicroPython, "timed out" on CPython
+_TIMEOUTS = (110, "timed out")
+
+
+class ResponseHead:
+    """
+    Status line and headers of a response, parsed a line at a time so
+    HttpClient and AsyncHttpClient read them each over their own stream:
+
+        head = ResponseHead(status_line)
+        while head.header(next_line):
+            pass
+
+    Attributes:
+        status (int): HTTP status code.
+        length (int): Content-Length, -1 when not sent.
+        chunked (bool): Transfer-Encoding chunked.
+        json (bool): Content-Type is JSON.
+        keep (bool): The connection may be reused once the body is read.
+    """
+
+    def __init__(self, line: bytes) -> None:
+        self.status = int(line.split(None, 2)[1])
+        self.length = -1
+        self.chunked = False
+        self.json = False
+        self.keep = line.startswith(b"HTTP/1.1")
+
+    def header(self, line: bytes) -> bool:
+        """Take the next header line; False at the end of the headers"""
+        if not line or line == b"\r\n":
+            if not self.chunked and self.length < 0:
+                # No length: the body ends when the server closes
+                self.keep = False
+            return False
+        name, _, value = line.partition(b":")
+        name = name.lower()
+        if name == b"content-length":
+            self.length = int(value)
+        elif name == b"transfer-encoding":
+            self.chunked = b"chunked" in value.lower()
+        elif name == b"connection":
+            self.keep = b"close" not in value.lower()
+        elif name == b"content-type":
+            self.json = b"json" in value.lower()
+        return True
+
+    def pickable(self) -> bool:
+        """A 2xx response with a JSON body; others (HA's "401:
+        Unauthorized" is plain text) are not given to JsonPicker"""
+        return self.json and 200 <= self.status < 300
+
+
+def chunk_size(line: bytes) -> int:
+    """Size of the chunk a chunk-size line announces, 0 for the last one"""
+    return int(line.split(b";", 1)[0], 16)
+
+
+def trailer_end(line: bytes) -> bool:
+    """True at the blank line (or end of stream) after the trailers"""
+    return line in (b"\r\n", b"")
+
+
+class HttpClient:
+    """
+    HTTP/1.1 client with a small pool of kept-alive connections.
+
+        http = HttpClient("http://192.168.40.12:8123",
+                          {"Authorization": "Bearer " + token,
+                           "Content-Type": "application/json"})
+        status, body = http.request("GET", "/api/states/sun.sun")
+        status, body = http.request("POST", "/api/events/x", {"a": 1})
+
+    Calls are sequential; a connection goes back to the pool once its
+    response is read. When a kept connection turns out to be closed by the
+    server (the request cannot be written or the connection ends before
+    any response) the request is sent once more on a new connection. A
+    timeout is not retried, the server may have acted on the request.
+
+    Attributes:
+        opened (int): Connections opened.
+        reused (int): Requests sent on a kept connection.
+        retried (int): Requests sent again after a kept connection failed.
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 headers: dict = None,
+                 max_conns: int = 2,
+                 timeout: int = 5,
+                 idle_ms: int = 60_000,
+                 ) -> None:
+        """
+        Args:
+            base_url (str): "http://host:port" or "https://host:port", a path
+                after it prefixes every request path.
+            headers (dict): Headers sent with every request.
+            max_conns (int): Connections kept open between requests.
+            timeout (int): Socket timeout in seconds.
+            idle_ms (int): Kept connections idle longer than this are closed
+                instead of reused (HA closes them after 75 s).
+        """
+        proto, _, rest = base_url.split("/", 2)
+        netloc, _, prefix = rest.partition("/")
+        host = netloc
+        self.tls = proto == "https:"
+        port = 443 if self.tls else 80
+        if ":" in host:
+            host, port = host.split(":", 1)
+            port = int(port)
+        self.host = host
+        self.port = port
+        self.prefix = "/" + prefix if prefix else ""
+        self.max_conns = max_conns
+        self.timeout = timeout
+        self.idle_ms = idle_ms
+        self._addr = None
+        # Kept connections, most recently used last, and when they were used
+        self._idle = []
+        self._used = []
+        static = "Host: {}\r\n".format(netloc)
+        for name, value in (headers or {}).items():
+            static += "{}: {}\r\n".format(name, value)
+        self._headers = static.encode()
+        # Reads of a picked response go through it
+        self._piece = memoryview(bytearray(256))
+        self.opened = 0
+        self.reused = 0
+        self.retried = 0
+
+    def request(self, method: str, path: str, data=None, pick=None) -> tuple:
+        """
+        Send a request and read the response.
+
+        Args:
+            method (str): "GET", "POST" ...
+            path (str): Path after base_url, starting with "/".
+            data: dict/list sent as JSON, or str/bytes sent as is.
+            pick (tuple): JSON paths to keep, e.g. ("state",
+                "attributes.unit"); a 2xx JSON body is parsed as it arrives
+                and never held whole.
+
+        Returns:
+            tuple: (status, body bytes), with pick and a 2xx JSON response
+            (status, {path: value}) for the paths found. Raises OSError
+            when the server cannot be reached.
+        """
+        req = self._encode(method, path, data)
+        conn = self._take()
+        if conn:
+            self.reused += 1
+            res = self._exchange(conn, req, pick)
+            if res:
+                return res
+            # Closed by the server while it was idle, try a new one
+            self.retried += 1
+        res = self._exchange(self._open(), req, pick)
+        if not res:
+            raise OSError("connection closed")
+        return res
+
+    def _encode(self, method: str, path: str, data) -> bytes:
+        # The whole request, written at once
+        if data is None:
+            body = b""
+        elif isinstance(data, bytes):
+            body = data
+        elif isinstance(data, str):
+            body = data.encode()
+        else:
+            body = json.dumps(data).encode()
+        return b"".join((
+            "{} {}{} HTTP/1.1\r\n".format(method, self.prefix, path).encode(),
+            self._headers,
+            "Content-Length: {}\r\n\r\n".format(len(body)).encode(),
+            body))
+
+    def close(self) -> None:
+        """Close the kept connections"""
+        for conn in self._idle:
+            conn[0].close()
+        self._idle = []
+        self._used = []
+
+    def _take(self):
+        # Most recently used connection that is not too old, None when none
+        now = time.ticks_ms()
+        while self._idle:
+            conn = self._idle.pop()
+            used = self._used.pop()
+            if time.ticks_diff(now, used) < self.idle_ms:
+                return conn
+            conn[0].close()
+        return None
+
+    def _open(self) -> tuple:
+        if self._addr is None:
+            self._addr = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0][-1]
+        sock = socket.socket()
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self._addr)
+            if self.tls:
+                import ssl
+                sock = ssl.wrap_socket(sock, server_hostname=self.host)
+        except OSError:
+            sock.close()
+            # The address may have changed (DHCP), look it up next time
+            self._addr = None
+            raise
+        self.opened += 1
+        # On MicroPython the socket itself, on CPython a stream over it
+        return sock, sock.makefile("rwb", 0)
+
+    def _exchange(self, conn: tuple, req: bytes, pick=None):
+        # (status, body), None when the connection ended before a response
+        sock, f = conn
+        try:
+            f.write(req)
+            line = f.readline()
+        except OSError as e:
+            sock.close()
+            if e.args and e.args[0] in _TIMEOUTS:
+                raise
+            return None
+        if not line:
+            sock.close()
+            return None
+        try:
+            head = ResponseHead(line)
+            while head.header(f.readline()):
+                pass
+            if pick is not None and head.pickable():
+                picker = JsonPicker(pick)
+                self._stream(f, head, picker.feed)
+                body = picker.values
+            elif head.chunked:
+                parts = []
+                while True:
+                    n = chunk_size(f.readline())
+                    if not n:
+                        while not trailer_end(f.readline()):
+                            pass
+                        break
+                    parts.append(self._read(f, n))
+                    f.readline()
+                body = b"".join(parts)
+            elif head.length >= 0:
+                body = self._read(f, head.length)
+            else:
+                body = f.read()
+        except Exception:
+            sock.close()
+            raise
+        if head.keep and len(self._idle) < self.max_conns:
+            self._idle.append(conn)
+            self._used.append(time.ticks_ms())
+        else:
+            sock.close()
+        return head.status, body
+
+    def _stream(self, f, head: ResponseHead, feed) -> None:
+        # Hand the body to feed in pieces of up to 256 bytes
+        if not head.chunked:
+            self._pump(f, head.length, feed)
+            return
+        while True:
+            n = chunk_size(f.readline())
+            if not n:
+                while not trailer_end(f.readline()):
+                    pass
+                return
+            self._pump(f, n, feed)
+            f.readline()
+
+    def _pump(self, f, n: int, feed) -> None:
+        # n bytes, or up to the end of the stream for n < 0
+        piece = self._piece
+        while n:
+            k = f.readinto(piece[:n] if 0 < n < len(piece) else piece)
+            if not k:
+                if n < 0:
+                    return
+                raise OSError("connection closed")
+            feed(piece[:k])
+            if n > 0:
+                n -= k
+
+    @staticmethod
+    def _read(f, n: int) -> bytes:
+        # read() may return less than asked for
+        data = f.read(n)
+        if data is None or len(data) < n:
+            buf = bytearray(data or b"")
+            while len(buf) < n:
+                more = f.read(n - len(buf))
+                if not more:
+                    raise OSError("connection closed")
+                buf += more
+            data = bytes(buf)
+        return data
@@ -0,0 +1,194 @@
+import json
+
+# Parser states
+_VALUE_WAIT = 0     # before a value
+_VALUE = 1          # in a value that is skipped or captured
+_KEY_WAIT = 2       # in an object, before a key or "}"
+_KEY = 3            # in a key
+_COLON = 4          # after a key
+_AFTER = 5          # after a value in an object, before "," or "}"
+_DONE = 6           # top level object closed, or every path found
+
+_WS = bytearray(256)
+_END = bytearray(256)
+for _c in b" \t\r\n":
+    _WS[_c] = 1
+for _c in b" \t\r\n,}]":
+    _END[_c] = 1
+
+
+class JsonPicker:
+    """
+    Streaming JSON parser keeping only the values at the requested paths.
+
+    The document is fed in pieces as they come off the socket; objects on
+    the way to a requested key are walked, everything else is skipped byte
+    by byte without being stored, and only the requested values are
+    collected (and json.loads'ed). Memory stays at the requested values,
+    however large the rest of the document is. Once every path is found
+    the rest is not looked at.
+
+        picker = JsonPicker(("state", "attributes.friendly_name"))
+        for piece in pieces:
+            picker.feed(piece)
+        picker.values   # {"state": "on", "attributes.friendly_name": "GDO"}
+
+    Paths are keys joined by "."; they go through objects only, a value
+    inside an array is picked with the whole array. Missing paths are not
+    in values.
+
+    Attributes:
+        values (dict): Path -> value, for the paths found so far.
+    """
+
+    values: dict
+
+    def __init__(self, paths, max_value: int = 512) -> None:
+        """
+        Args:
+            paths (iterable): Paths to pick, e.g. "state", "attributes.unit".
+            max_value (int): Bytes a picked value may take as JSON text,
+                ValueError beyond.
+        """
+        # Key (bytes) -> subtree, or the path string at a leaf
+        tree = {}
+        for path in paths:
+            node = tree
+            keys = path.split(".")
+            for key in keys[:-1]:
+                node = node.setdefault(key.encode(), {})
+            node[keys[-1].encode()] = path
+        self.values = {}
+        self.max_value = max_value
+        self._paths = len(paths)
+        self._state = _VALUE_WAIT
+        self._want = tree
+        self._objects = []
+        self._key = bytearray(64)
+        self._klen = 0
+        self._cap = None
+        self._depth = 0
+        self._str = False
+        self._esc = False
+        self._scalar = False
+
+    def done(self) -> bool:
+        """True once every path was found or the document has ended"""
+        return self._state == _DONE
+
+    def feed(self, data) -> None:
+        """Parse the next piece (bytes, bytearray or memoryview)"""
+        for c in data:
+            st = self._state
+            if st == _DONE:
+                return
+            if st == _VALUE:
+                cap = self._cap
+                if self._scalar:
+                    if not _END[c]:
+                        if cap is not None:
+                            self._capture(c)
+                        continue
+                    # The delimiter belongs to the object, handled below
+                    # unless that was the last path
+                    self._end_value()
+                    if self._state == _DONE:
+                        return
+                    st = _AFTER
+                else:
+                    if cap is not None:
+                        self._capture(c)
+                    if self._str:
+                        if self._esc:
+                            self._esc = False
+                        elif c == 0x5c:
+                            self._esc = True
+                        elif c == 0x22:
+                            self._str = False
+                            if not self._depth:
+                                self._end_value()
+                    elif c == 0x22:
+                        self._str = True
+                    elif c == 0x7b or c == 0x5b:
+                        self._depth += 1
+                    elif c == 0x7d or c == 0x5d:
+                        self._depth -= 1
+                        if not self._depth:
+                            self._end_value()
+                    continue
+            if st == _KEY:
+                if self._esc:
+                    self._esc = False
+                elif c == 0x5c:
+                    self._esc = True
+                elif c == 0x22:
+                    self._state = _COLON
+                    continue
+                # Longer keys match nothing anyway
+                if self._klen < 64:
+                    self._key[self._klen] = c
+                    self._klen += 1
+                continue
+            if _WS[c]:
+                continue
+            if st == _AFTER:
+                if c == 0x2c:
+                    self._state = _KEY_WAIT
+                elif c == 0x7d:
+                    self._close()
+                else:
+                    raise ValueError("JSON: ',' or '}' expected")
+            elif st == _KEY_WAIT:
+                if c == 0x22:
+                    self._klen = 0
+                    self._state = _KEY
+                elif c == 0x7d:
+                    self._close()
+                else:
+                    raise ValueError("JSON: key expected")
+            elif st == _COLON:
+                if c != 0x3a:
+                    raise ValueError("JSON: ':' expected")
+                key = bytes(self._key[:self._klen])
+                if b"\\" in key:
+                    key = json.loads(b'"' + key + b'"').encode()
+                self._want = self._objects[-1].get(key)
+                self._state = _VALUE_WAIT
+            elif st == _VALUE_WAIT:
+                want = self._want
+                if c == 0x7b and isinstance(want, dict):
+                    # On the way to a picked key
+                    self._objects.append(want)
+                    self._state = _KEY_WAIT
+                    continue
+                if not self._objects:
+                    raise ValueError("JSON: object expected")
+                self._state = _VALUE
+                self._cap = bytearray() if isinstance(want, str) else None
+                self._depth = 0
+                self._str = c == 0x22
+                self._scalar = False
+                if c == 0x7b or c == 0x5b:
+                    self._depth = 1
+                elif not self._str:
+                    self._scalar = True
+                if self._cap is not None:
+                    self._capture(c)
+
+    def _capture(self, c: int) -> None:
+        if len(self._cap) >= self.max_value:
+            raise ValueError("JSON: value over max_value")
+        self._cap.append(c)
+
+    def _end_value(self) -> None:
+        if self._cap is not None:
+            self.values[self._want] = json.loads(self._cap)
+            self._cap = None
+            if len(self.values) == self._paths:
+                self._state = _DONE
+                return
+        self._state = _AFTER if self._objects else _DONE
+
+    def _close(self) -> None:
+        self._objects.pop()
+        self._state = _AFTER if self._objects else _DONE
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from array import array
+from machine import Pin
+
+
+def blink(times: int, on_ms: int = 200, off_ms: int = 200) -> tuple:
+    """Pattern blinking times times; build it once, at import"""
+    return (on_ms, off_ms) * times
+
+
+# Patterns: ms on, ms off, ms on, ... starting with on (a leading 0 starts off)
+WINK = (200,)
+FLASH = (5,)                        # barely visible, for battery powered nodes
+BLINK3 = blink(3)
+HEARTBEAT = (50, 150, 50, 1750)     # play with repeat=True
+CONNECTING = (50, 50)               # 10 Hz, play with repeat=True
+
+# Step of an LED waiting out the delay_ms of play()
+_DELAY = 255
+
+
+class LedPatterns:
+    """
+    Non-blocking LED patterns, one scheduler for all LEDs.
+
+    play() only records which pattern an LED is in and when its next step
+    is due; update() switches the LEDs whose step is due and returns the ms
+    until the next step. run() is an asyncio task calling it, so one task
+    serves every LED; synchronous loops call update() between their sleeps.
+
+        leds = LedPatterns()
+        asyncio.create_task(leds.run())
+        leds.play(led_green, BLINK3)
+        leds.play(run_led, HEARTBEAT, repeat=True)
+
+    Attributes:
+        pins (list): LED per slot, None for a free slot.
+    """
+
+    pins: list
+
+    def __init__(self, max_leds: int = 8) -> None:
+        """
+        Args:
+            max_leds (int): LEDs that can play a pattern at the same time.
+        """
+        self.pins = [None] * max_leds
+        self._pattern = [None] * max_leds
+        self._step = bytearray(max_leds)
+        self._repeat = bytearray(max_leds)
+        self._due = array('L', [0] * max_leds)
+        self._kick = asyncio.Event()
+
+    def play(self, led: Pin, pattern: tuple, repeat: bool = False, delay_ms: int = 0) -> None:
+        """Start pattern on led, replacing what it was playing. With
+        delay_ms the LED stays off that long first."""
+        pins = self.pins
+        i = -1
+        for j in range(len(pins)):
+            if pins[j] is led:
+                i = j
+                break
+            if i < 0 and pins[j] is None:
+                i = j
+        if i < 0:
+            raise ValueError("No free LED slot")
+        pins[i] = led
+        self._pattern[i] = pattern
+        self._repeat[i] = repeat
+        now = time.ticks_ms()
+        if delay_ms:
+            led.value(0)
+            self._step[i] = _DELAY
+            self._due[i] = time.ticks_add(now, delay_ms)
+        else:
+            self._enter(i, 0, now)
+        self._kick.set()
+
+    def stop(self, led: Pin) -> None:
+        """Stop the pattern of led and turn it off"""
+        for i in range(len(self.pins)):
+            if self.pins[i] is led:
+                self.pins[i] = None
+                self._pattern[i] = None
+        led.value(0)
+
+    def busy(self) -> bool:
+        """True while a pattern that ends by itself is playing"""
+        for i in range(len(self.pins)):
+            if self.pins[i] is not None and not self._repeat[i]:
+                return True
+        return False
+
+    def _enter(self, i: int, step: int, now: int) -> None:
+        # Skip zero length steps, free the slot at the end of the pattern
+        pattern = self._pattern[i]
+        while True:
+            if step >= len(pattern):
+                if not self._repeat[i]:
+                    self.pins[i].value(0)
+                    self.pins[i] = None
+                    self._pattern[i] = None
+                    return
+                step = 0
+            if pattern[step]:
+                break
+            step += 1
+        self._step[i] = step
+        self._due[i] = time.ticks_add(now, pattern[step])
+        self.pins[i].value(not step & 1)
+
+    def update(self) -> int:
+        """Advance due steps. Returns ms until the next step, -1 when no
+        pattern is playing."""
+        now = time.ticks_ms()
+        next_ms = -1
+        for i in range(len(self.pins)):
+            if self.pins[i] is None:
+                continue
+            if time.ticks_diff(self._due[i], now) <= 0:
+                step = self._step[i]
+                self._enter(i, 0 if step == _DELAY else step + 1, now)
+                if self.pins[i] is None:
+                    continue
+            left = time.ticks_diff(self._due[i], now)
+            if next_ms < 0 or left < next_ms:
+                next_ms = left
+        return next_ms
+
+    async def wait(self) -> None:
+        """Wait until the patterns that end by themselves have ended"""
+        while True:
+            ms = self.update()
+            if not self.busy():
+                return
+            await asyncio.sleep_ms(ms)
+
+    async def run(self) -> None:
+        """Drive the LEDs forever; play() wakes it for a new pattern"""
+        while True:
+            ms = self.update()
+            self._kick.clear()
+            if ms < 0:
+                await self._kick.wait()
+                continue
+            try:
+                await asyncio.wait_for_ms(self._kick.wait(), ms)
+            except asyncio.TimeoutError:
+                pass
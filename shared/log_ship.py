@@ -0,0 +1,168 @@
+"""
+Ship log lines off a device: a Logger sink that only queues them.
+
+Lines wait in a bounded queue (the oldest are dropped when it is full) and
+leave when the device talks anyway, so logging never adds traffic of its
+own or delays sensor data:
+
+- LoRa: MbxMon fills the spare room of frames it sends with MSG_LOG
+  records (see MbxMon log_ship) and the gateway logs them per node.
+- HTTP: ship() (or ship_async()) hands a batch to a send function, e.g.
+  ha_sender() posting one HA event per batch, called from a loop that is
+  online already.
+"""
+
+
+class ShipSink:
+    """
+    Logger sink queuing text lines for shipping.
+
+        ship = ShipSink(ha_sender(ha_client, "mbx_gateway_log"))
+        logger.add_sink(ship)
+        ...
+        ship.ship()   # now and then, from the main loop
+
+    Lines are cut to max_line bytes. When the queue would hold more than
+    max_bytes the oldest lines are dropped and counted; the next batch
+    starts with a line saying how many. Lines logged while ship() sends a
+    batch (by the transport itself) are not queued.
+
+    Attributes:
+        lines (list): Queued lines (bytes), oldest first.
+        dropped (int): Lines dropped because the queue was full.
+        shipped (int): Lines shipped.
+        failed (int): Batches the send function did not take.
+    """
+
+    binary = False
+    lines: list
+
+    def __init__(self,
+                 send=None,
+                 level: int = 20,
+                 max_bytes: int = 2048,
+                 batch_bytes: int = 1024,
+                 max_line: int = 120,
+                 ) -> None:
+        """
+        Args:
+            send (callable): Takes a list of lines (bytes), returns True when
+                they are delivered. None when lines are taken with peek/drop.
+            level (int): Lowest level queued, Logger.INFO by default
+                (logging lives in internal/ on some projects).
+            max_bytes (int): Queue size; the oldest lines go beyond it.
+            batch_bytes (int): Most line bytes per ship() call.
+            max_line (int): Lines are cut to this many bytes.
+        """
+        self.level = level
+        self.send = send
+        self.max_bytes = max_bytes
+        self.batch_bytes = batch_bytes
+        self.max_line = max_line
+        self.lines = []
+        self.dropped = 0
+        self.shipped = 0
+        self.failed = 0
+        self._bytes = 0
+        self._reported = 0
+        self._sending = False
+
+    def write(self, level: int, line: str, end: str = "\n") -> None:
+        if self._sending:
+            return
+        data = line.encode()
+        if len(data) > self.max_line:
+            n = self.max_line
+            # Do not split a UTF-8 sequence
+            while n and data[n] & 0xc0 == 0x80:
+                n -= 1
+            data = data[:n]
+        self.lines.append(data)
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            self._bytes -= len(self.lines.pop(0))
+            self.dropped += 1
+
+    def flush(self) -> None:
+        # Shipping happens when the device is online anyway, not on flush
+        pass
+
+    def pending(self) -> int:
+        """Queued lines, a note about dropped lines included"""
+        return len(self.lines) + (self.dropped != self._reported)
+
+    def peek(self, i: int):
+        """i-th line to ship (bytes), None past the end"""
+        if self.dropped != self._reported:
+            if i == 0:
+                return "... {} lines dropped".format(self.dropped - self._reported).encode()
+            i -= 1
+        return self.lines[i] if i < len(self.lines) else None
+
+    def drop(self, n: int) -> None:
+        """Remove the first n lines (shipped by the caller)"""
+        if n and self.dropped != self._reported:
+            self._reported = self.dropped
+            n -= 1
+        for data in self.lines[:n]:
+            self._bytes -= len(data)
+        del self.lines[:n]
+        self.shipped += n
+
+    def ship(self) -> int:
+        """Send up to batch_bytes of lines. Returns the number shipped; on
+        failure they stay queued for the next call."""
+        batch = self._batch()
+        if not batch or not self.send:
+            return 0
+        self._sending = True
+        try:
+            ok = self.send(batch)
+        except Exception:
+            ok = False
+        finally:
+            self._sending = False
+        return self._sent(batch, ok, 0)
+
+    async def ship_async(self) -> int:
+        """ship() for a send function returning an awaitable, e.g.
+        ha_sender() of an AsyncHAClient. Other tasks keep logging while it
+        waits and their lines are queued, so the transport should log to a
+        logger without this sink."""
+        batch = self._batch()
+        if not batch or not self.send:
+            return 0
+        dropped = self.dropped
+        try:
+            ok = await self.send(batch)
+        except Exception:
+            ok = False
+        # Lines pushed out of a full queue meanwhile were the oldest, in batch
+        return self._sent(batch, ok, self.dropped - dropped)
+
+    def _batch(self) -> list:
+        # Lines of the next ship, up to batch_bytes
+        batch = []
+        size = 0
+        while True:
+            data = self.peek(len(batch))
+            if data is None or (batch and size + len(data) > self.batch_bytes):
+                break
+            batch.append(data)
+            size += len(data)
+        return batch
+
+    def _sent(self, batch: list, ok: bool, gone: int) -> int:
+        if not ok:
+            self.failed += 1
+            return 0
+        self.drop(max(len(batch) - gone, 0))
+        return len(batch)
+
+
+def ha_sender(ha_client, event_type: str, **data):
+    """send function for ShipSink: one HA event per batch, the lines in
+    "lines" next to data. With an AsyncHAClient use ShipSink.ship_async."""
+    def send(lines) -> bool:
+        return ha_client.fire_event(event_type, dict(data, lines=[line.decode() for line in lines]))
+    return send
@@ -1,65 +1,406 @@
-"""Minimal console logger compatible with MicroPython (RPi Pico)."""
+"""Minimal logger compatible with MicroPython (RPi Pico).
 
+Records go to the console by default; add a RingSink to keep the last
+lines in RAM or a FileSink to keep them on flash. A FileSink with
+binary=True stores BinaryEncoder records instead of text, decoded on a
+host by tools/log_decode.py.
+"""
+
+import os
+import struct
 import time
 
+# Binary records (BinaryEncoder), big-endian:
+#   REC_LOG       level (B) ms (H) source id (B) template id (H) argc (B) args
+#   REC_TIME      seconds (I), the time of the REC_LOGs that follow
+#   REC_SOURCE    id (H) length (B) utf-8
+#   REC_TEMPLATE  id (H) length (B) utf-8
+# An arg is a type byte and its value: ARG_INT8 (b), ARG_INT16 (h),
+# ARG_INT (i), ARG_FLOAT (f), ARG_STR length (B) and utf-8, ARG_BOOL (?),
+# ARG_NONE. A template id of NO_TEMPLATE means the message was not
+# interned; it follows as the first (ARG_STR) arg.
+REC_LOG = 0x01
+REC_SOURCE = 0x02
+REC_TEMPLATE = 0x03
+REC_TIME = 0x04
+LOG_HEADER = ">BBHBHB"
+TIME_HEADER = ">BI"
+DEF_HEADER = ">BHB"
+ARG_INT8 = 0x62
+ARG_INT16 = 0x68
+ARG_INT = 0x69
+ARG_FLOAT = 0x66
+ARG_STR = 0x73
+ARG_NONE = 0x6e
+ARG_BOOL = 0x3f
+NO_TEMPLATE = 0xffff
+
 
 class Logger:
+	"""Console logger with level filtering.
+
+	Pass format arguments after the message instead of an f-string; the
+	message is only formatted when the level lets it through, so a filtered
+	call costs a compare and allocates nothing:
+
+		logger.debug("HAClient.get_state", "Raw Response Body: {}", body)
+
+	Arguments that are expensive to compute themselves can be guarded with
+	enabled(Logger.DEBUG). The date and time part of the timestamp is
+	rebuilt once per second.
+
+	Each line goes to every sink whose own level it passes (see
+	ConsoleSink, RingSink and FileSink). Binary sinks get BinaryEncoder
+	records; the text line is only built when a text sink takes it.
+	"""
+
 	DEBUG = 10
 	INFO = 20
 	ERROR = 30
 
 	_LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", ERROR: "ERROR"}
 
-	def __init__(self, level: int = INFO):
+	def __init__(self, level: int = INFO, sinks: list = None):
 		self.level = level
+		self.sinks = []
+		self.encoder = None
+		self._ts_sec = -1
+		self._ts = ""
+		for sink in [ConsoleSink()] if sinks is None else sinks:
+			self.add_sink(sink)
 
 	def set_level(self, level: int) -> None:
 		self.level = level
 
-	def debug(self, source, msg, end: str = "\n") -> None:
-		self._log(self.DEBUG, source, msg, end=end)
+	def add_sink(self, sink) -> None:
+		if sink.binary:
+			if self.encoder is None:
+				self.encoder = BinaryEncoder()
+			# Every new file (or stream) starts with the strings defined so far
+			sink.encoder = self.encoder
+		self.sinks.append(sink)
 
-	def info(self, source, msg, end: str = "\n") -> None:
-		self._log(self.INFO, source, msg, end=end)
+	def remove_sink(self, sink) -> None:
+		self.sinks.remove(sink)
 
-	def error(self, source, msg, end: str = "\n") -> None:
-		self._log(self.ERROR, source, msg, end=end)
+	def flush(self) -> None:
+		# Push out what buffering sinks hold, e.g. before a reset
+		for sink in self.sinks:
+			sink.flush()
 
-	def _log(self, level: int, source, msg, end: str = "\n") -> None:
-		if level < self.level:
-			return
+	def enabled(self, level: int) -> bool:
+		return level >= self.level
 
-		try:
-			message = str(msg)
-		except Exception:
-			message = ""
+	# Level literals below: no attribute lookup before the level check
+	def debug(self, source, msg, *args, end: str = "\n") -> None:
+		if self.level <= 10:
+			self._log(10, source, msg, args, end)
+
+	def info(self, source, msg, *args, end: str = "\n") -> None:
+		if self.level <= 20:
+			self._log(20, source, msg, args, end)
 
-		# Build a simple timestamp. Use time.localtime when available and
-		# get milliseconds from ticks_ms if present. Fall back to time.time.
+	def error(self, source, msg, *args, end: str = "\n") -> None:
+		if self.level <= 30:
+			self._log(30, source, msg, args, end)
+
+	def _timestamp(self) -> str:
+		# "YYYY-MM-DD HH:MM:SS", cached for the current second. Use
+		# time.localtime when available, fall back to time.time.
 		try:
-			t = time.localtime()
-			if hasattr(time, "ticks_ms"):
-				ms = time.ticks_ms() % 1000
-			else:
-				ms = int((time.time() * 1000) % 1000)
-			ts = "{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}.{:03d}".format(
-				t[0], t[1], t[2], t[3], t[4], t[5], ms
-			)
+			sec = int(time.time())
+			if sec != self._ts_sec:
+				t = time.localtime(sec)
+				self._ts = "{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(
+					t[0], t[1], t[2], t[3], t[4], t[5]
+				)
+				self._ts_sec = sec
+			return self._ts
 		except Exception:
 			# Very minimal fallback
 			try:
-				ts = "t={}".format(int(time.time()))
+				return "t={}".format(int(time.time()))
 			except Exception:
-				ts = ""
+				return ""
+
+	def _log(self, level: int, source, msg, args=(), end: str = "\n") -> None:
+		if level < self.level:
+			return
+
+		# Milliseconds from ticks_ms if present
+		if hasattr(time, "ticks_ms"):
+			ms = time.ticks_ms() % 1000
+		else:
+			ms = int((time.time() * 1000) % 1000)
+
+		line = None
+		record = None
+		for sink in self.sinks:
+			if level < sink.level:
+				continue
+			if sink.binary:
+				if record is None:
+					defs, record = self.encoder.encode(level, int(time.time()), ms, source, msg, args)
+					if defs:
+						# Definitions go to every binary sink, whatever its level
+						for s in self.sinks:
+							if s.binary:
+								s.write(0, defs)
+				sink.write(level, record)
+			else:
+				if line is None:
+					try:
+						message = msg.format(*args) if args else str(msg)
+					except Exception:
+						message = str(msg)
+					level_name = self._LEVEL_NAMES.get(level, str(level))
+					line = "[{}.{:03d}] {} {} - {}".format(self._timestamp(), ms, level_name, source, message)
+				sink.write(level, line, end)
+
+
+class BinaryEncoder:
+	"""Packs log records into a few bytes (see REC_LOG).
+
+	Sources and message templates are interned: the first use of a string
+	emits a definition record giving it a small id, later records carry the
+	id and the raw args. The seconds of the timestamp go in a REC_TIME when
+	they change, records carry the ms. Lazy calls (logger.info(src, "{} events", n)) share
+	one template. Messages are stored inline once max_templates are defined
+	or the definitions (the header of every new file) reach max_header
+	bytes; pre-formatted f-string messages never repeat and only use up
+	that room, pass args instead.
+	"""
+
+	def __init__(self, max_sources: int = 255, max_templates: int = 1024, max_header: int = 2048):
+		self.max_sources = max_sources
+		self.max_templates = max_templates
+		self.max_header = max_header
+		self.sources = {}
+		self.templates = {}
+		self.sec = -1
+		self._header = 0
+
+	def _intern(self, table: dict, kind: int, text: str, limit: int, defs: list) -> int:
+		i = table.get(text)
+		if i is None:
+			if len(table) >= limit:
+				return -1
+			i = len(table)
+			table[text] = i
+			d = self._define(kind, i, text)
+			self._header += len(d)
+			defs.append(d)
+		return i
+
+	def _define(self, kind: int, i: int, text: str) -> bytes:
+		data = text.encode()[:255]
+		return struct.pack(DEF_HEADER, kind, i, len(data)) + data
+
+	def definitions(self, sec: int = -1) -> bytes:
+		"""All strings interned so far and a REC_TIME, what a new file needs
+		to decode on its own. sec is the second of the records that follow
+		(encoded earlier, e.g. buffered), the current one by default."""
+		out = []
+		for text, i in self.sources.items():
+			out.append(self._define(REC_SOURCE, i, text))
+		for text, i in self.templates.items():
+			out.append(self._define(REC_TEMPLATE, i, text))
+		if sec < 0:
+			sec = self.sec
+		if sec >= 0:
+			out.append(struct.pack(TIME_HEADER, REC_TIME, sec))
+		return b"".join(out)
+
+	def encode(self, level: int, sec: int, ms: int, source, msg, args) -> tuple:
+		"""(definitions, record): bytes of the new definitions and time
+		(may be empty), which every binary sink needs, and of the record"""
+		defs = []
+		sec &= 0xffffffff
+		if sec != self.sec:
+			self.sec = sec
+			defs.append(struct.pack(TIME_HEADER, REC_TIME, sec))
+		src = self._intern(self.sources, REC_SOURCE, str(source), self.max_sources, defs)
+		msg = str(msg)
+		tpl = self.templates.get(msg, -1)
+		if tpl < 0 and self._header < self.max_header:
+			tpl = self._intern(self.templates, REC_TEMPLATE, msg, self.max_templates, defs)
+		if tpl < 0:
+			args = (msg,) + tuple(args)
+			tpl = NO_TEMPLATE
+		out = [struct.pack(LOG_HEADER, REC_LOG, level, ms, src & 0xff, tpl, len(args))]
+		for a in args:
+			if a is None:
+				out.append(bytes((ARG_NONE,)))
+			elif a is True or a is False:
+				out.append(struct.pack(">B?", ARG_BOOL, a))
+			elif isinstance(a, int) and -0x80 <= a < 0x80:
+				out.append(struct.pack(">Bb", ARG_INT8, a))
+			elif isinstance(a, int) and -0x8000 <= a < 0x8000:
+				out.append(struct.pack(">Bh", ARG_INT16, a))
+			elif isinstance(a, int) and -0x80000000 <= a < 0x80000000:
+				out.append(struct.pack(">Bi", ARG_INT, a))
+			elif isinstance(a, float):
+				out.append(struct.pack(">Bf", ARG_FLOAT, a))
+			else:
+				data = str(a).encode()[:255]
+				out.append(struct.pack(">BB", ARG_STR, len(data)))
+				out.append(data)
+		return b"".join(defs), b"".join(out)
+
 
-		level_name = self._LEVEL_NAMES.get(level, str(level))
-		src = str(source)
-		print("[{}] {} {} - {}".format(ts, level_name, src, message), end=end)
+class ConsoleSink:
+	"""print() every line (USB serial / REPL)."""
+
+	binary = False
+
+	def __init__(self, level: int = 0):
+		self.level = level
+
+	def write(self, level: int, line: str, end: str = "\n") -> None:
+		print(line, end=end)
+
+	def flush(self) -> None:
+		pass
+
+
+class RingSink:
+	"""The last size lines in RAM, oldest overwritten first.
+
+	Costs only a reference per line; dump() them on demand, e.g. from the
+	REPL or when an error is caught, after running headless.
+	"""
+
+	binary = False
+
+	def __init__(self, size: int = 32, level: int = 0):
+		self.level = level
+		self._lines = [None] * size
+		self._next = 0
+		self._count = 0
+
+	def write(self, level: int, line: str, end: str = "\n") -> None:
+		self._lines[self._next] = line
+		self._next = (self._next + 1) % len(self._lines)
+		if self._count < len(self._lines):
+			self._count += 1
+
+	def flush(self) -> None:
+		pass
+
+	def lines(self) -> list:
+		# Oldest first
+		n = len(self._lines)
+		start = (self._next - self._count) % n
+		return [self._lines[(start + i) % n] for i in range(self._count)]
+
+	def dump(self, out=print) -> None:
+		for line in self.lines():
+			out(line)
+
+	def clear(self) -> None:
+		for i in range(len(self._lines)):
+			self._lines[i] = None
+		self._next = 0
+		self._count = 0
+
+
+class FileSink:
+	"""Lines appended to a file on flash, in block sized writes.
+
+	Lines collect in a RAM buffer of block bytes (match the filesystem
+	block, 4096 on the rp2's littlefs) and are written when it is full,
+	so the flash sees one program per block rather than per line. Records
+	at flush_level or above are written at once. When the file would grow
+	past max_bytes it is renamed to path.1 (path.1 to path.2 ..., keeping
+	backups files) and a new one is started. Lines still in the buffer are
+	lost on a reset; call flush() (or Logger.flush()) before one.
+
+	With binary the file holds BinaryEncoder records; every file starts with
+	the definitions made so far and the time of its first record, so each
+	one decodes on its own.
+	"""
+
+	def __init__(self, path: str, level: int = 0, block: int = 4096, max_bytes: int = 65536,
+	             backups: int = 1, flush_level: int = 30, binary: bool = False):
+		self.level = level
+		self.binary = binary
+		self.encoder = None
+		self._sec = -1
+		self.path = path
+		self.max_bytes = max_bytes
+		self.backups = backups
+		self.flush_level = flush_level
+		self._buf = bytearray(block)
+		self._n = 0
+		try:
+			self._size = os.stat(path)[6]
+		except OSError:
+			self._size = 0
+		self.writes = 0
+		self.rotations = 0
+
+	def write(self, level: int, line, end: str = "\n") -> None:
+		data = line if self.binary else (line + end).encode()
+		buf = self._buf
+		n = len(data)
+		if self._n + n > len(buf):
+			self.flush()
+		if self.encoder and not self._n:
+			# Second of the records about to be buffered; the header of a
+			# file started when they are written must give it, not the
+			# second then
+			self._sec = self.encoder.sec
+		if n > len(buf):
+			# Longer than a block, write it on its own
+			self._write(data)
+		else:
+			buf[self._n:self._n + n] = data
+			self._n += n
+		if level >= self.flush_level:
+			self.flush()
+
+	def flush(self) -> None:
+		if self._n:
+			self._write(memoryview(self._buf)[:self._n])
+			self._n = 0
+
+	def _write(self, data) -> None:
+		if self._size and self._size + len(data) > self.max_bytes:
+			self._rotate()
+		with open(self.path, "ab") as f:
+			if not self._size and self.encoder:
+				header = self.encoder.definitions(self._sec)
+				f.write(header)
+				self._size += len(header)
+			f.write(data)
+		self._size += len(data)
+		self.writes += 1
+
+	def _rotate(self) -> None:
+		# path.{backups-1} -> path.{backups}, ..., path -> path.1
+		for i in range(self.backups, 0, -1):
+			src = self.path if i == 1 else "{}.{}".format(self.path, i - 1)
+			dst = "{}.{}".format(self.path, i)
+			try:
+				os.remove(dst)
+			except OSError:
+				pass
+			try:
+				os.rename(src, dst)
+			except OSError:
+				pass
+		if not self.backups:
+			try:
+				os.remove(self.path)
+			except OSError:
+				pass
+		self._size = 0
+		self.rotations += 1
 
 # DEVTODO I dont think i need a function to create the class instance
 def get_logger(level: int = Logger.INFO) -> Logger:
 	return Logger(level=level)
 
 
-__all__ = ["Logger", "get_logger"]
+__all__ = ["Logger", "ConsoleSink", "RingSink", "FileSink", "get_logger"]
 
@@ -1,6 +1,7 @@
 import gc
-from machine import Pin
-from time import sleep, sleep_ms
+from array import array
+from machine import Pin, idle
+from time import sleep, sleep_ms, ticks_ms, ticks_us, ticks_diff
 
 TX_BASE_ADDR = 0x00
 RX_BASE_ADDR = 0x00
@@ -22,8 +23,8 @@ REG_FIFO_RX_BASE_ADDR = 0x0f
 REG_FIFO_RX_CURRENT_ADDR = 0x10
 REG_IRQ_FLAGS = 0x12
 REG_RX_NB_BYTES = 0x13
+REG_PKT_SNR_VALUE = 0x19
 REG_PKT_RSSI_VALUE = 0x1a
-REG_PKT_SNR_VALUE = 0x1b
 REG_MODEM_CONFIG_1 = 0x1d
 REG_MODEM_CONFIG_2 = 0x1e
 REG_PREAMBLE_MSB = 0x20
@@ -44,50 +45,116 @@ MODE_RX_CONTINUOUS = 0x05
 
 IRQ_TX_DONE_MASK = 0x08
 IRQ_PAYLOAD_CRC_ERROR_MASK = 0x20
+IRQ_RX_DONE_MASK = 0x40
+
+# REG_DIO_MAPPING_1 bits 7-6 select what DIO0 signals
+DIO0_RX_DONE = 0x00
+DIO0_TX_DONE = 0x40
 
 MAX_PKT_LENGTH = 255
 
+# Keyword arguments accepted by LoRa.configure()
+_SETTINGS = ('frequency', 'bandwidth', 'spreading_factor', 'coding_rate', 'preamble_length',
+             'crc', 'implicit', 'tx_power', 'sync_word')
+
+# Signal bandwidths selected by REG_MODEM_CONFIG_1 bits 7-4
+BANDWIDTHS = (7800, 10400, 15600, 20800, 31250, 41700, 62500, 125000, 250000, 500000)
+
+# When the driver runs gc.collect() (see set_gc_policy)
+GC_NEVER = 0      # leave it to MicroPython's automatic collection
+GC_EVERY_N = 1    # every N packets
+GC_LOW_MEM = 2    # when gc.mem_free() drops below a threshold
+
+# Contiguous block read in one transaction when a packet arrives:
+# FIFO_RX_CURRENT_ADDR (0x10) through PKT_RSSI_VALUE (0x1a)
+RX_STATUS_LEN = REG_PKT_RSSI_VALUE - REG_FIFO_RX_CURRENT_ADDR + 1
+RX_STATUS_IRQ_FLAGS = REG_IRQ_FLAGS - REG_FIFO_RX_CURRENT_ADDR
+RX_STATUS_NB_BYTES = REG_RX_NB_BYTES - REG_FIFO_RX_CURRENT_ADDR
+RX_STATUS_RSSI = REG_PKT_RSSI_VALUE - REG_FIFO_RX_CURRENT_ADDR
+RX_STATUS_SNR = REG_PKT_SNR_VALUE - REG_FIFO_RX_CURRENT_ADDR
+
 class LoRa:
 
     def __init__(self, spi, **kw):
         self.spi = spi
         self.cs = kw['cs']
         self.rx = kw['rx']
+        # Preallocated SPI buffers so register access never touches the heap
+        self._cmd = bytearray(2)
+        self._resp = bytearray(2)
+        self._addr = bytearray(1)
+        self._rx_status = bytearray(RX_STATUS_LEN)
+        # SPI sequences in progress in the main context; a DIO0 IRQ during
+        # one is deferred until it ends (see _irq_dio0)
+        self._hold = 0
+        self._irq_pending = False
+        # ms spent per operating mode, indexed by mode (see mode_times). A
+        # list of ints: a 32-bit array would wrap after 49.7 days of sleep
+        self.mode_ms = [0] * 8
+        self._mode = MODE_SLEEP
+        self._mode_since = ticks_ms()
         reg_ver = self._read(REG_VERSION)
         while self._read(REG_VERSION) != 0x12:
             sleep_ms(100)
             raise Exception(f"Invalid version or bad SPI connection, reg ver: {reg_ver}")
+        # Shadow copies of the configuration registers (see _write_cfg)
+        self._shadow = bytearray(0x80)
+        self._cached = bytearray(0x80)
         self.sleep()
-        self.set_frequency(kw.get('frequency', 915.0))
-        self.set_bandwidth(kw.get('bandwidth', 250000))
-        self.set_spreading_factor(kw.get('spreading_factor', 10))
-        self.set_coding_rate(kw.get('coding_rate', 5))
-        self.set_preamble_length(kw.get('preamble_length', 8))
-        self.set_crc(kw.get('crc', False))
-        # set LNA boost
-        self._write(REG_LNA, self._read(REG_LNA) | 0x03)
-        # set auto AGC
-        self._write(REG_MODEM_CONFIG_3, 0x00)
-        self.set_tx_power(kw.get('tx_power', 24))
-        self._implicit = kw.get('implicit', False)
-        self.set_implicit(self._implicit)
-        self.set_sync_word(kw.get('sync_word', 0x12))
+        self._frequency = 915.0
+        self._bandwidth = 250000
+        self._bw_index = 8
+        self._sf = 10
+        self._cr = 1
+        self._crc = False
+        self._implicit = False
+        self.configure(
+            frequency=kw.get('frequency', 915.0),
+            bandwidth=kw.get('bandwidth', 250000),
+            spreading_factor=kw.get('spreading_factor', 10),
+            coding_rate=kw.get('coding_rate', 5),
+            preamble_length=kw.get('preamble_length', 8),
+            crc=kw.get('crc', False),
+            implicit=kw.get('implicit', False),
+            tx_power=kw.get('tx_power', 24),
+            sync_word=kw.get('sync_word', 0x12))
+        # set LNA gain G1 with LNA boost (reset value 0x20 | 0x03)
+        self._write_cfg(REG_LNA, 0x23)
         self._on_recv = kw.get('on_recv', None)
+        self._on_tx_done = kw.get('on_tx_done', None)
+        self._tx_busy = False
+        self._rx_ring = None
+        self.set_gc_policy(kw.get('gc_policy', GC_NEVER), kw.get('gc_every', 8), kw.get('gc_min_free', 16384))
         self._write(REG_FIFO_TX_BASE_ADDR, TX_BASE_ADDR)
         self._write(REG_FIFO_RX_BASE_ADDR, RX_BASE_ADDR)
         self.standby()
 
     def begin_packet(self):
+        self.wait_tx()
         self.standby()
+        # A packet received before standby shares the FIFO with the payload
+        # about to be written: take it now, send() holds back its IRQ
+        f = self._read_rx_status()[RX_STATUS_IRQ_FLAGS]
+        if f & IRQ_RX_DONE_MASK:
+            self._irq_recv(f)
         self._write(REG_FIFO_ADDR_PTR, TX_BASE_ADDR)
         self._write(REG_PAYLOAD_LENGTH, 0)
 
-    def end_packet(self):
+    def end_packet(self, wait=True):
+        if not wait and self.rx:
+            # Map DIO0 to TxDone and return; _irq_dio0 reports completion
+            self._tx_busy = True
+            self._write(REG_DIO_MAPPING_1, DIO0_TX_DONE)
+            self.rx.irq(handler=self._irq_dio0, trigger=Pin.IRQ_RISING)
+            self._write(REG_OP_MODE, MODE_LORA | MODE_TX)
+            self._enter(MODE_TX)
+            return
         self._write(REG_OP_MODE, MODE_LORA | MODE_TX)
+        self._enter(MODE_TX)
         while (self._read(REG_IRQ_FLAGS) & IRQ_TX_DONE_MASK) == 0:
             pass
         self._write(REG_IRQ_FLAGS, IRQ_TX_DONE_MASK)
-        gc.collect()
+        self._enter(MODE_STDBY)
 
     def write_packet(self, b):
         n = self._read(REG_PAYLOAD_LENGTH)
@@ -95,16 +162,67 @@ class LoRa:
         p = MAX_PKT_LENGTH - TX_BASE_ADDR
         if n + m > p:
             raise ValueError('Max payload length is ' + str(p))
-        for i in range(m):
-            self._write(REG_FIFO, b[i])
+        self._write_burst(REG_FIFO, b)
         self._write(REG_PAYLOAD_LENGTH, n + m)
 
-    def send(self, x):
+    def send(self, x, wait=True):
+        # wait=False returns as soon as TX starts (needs the DIO0 pin); the
+        # on_tx_done callback runs when the radio is done and back in standby
         if isinstance(x, str):
             x = x.encode()
-        self.begin_packet()
-        self.write_packet(x)
-        self.end_packet()
+        self.wait_tx()
+        # An RX IRQ in between would move the FIFO pointer under the payload
+        self._hold += 1
+        try:
+            self.begin_packet()
+            self.write_packet(x)
+            self.end_packet(wait)
+        finally:
+            self._release()
+        # With wait=False this overlaps the collection with the airtime
+        self.maybe_collect()
+
+    def set_gc_policy(self, policy, every=8, min_free=16384):
+        self._gc_policy = policy
+        self._gc_every = every
+        self._gc_min_free = min_free
+        self._gc_count = 0
+        self.gc_runs = 0
+        self.gc_us = 0
+        self.gc_max_us = 0
+
+    def maybe_collect(self):
+        # Count one packet and collect if the policy says so. Call from main
+        # context only: send() does, receivers call it after taking a packet.
+        policy = self._gc_policy
+        if policy == GC_NEVER:
+            return False
+        if policy == GC_EVERY_N:
+            self._gc_count += 1
+            if self._gc_count < self._gc_every:
+                return False
+            self._gc_count = 0
+        elif gc.mem_free() >= self._gc_min_free:
+            return False
+        t = ticks_us()
+        gc.collect()
+        dt = ticks_diff(ticks_us(), t)
+        self.gc_runs += 1
+        self.gc_us += dt
+        if dt > self.gc_max_us:
+            self.gc_max_us = dt
+        return True
+
+    def gc_stats(self):
+        # (collections run, total us spent in them, longest single one in us)
+        return self.gc_runs, self.gc_us, self.gc_max_us
+
+    def tx_busy(self):
+        return self._tx_busy
+
+    def wait_tx(self):
+        while self._tx_busy:
+            idle()
 
     def _get_irq_flags(self):
         f = self._read(REG_IRQ_FLAGS)
@@ -112,128 +230,387 @@ class LoRa:
         return f
 
     def get_rssi(self):
-        rssi = self._read(REG_PKT_RSSI_VALUE)
+        return self._rssi_dbm(self._read(REG_PKT_RSSI_VALUE))
+
+    def _rssi_dbm(self, rssi):
         if self._frequency >= 779.0:
             return rssi - 157
         return rssi - 164
 
     def get_snr(self):
-        return self._read(REG_PKT_SNR_VALUE) * 0.25
+        snr = self._read(REG_PKT_SNR_VALUE)
+        return (snr - 256 if snr > 127 else snr) * 0.25
 
     def standby(self):
         self._write(REG_OP_MODE, MODE_LORA | MODE_STDBY)
+        self._enter(MODE_STDBY)
 
     def sleep(self):
+        # Lowest power mode: configuration registers are retained, the FIFO
+        # is not accessible and is cleared
         self._write(REG_OP_MODE, MODE_LORA | MODE_SLEEP)
+        self._enter(MODE_SLEEP)
+
+    def _enter(self, mode):
+        # Account the time spent in the previous mode
+        now = ticks_ms()
+        self.mode_ms[self._mode] += ticks_diff(now, self._mode_since)
+        self._mode = mode
+        self._mode_since = now
+
+    def mode_times(self):
+        # ms spent in sleep, standby, TX and RX since power up
+        self._enter(self._mode)
+        m = self.mode_ms
+        return m[MODE_SLEEP], m[MODE_STDBY], m[MODE_TX], m[MODE_RX_CONTINUOUS]
+
+    def configure(self, **kw):
+        # Apply several settings at once. The modem config registers are
+        # computed from the final values and each written at most once.
+        for k in kw:
+            if k not in _SETTINGS:
+                raise ValueError('Unknown setting ' + k)
+        if 'frequency' in kw:
+            self.set_frequency(kw['frequency'])
+        if 'bandwidth' in kw:
+            self._set_bandwidth(kw['bandwidth'])
+        if 'spreading_factor' in kw:
+            self._set_spreading_factor(kw['spreading_factor'])
+        if 'coding_rate' in kw:
+            self._cr = min(max(kw['coding_rate'], 5), 8) - 4
+        if 'crc' in kw:
+            self._crc = bool(kw['crc'])
+        if 'implicit' in kw:
+            self._implicit = bool(kw['implicit'])
+        self._write_modem_config()
+        if 'preamble_length' in kw:
+            self.set_preamble_length(kw['preamble_length'])
+        if 'tx_power' in kw:
+            self.set_tx_power(kw['tx_power'])
+        if 'sync_word' in kw:
+            self.set_sync_word(kw['sync_word'])
 
     def set_tx_power(self, level, outputPin=PA_OUTPUT_PA_BOOST_PIN):
         if outputPin == PA_OUTPUT_RFO_PIN:
             level = min(max(level, 0), 14)
-            self._write(REG_PA_CONFIG, 0x70 | level)
+            self._write_cfg(REG_PA_CONFIG, 0x70 | level)
         else:
             level = min(max(level, 2), 17)
-            self._write(REG_PA_CONFIG, PA_BOOST | (level - 2))
+            self._write_cfg(REG_PA_CONFIG, PA_BOOST | (level - 2))
 
     def set_frequency(self, frequency):
         self._frequency = frequency
         hz = frequency * 1000000.0
         x = round(hz / 61.03515625)
-        self._write(REG_FRF_MSB, (x >> 16) & 0xff)
-        self._write(REG_FRF_MID, (x >> 8) & 0xff)
-        self._write(REG_FRF_LSB, x & 0xff)
+        self._write_cfg(REG_FRF_MSB, (x >> 16) & 0xff)
+        self._write_cfg(REG_FRF_MID, (x >> 8) & 0xff)
+        self._write_cfg(REG_FRF_LSB, x & 0xff)
 
     def set_spreading_factor(self, sf):
+        self._set_spreading_factor(sf)
+        self._write_modem_config()
+
+    def _set_spreading_factor(self, sf):
         if sf < 6 or sf > 12:
             raise ValueError('Spreading factor must be between 6-12')
-        self._write(REG_DETECTION_OPTIMIZE, 0xc5 if sf == 6 else 0xc3)
-        self._write(REG_DETECTION_THRESHOLD, 0x0c if sf == 6 else 0x0a)
-        reg2 = self._read(REG_MODEM_CONFIG_2)
-        self._write(REG_MODEM_CONFIG_2, (reg2 & 0x0f) | ((sf << 4) & 0xf0))
-        self._write(REG_MODEM_CONFIG_3, 0x08 if (sf > 10 and self._bandwidth < 250000) else 0x00)
+        self._sf = sf
 
     def set_bandwidth(self, bw):
+        self._set_bandwidth(bw)
+        self._write_modem_config()
+
+    def _set_bandwidth(self, bw):
         self._bandwidth = bw
-        bws = (7800, 10400, 15600, 20800, 31250, 41700, 62500, 125000, 250000)
+        bws = BANDWIDTHS
         i = 9
-        for j in range(len(bws)):
+        for j in range(len(bws) - 1):
             if bw <= bws[j]:
                 i = j
                 break
-        x = self._read(REG_MODEM_CONFIG_1) & 0x0f
-        self._write(REG_MODEM_CONFIG_1, x | (i << 4))
+        self._bw_index = i
 
     def set_coding_rate(self, denom):
-        denom = min(max(denom, 5), 8)
-        cr = denom - 4
-        reg1 = self._read(REG_MODEM_CONFIG_1)
-        self._write(REG_MODEM_CONFIG_1, (reg1 & 0xf1) | (cr << 1))
+        self._cr = min(max(denom, 5), 8) - 4
+        self._write_modem_config()
 
     def set_preamble_length(self, n):
-        self._write(REG_PREAMBLE_MSB, (n >> 8) & 0xff)
-        self._write(REG_PREAMBLE_LSB, (n >> 0) & 0xff)
+        self._preamble = n
+        self._write_cfg(REG_PREAMBLE_MSB, (n >> 8) & 0xff)
+        self._write_cfg(REG_PREAMBLE_LSB, (n >> 0) & 0xff)
 
     def set_crc(self, crc=False):
-        modem_config_2 = self._read(REG_MODEM_CONFIG_2)
-        if crc:
-            config = modem_config_2 | 0x04
-        else:
-            config = modem_config_2 & 0xfb
-        self._write(REG_MODEM_CONFIG_2, config)
-
-    def set_sync_word(self, sw):
-        self._write(REG_SYNC_WORD, sw) 
+        self._crc = crc
+        self._write_modem_config()
 
     def set_implicit(self, implicit=False):
-        if self._implicit != implicit:
-            self._implicit = implicit
-            modem_config_1 = self._read(REG_MODEM_CONFIG_1)
-            if implicit:
-                config = modem_config_1 | 0x01
-            else:
-                config = modem_config_1 & 0xfe
-            self._write(REG_MODEM_CONFIG_1, config)
+        self._implicit = implicit
+        self._write_modem_config()
+
+    def set_sync_word(self, sw):
+        self._write_cfg(REG_SYNC_WORD, sw)
+
+    def _ldro(self):
+        # Low data rate optimization, needed for long symbols
+        return self._sf > 10 and self._bandwidth < 250000
+
+    def _write_modem_config(self):
+        sf = self._sf
+        self._write_cfg(REG_DETECTION_OPTIMIZE, 0xc5 if sf == 6 else 0xc3)
+        self._write_cfg(REG_DETECTION_THRESHOLD, 0x0c if sf == 6 else 0x0a)
+        self._write_cfg(REG_MODEM_CONFIG_1, (self._bw_index << 4) | (self._cr << 1) | (0x01 if self._implicit else 0x00))
+        self._write_cfg(REG_MODEM_CONFIG_2, (sf << 4) | (0x04 if self._crc else 0x00))
+        self._write_cfg(REG_MODEM_CONFIG_3, 0x08 if self._ldro() else 0x00)
+
+    def airtime_us(self, n):
+        # Time on air of an n byte payload with the current settings, per
+        # the SX1276 datasheet (section 4.1.1.7)
+        sf = self._sf
+        t_sym = (1 << sf) * 1000000 / BANDWIDTHS[self._bw_index]
+        de = 1 if self._ldro() else 0
+        ih = 1 if self._implicit else 0
+        crc = 1 if self._crc else 0
+        x = 8 * n - 4 * sf + 28 + 16 * crc - 20 * ih
+        d = 4 * (sf - 2 * de)
+        symbols = 8 + max(-(-x // d) * (self._cr + 4), 0)
+        return int((self._preamble + 4.25 + symbols) * t_sym)
 
     def on_recv(self, callback):
         self._on_recv = callback
+        self._update_rx_irq()
+
+    def set_rx_ring(self, ring):
+        # Received packets go into the ring's preallocated slots instead of
+        # being handed to the on_recv callback
+        self._rx_ring = ring
+        self._update_rx_irq()
+
+    def _update_rx_irq(self):
         if self.rx:
-            if callback:
-                self._write(REG_DIO_MAPPING_1, 0x00)
-                self.rx.irq(handler=self._irq_recv, trigger=Pin.IRQ_RISING)
-            else:
+            if self._on_recv or self._rx_ring is not None:
+                self._write(REG_DIO_MAPPING_1, DIO0_RX_DONE)
+                self.rx.irq(handler=self._irq_dio0, trigger=Pin.IRQ_RISING)
+            elif not self._tx_busy:
                 self.rx.irq(handler=None, trigger=0)
 
-    def recv(self):
-        self._write(REG_OP_MODE, MODE_LORA | MODE_RX_CONTINUOUS) 
+    def on_tx_done(self, callback):
+        self._on_tx_done = callback
 
-    def _irq_recv(self, event_source):
-        f = self._get_irq_flags()
+    def recv(self):
+        self._write(REG_OP_MODE, MODE_LORA | MODE_RX_CONTINUOUS)
+        self._enter(MODE_RX_CONTINUOUS)
+
+    def _irq_dio0(self, event_source):
+        # The IRQ can land between two SPI transfers of the main context,
+        # e.g. after it asserted CS; doing SPI then would interleave with
+        # its transaction and overwrite the shared buffers. Leave it to
+        # the main context, which runs it as soon as it lets go (_release).
+        if self._hold:
+            self._irq_pending = True
+            return
+        self._dio0()
+
+    def _release(self):
+        # End of a main context SPI sequence, run a DIO0 IRQ deferred by it
+        self._hold -= 1
+        if self._irq_pending and not self._hold:
+            self._irq_pending = False
+            self._dio0()
+
+    def _dio0(self):
+        # Go by the flags, not by _tx_busy: an RxDone deferred over send()
+        # runs after end_packet() has started the TX
+        f = self._read_rx_status()[RX_STATUS_IRQ_FLAGS]
+        if f & IRQ_RX_DONE_MASK:
+            self._irq_recv(f)
+        if f & IRQ_TX_DONE_MASK and self._tx_busy:
+            self._irq_tx_done()
+
+    def _irq_tx_done(self):
+        self._write(REG_IRQ_FLAGS, IRQ_TX_DONE_MASK)
+        self._enter(MODE_STDBY)
+        self._tx_busy = False
+        # Hand DIO0 back to RxDone so a following recv() works as before
+        self._write(REG_DIO_MAPPING_1, DIO0_RX_DONE)
+        if self._on_tx_done:
+            self._on_tx_done()
+
+    def _irq_recv(self, f):
+        # f: the IRQ flags from _read_rx_status() for this packet
+        self._write(REG_IRQ_FLAGS, f & ~IRQ_TX_DONE_MASK)
         if f & IRQ_PAYLOAD_CRC_ERROR_MASK == 0:
-            if self._on_recv:
+            if self._rx_ring is not None:
+                self._rx_ring.put_from(self)
+            elif self._on_recv:
                 self._on_recv(self._read_payload())
 
-    def _read_payload(self):
-        self._write(REG_FIFO_ADDR_PTR, self._read(REG_FIFO_RX_CURRENT_ADDR))
+    def _read_rx_status(self):
+        # IRQ flags, RX byte count, packet RSSI and SNR in one transaction
+        self._read_burst(REG_FIFO_RX_CURRENT_ADDR, self._rx_status)
+        return self._rx_status
+
+    def _rx_length(self):
+        # Expects _read_rx_status() to have been called for this packet
+        s = self._rx_status
+        self._write(REG_FIFO_ADDR_PTR, s[0])
         if self._implicit:
-            n = self._read(REG_PAYLOAD_LENGTH)
-        else:
-            n = self._read(REG_RX_NB_BYTES)
-        payload = bytearray()
-        for i in range(n):
-            payload.append(self._read(REG_FIFO))
-        gc.collect()
+            return self._read(REG_PAYLOAD_LENGTH)
+        return s[RX_STATUS_NB_BYTES]
+
+    def _read_payload(self):
+        payload = bytearray(self._rx_length())
+        self._read_burst(REG_FIFO, payload)
         return bytes(payload)
 
-    def _transfer(self, addr, x=0x00):
-        resp = bytearray(1)
+    def _read_payload_into(self, views):
+        # views[k] is a preallocated memoryview of the first 16 * (k + 1)
+        # bytes of the destination. Reading up to 15 bytes past the packet
+        # (harmless for the FIFO) keeps this free of heap allocation.
+        n = self._rx_length()
+        if n:
+            self._read_burst(REG_FIFO, views[(n - 1) >> 4])
+        return n
+
+    # Burst access: one CS assertion, the address byte, then the whole buffer.
+    # The FIFO register streams through the FIFO instead of auto-incrementing.
+    def _write_burst(self, addr, buf):
+        self._hold += 1
+        self._addr[0] = addr | 0x80
         self.cs.value(0)
-        self.spi.write(bytes([addr]))
-        self.spi.write_readinto(bytes([x]), resp)
+        self.spi.write(self._addr)
+        self.spi.write(buf)
         self.cs.value(1)
-        return resp
+        self._release()
 
+    def _read_burst(self, addr, buf):
+        self._hold += 1
+        self._addr[0] = addr & 0x7f
+        self.cs.value(0)
+        self.spi.write(self._addr)
+        self.spi.readinto(buf)
+        self.cs.value(1)
+        self._release()
+
+    # Configuration registers are only changed by the driver, so a shadow copy
+    # replaces read-modify-write and rewriting an unchanged value is skipped
+    def _write_cfg(self, addr, x):
+        if self._cached[addr] and self._shadow[addr] == x:
+            return
+        self._shadow[addr] = x
+        self._cached[addr] = 1
+        self._write(addr, x)
+
+    # Single register access: address and data byte in one full-duplex
+    # transfer through the preallocated command/response buffers. _hold
+    # keeps the DIO0 IRQ from doing SPI in the middle of it.
     def _read(self, addr):
-        x = self._transfer(addr & 0x7f) 
-        return int.from_bytes(x, 'big')
+        self._hold += 1
+        cmd = self._cmd
+        cmd[0] = addr & 0x7f
+        cmd[1] = 0
+        self.cs.value(0)
+        self.spi.write_readinto(cmd, self._resp)
+        self.cs.value(1)
+        x = self._resp[1]
+        self._release()
+        return x
 
     def _write(self, addr, x):
-        self._transfer(addr | 0x80, x)
\ No newline at end of file
+        self._hold += 1
+        cmd = self._cmd
+        cmd[0] = addr | 0x80
+        cmd[1] = x
+        self.cs.value(0)
+        self.spi.write(cmd)
+        self.cs.value(1)
+        self._release()
+
+
+class PacketRing:
+    """Fixed set of preallocated packet slots filled by the DIO0 receive IRQ.
+
+    Each slot holds the payload, its length, the packet RSSI (dBm), SNR
+    (quarter dB) and the ticks_ms() it arrived, and filling one does not
+    allocate. The IRQ side only advances _wr and the reader only advances
+    _rd (both count modulo 2 * slots), so no locking is needed between them.
+    When all slots are full new packets are dropped and counted in
+    overflows. notify, if set, is called after each stored packet - e.g. an
+    asyncio.ThreadSafeFlag's set().
+
+    get()/get_into() set rssi, snr and ticks to the metadata of the packet
+    they just returned.
+    """
+
+    SLOT_SIZE = 256
+
+    def __init__(self, slots=8):
+        self.slots = slots
+        self._wrap = 2 * slots
+        self._bufs = []
+        self._views = []
+        for _ in range(slots):
+            buf = bytearray(self.SLOT_SIZE)
+            mv = memoryview(buf)
+            self._bufs.append(buf)
+            self._views.append([mv[:k] for k in range(16, self.SLOT_SIZE + 1, 16)])
+        self._lens = bytearray(slots)
+        self._rssi = array('h', [0] * slots)
+        self._snr = array('b', [0] * slots)
+        self._ticks = array('L', [0] * slots)
+        self._wr = 0
+        self._rd = 0
+        self.received = 0
+        self.overflows = 0
+        self.rssi = 0
+        self.snr = 0.0
+        self.ticks = 0
+        self.notify = None
+
+    def __len__(self):
+        return (self._wr - self._rd) % self._wrap
+
+    def any(self):
+        return self._wr != self._rd
+
+    def put_from(self, lora):
+        t = ticks_ms()
+        if len(self) == self.slots:
+            self.overflows += 1
+            return False
+        i = self._wr % self.slots
+        self._lens[i] = lora._read_payload_into(self._views[i])
+        s = lora._rx_status
+        self._rssi[i] = lora._rssi_dbm(s[RX_STATUS_RSSI])
+        snr = s[RX_STATUS_SNR]
+        self._snr[i] = snr - 256 if snr > 127 else snr
+        self._ticks[i] = t
+        self._wr = (self._wr + 1) % self._wrap
+        self.received += 1
+        if self.notify:
+            self.notify()
+        return True
+
+    def _pop(self):
+        i = self._rd % self.slots
+        self.rssi = self._rssi[i]
+        self.snr = self._snr[i] * 0.25
+        self.ticks = self._ticks[i]
+        return i
+
+    def get(self):
+        # Oldest packet as bytes, or None when empty
+        if self._wr == self._rd:
+            return None
+        i = self._pop()
+        pkt = bytes(memoryview(self._bufs[i])[:self._lens[i]])
+        self._rd = (self._rd + 1) % self._wrap
+        return pkt
+
+    def get_into(self, buf):
+        # Copy the oldest packet into buf, returns its length or -1 when empty
+        if self._wr == self._rd:
+            return -1
+        i = self._pop()
+        n = self._lens[i]
+        buf[:n] = memoryview(self._bufs[i])[:n]
+        self._rd = (self._rd + 1) % self._wrap
+        return n
@@ -0,0 +1,124 @@
+from lora import LoRa
+
+# Lowest SNR (dB) the SX127x demodulates per spreading factor (datasheet table 13)
+SNR_FLOOR = {6: -5.0, 7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}
+
+# dB per ADR step, about the sensitivity gained per SF step
+STEP_DB = 3
+
+
+class LinkAdr:
+    """
+    Adaptive data rate from the link quality the receiver reports in its ACKs.
+
+    After `history` ACKs the best reported SNR is compared with what the
+    current spreading factor needs plus margin_db; every STEP_DB of spare
+    margin first lowers the spreading factor (shorter airtime), then the TX
+    power. A negative margin raises the power. max_missed missing ACKs in a
+    row jump to full power and, if already there, raise the spreading factor.
+    Settings are applied with LoRa.configure(), so TxScheduler budgets and
+    airtime_us follow automatically.
+
+    An SX127x gateway receives one spreading factor at a time, so SF is only
+    adapted within min_sf..max_sf (both the current SF unless given); widen
+    the range only when the receiver follows the node's SF.
+
+    Attributes:
+        lora (LoRa): The radio being tuned.
+        sf (int): Current spreading factor.
+        tx_power (int): Current TX power, dBm.
+        changes (int): Setting changes made.
+        lost (int): Frames without an ACK.
+    """
+
+    lora: LoRa
+    sf: int
+    tx_power: int
+
+    def __init__(self,
+                 lora: LoRa,
+                 spreading_factor: int = 10,
+                 tx_power: int = 17,
+                 min_sf: int = 0,
+                 max_sf: int = 0,
+                 min_power: int = 2,
+                 max_power: int = 17,
+                 margin_db: float = 10.0,
+                 history: int = 4,
+                 max_missed: int = 3,
+                 ) -> None:
+        """
+        Args:
+            lora (LoRa): The radio, configured to spreading_factor/tx_power here.
+            spreading_factor (int): Starting SF.
+            tx_power (int): Starting TX power, dBm (PA_BOOST, 2-17).
+            min_sf (int): Lowest SF to step down to, 0 for spreading_factor.
+            max_sf (int): Highest SF to step up to, 0 for spreading_factor.
+            min_power (int): Lowest TX power, dBm.
+            max_power (int): Highest TX power, dBm.
+            margin_db (float): SNR kept above the demodulation floor.
+            history (int): ACKs collected before deciding.
+            max_missed (int): Missing ACKs in a row before stepping up.
+        """
+        self.lora = lora
+        self.sf = spreading_factor
+        self.tx_power = tx_power
+        self.min_sf = min_sf or spreading_factor
+        self.max_sf = max_sf or spreading_factor
+        self.min_power = min_power
+        self.max_power = max_power
+        self.margin_db = margin_db
+        self.max_missed = max_missed
+        self._snr = [0.0] * history
+        self._n = 0
+        self._missed = 0
+        self.changes = 0
+        self.lost = 0
+        lora.configure(spreading_factor=spreading_factor, tx_power=tx_power)
+
+    def on_ack(self, rssi: int, snr: float) -> bool:
+        """Feed the RSSI (dBm) and SNR (dB) an ACK reported. Returns True
+        when the settings changed."""
+        self._missed = 0
+        hist = self._snr
+        hist[self._n % len(hist)] = snr
+        self._n += 1
+        if self._n < len(hist):
+            return False
+        steps = int((max(hist) - SNR_FLOOR[self.sf] - self.margin_db) // STEP_DB)
+        sf = self.sf
+        power = self.tx_power
+        while steps > 0 and sf > self.min_sf:
+            sf -= 1
+            steps -= 1
+        while steps > 0 and power > self.min_power:
+            power = max(power - STEP_DB, self.min_power)
+            steps -= 1
+        while steps < 0 and power < self.max_power:
+            power = min(power + STEP_DB, self.max_power)
+            steps += 1
+        return self._apply(sf, power)
+
+    def on_loss(self) -> bool:
+        """Report a frame that was not acked. Returns True when the settings changed."""
+        self.lost += 1
+        self._missed += 1
+        if self._missed < self.max_missed:
+            return False
+        self._missed = 0
+        if self.tx_power < self.max_power:
+            return self._apply(self.sf, self.max_power)
+        if self.sf < self.max_sf:
+            return self._apply(self.sf + 1, self.tx_power)
+        return False
+
+    def _apply(self, sf: int, power: int) -> bool:
+        if sf == self.sf and power == self.tx_power:
+            return False
+        self.sf = sf
+        self.tx_power = power
+        self.lora.configure(spreading_factor=sf, tx_power=power)
+        self.changes += 1
+        # Measurements taken with the old settings no longer apply
+        self._n = 0
+        return True
@@ -0,0 +1,94 @@
+import asyncio
+from lora import LoRa, PacketRing
+
+
+class AsyncLoRa:
+    """
+    asyncio front end for the LoRa driver.
+
+    Lets several tasks (sensor polling, LED status, ACK waiting, ...) share
+    the radio without blocking each other:
+
+        alora = AsyncLoRa(lora)
+        alora.recv()
+        await alora.send_async(b"ping")
+        async for pkt in alora.packets():
+            ...
+
+    Received packets are stored by the DIO0 IRQ in a PacketRing and the IRQ
+    only sets a ThreadSafeFlag, so no user code runs in interrupt context.
+    On rp2 Pin IRQs are soft (delivered through micropython.schedule) and
+    ThreadSafeFlag.set() is safe from hard IRQs as well.
+
+    Attributes:
+        lora (LoRa): The underlying driver, it must have the DIO0 (rx) pin.
+        ring (PacketRing): Received packets not yet consumed.
+    """
+
+    lora: LoRa
+    ring: PacketRing
+
+    def __init__(self, lora: LoRa, slots: int = 8) -> None:
+        """
+        Args:
+            lora (LoRa): Driver instance created with cs and rx (DIO0) pins.
+            slots (int): Number of preallocated receive slots.
+        """
+        if not lora.rx:
+            raise ValueError("AsyncLoRa needs the DIO0 (rx) pin")
+        self.lora = lora
+        self.ring = PacketRing(slots)
+        self._rx_flag = asyncio.ThreadSafeFlag()
+        self._tx_flag = asyncio.ThreadSafeFlag()
+        self._tx_lock = asyncio.Lock()
+        self._listening = False
+        self.ring.notify = self._rx_flag.set
+        lora.on_tx_done(self._tx_flag.set)
+        lora.set_rx_ring(self.ring)
+
+    def recv(self) -> None:
+        """Start continuous receive; it is resumed after every send"""
+        self._listening = True
+        self.lora.recv()
+
+    def standby(self) -> None:
+        """Stop receiving"""
+        self._listening = False
+        self.lora.standby()
+
+    async def send_async(self, payload) -> None:
+        """Transmit payload and return once the radio reports TxDone.
+        Concurrent senders are serialized."""
+        async with self._tx_lock:
+            self._tx_flag.clear()
+            self.lora.send(payload, wait=False)
+            await self._tx_flag.wait()
+            if self._listening:
+                self.lora.recv()
+
+    async def recv_async(self) -> bytes:
+        """Next received packet. Its RSSI, SNR and arrival ticks_ms are in
+        ring.rssi, ring.snr and ring.ticks until the next packet is taken."""
+        ring = self.ring
+        while not ring.any():
+            await self._rx_flag.wait()
+        pkt = ring.get()
+        self.lora.maybe_collect()
+        return pkt
+
+    def packets(self):
+        """Async iterator over received packets: `async for pkt in alora.packets()`"""
+        return _Packets(self)
+
+
+class _Packets:
+    # MicroPython has no async generators, so packets() returns this instead
+
+    def __init__(self, alora: AsyncLoRa) -> None:
+        self._alora = alora
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._alora.recv_async()
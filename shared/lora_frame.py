@@ -0,0 +1,147 @@
+"""
+Compact binary framing for LoRa packets.
+
+One frame carries several messages so a batch of pending events pays the
+preamble/header airtime once:
+
+    header   version|flags (B) node id (B) seq (H) count (B)
+    record   type (B) length (B) data (length bytes)   * count
+
+The low nibble of the first byte is the format version, the high nibble
+holds flags (FLAG_ACK_REQ). Multi-byte values are big-endian. Records
+carry their length, so a receiver skips message types it does not know. FORMATS maps message types to the
+struct format of their packed fields.
+"""
+
+import struct
+from lora import MAX_PKT_LENGTH
+
+VERSION = 1
+FLAG_ACK_REQ = 0x80    # sender waits for an MSG_ACK of this seq
+HEADER = ">BBHB"
+HEADER_LEN = 5
+RECORD_HEADER_LEN = 2
+
+# Message types
+MSG_PING = 0x01        # ping counter, also the heartbeat of event driven nodes
+MSG_ACK = 0x02         # node acked, seq acked, RSSI (dBm) and SNR (1/4 dB) it was heard with
+MSG_MAILBOX = 0x03     # door open (0/1), changes since the last report, opens so far
+MSG_LOG = 0x04         # one log line of the sender, utf-8 (log_ship.ShipSink)
+MSG_TEXT = 0x7f        # free form utf-8 text
+
+FORMATS = {
+    MSG_PING: ">H",
+    MSG_ACK: ">BHhb",
+    MSG_MAILBOX: ">BBH",
+}
+# Bytes of the packed fields per message type
+SIZES = {t: struct.calcsize(f) for t, f in FORMATS.items()}
+
+
+class FrameWriter:
+    """
+    Packs messages into one frame in a preallocated buffer.
+
+        w = FrameWriter(node_id=1)
+        w.begin(seq)
+        w.add_fields(MSG_PING, 42)
+        lora.send(w.frame())
+
+    Attributes:
+        node_id (int): Sender id written in every frame header.
+    """
+
+    node_id: int
+
+    def __init__(self, node_id: int, max_len: int = MAX_PKT_LENGTH) -> None:
+        self.node_id = node_id
+        self._buf = bytearray(max_len)
+        self._mv = memoryview(self._buf)
+        self._n = 0
+        self._count = 0
+
+    def begin(self, seq: int, flags: int = 0) -> None:
+        """Start a new frame with sequence number seq (16 bit, wraps)"""
+        self._n = HEADER_LEN
+        self._count = 0
+        struct.pack_into(HEADER, self._buf, 0, VERSION | flags, self.node_id, seq & 0xffff, 0)
+
+    def space(self) -> int:
+        """Data bytes that still fit in one more record"""
+        return max(len(self._buf) - self._n - RECORD_HEADER_LEN, 0)
+
+    def add(self, msg_type: int, data) -> bool:
+        """Append a record with raw data. False if it does not fit."""
+        n = len(data)
+        if n > 255 or n > self.space():
+            return False
+        i = self._n
+        self._buf[i] = msg_type
+        self._buf[i + 1] = n
+        self._mv[i + 2:i + 2 + n] = data
+        self._n = i + 2 + n
+        self._count += 1
+        self._buf[HEADER_LEN - 1] = self._count
+        return True
+
+    def add_fields(self, msg_type: int, *fields) -> bool:
+        """Append a record packing fields with FORMATS[msg_type]. False if
+        it does not fit."""
+        fmt = FORMATS[msg_type]
+        n = struct.calcsize(fmt)
+        if n > self.space():
+            return False
+        i = self._n
+        self._buf[i] = msg_type
+        self._buf[i + 1] = n
+        struct.pack_into(fmt, self._buf, i + 2, *fields)
+        self._n = i + 2 + n
+        self._count += 1
+        self._buf[HEADER_LEN - 1] = self._count
+        return True
+
+    def count(self) -> int:
+        return self._count
+
+    def frame(self) -> memoryview:
+        """The frame built so far (valid until the next begin)"""
+        return self._mv[:self._n]
+
+
+def header(frame) -> tuple:
+    """(node_id, seq, count) of a frame. Raises ValueError if it is not one."""
+    if len(frame) < HEADER_LEN:
+        raise ValueError("Frame too short")
+    version, node_id, seq, count = struct.unpack_from(HEADER, frame, 0)
+    if version & 0x0f != VERSION:
+        raise ValueError("Unknown frame version " + str(version & 0x0f))
+    return node_id, seq, count
+
+
+def flags(frame) -> int:
+    """Flag bits of a frame header (FLAG_ACK_REQ)"""
+    return frame[0] & 0xf0
+
+
+def records(frame):
+    """Yield (msg_type, data) for each record; data is a memoryview into frame.
+    Stops at a truncated record, skips records too short for their FORMATS."""
+    mv = memoryview(frame)
+    i = HEADER_LEN
+    end = len(frame)
+    while i + RECORD_HEADER_LEN <= end:
+        msg_type = mv[i]
+        n = mv[i + 1]
+        if i + RECORD_HEADER_LEN + n > end:
+            return
+        if n >= SIZES.get(msg_type, 0):
+            yield msg_type, mv[i + 2:i + 2 + n]
+        i += RECORD_HEADER_LEN + n
+
+
+def fields(msg_type: int, data) -> tuple:
+    """Unpack the fields of a record whose type is in FORMATS. Raises
+    ValueError if data is too short."""
+    if len(data) < SIZES[msg_type]:
+        raise ValueError("Record too short")
+    return struct.unpack_from(FORMATS[msg_type], data, 0)
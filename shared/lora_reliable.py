@@ -0,0 +1,216 @@
+import asyncio
+import random
+import time
+from lora_async import AsyncLoRa
+from lora_frame import FrameWriter, FLAG_ACK_REQ, MSG_ACK, HEADER_LEN, RECORD_HEADER_LEN, header, flags, records, \
+    fields
+
+
+class Peer:
+    """
+    What a ReliableLink knows about one remote node.
+
+    Attributes:
+        last_seq (int): Sequence number of the last frame delivered, -1 before the first.
+        frames (int): Frames delivered.
+        duplicates (int): Retransmitted frames that were acked again but not delivered.
+        acks (int): ACKs received from this node for our frames.
+        rssi (int): RSSI of the last frame heard from it, dBm.
+        snr (float): SNR of the last frame heard from it, dB.
+        heard_rssi (int): RSSI it reported for our last acked frame, dBm.
+        heard_snr (float): SNR it reported for our last acked frame, dB.
+        last_ms (int): ticks_ms of the last frame heard from it.
+    """
+
+    def __init__(self) -> None:
+        self.last_seq = -1
+        self.frames = 0
+        self.duplicates = 0
+        self.acks = 0
+        self.rssi = 0
+        self.snr = 0.0
+        self.heard_rssi = 0
+        self.heard_snr = 0.0
+        self.last_ms = 0
+
+
+class ReliableLink:
+    """
+    Acknowledged delivery of lora_frame frames.
+
+    A sender builds a frame on the writer returned by begin() and awaits
+    send(), which transmits it with FLAG_ACK_REQ and retries with exponential
+    backoff until the receiver answers with an MSG_ACK record carrying the
+    frame's sequence number:
+
+        link = ReliableLink(alora, node_id=1)
+        asyncio.create_task(link.run())
+        alora.recv()
+        w = link.begin()
+        w.add_fields(MSG_PING, n)
+        ok = await link.send()
+
+    run() is the receive side for both ends: it acks frames that ask for it
+    (reporting the RSSI/SNR they were heard with), matches incoming ACKs to
+    the frame being sent, drops retransmissions it has already delivered and
+    hands new frames to on_frame. Everything waits on the AsyncLoRa flags, so
+    nothing polls. Frames are sent stop-and-wait (one outstanding frame per
+    sender), so remembering the last sequence number per peer is enough to
+    suppress duplicates.
+
+    Attributes:
+        alora (AsyncLoRa): The radio.
+        node_id (int): Our id in frame headers and ACKs.
+        peers (dict): node id -> Peer, at most max_peers (least recently heard are dropped).
+        sent (int): Frames handed to send().
+        acked (int): Frames acked.
+        retries (int): Retransmissions.
+        failed (int): Frames given up on after all retries.
+        invalid (int): Received packets that were not frames or failed to process.
+    """
+
+    alora: AsyncLoRa
+    node_id: int
+
+    def __init__(self,
+                 alora: AsyncLoRa,
+                 node_id: int,
+                 max_retries: int = 3,
+                 ack_timeout_ms: int = 1000,
+                 backoff: int = 2,
+                 max_peers: int = 16,
+                 on_frame=None,
+                 acks: bool = True,
+                 ) -> None:
+        """
+        Args:
+            alora (AsyncLoRa): The radio, it must be receiving for ACKs to arrive.
+            node_id (int): Our node id (0-255).
+            max_retries (int): Retransmissions before send() gives up.
+            ack_timeout_ms (int): ACK wait after the first transmission; it is
+                multiplied by backoff after every retry and gets up to 255 ms
+                of random jitter so colliding senders drift apart.
+            backoff (int): Timeout multiplier per retry.
+            max_peers (int): Size of the peer table.
+            on_frame (function): Called as on_frame(node_id, seq, frame) for
+                every new frame; frame is only valid during the call.
+            acks (bool): Ack frames that ask for it. Frames carry no
+                destination, so only the gateway should; nodes that just
+                send pass False or nodes in range of each other ack (and
+                collide with) each other.
+        """
+        self.alora = alora
+        self.node_id = node_id
+        self.max_retries = max_retries
+        self.ack_timeout_ms = ack_timeout_ms
+        self.backoff = backoff
+        self.on_frame = on_frame
+        self.acks = acks
+        self.peers = {}
+        self._max_peers = max_peers
+        self.writer = FrameWriter(node_id)
+        self._ack_writer = FrameWriter(node_id, HEADER_LEN + RECORD_HEADER_LEN + 6)
+        # Random start so a rebooted node is not taken for a retransmission
+        self._seq = random.getrandbits(16)
+        self._wait_seq = -1
+        self._acked = asyncio.Event()
+        self.sent = 0
+        self.acked = 0
+        self.retries = 0
+        self.failed = 0
+        self.invalid = 0
+
+    def _next_seq(self) -> int:
+        self._seq = (self._seq + 1) & 0xffff
+        return self._seq
+
+    def begin(self) -> FrameWriter:
+        """Start the next frame; add records to the returned writer, then await send()"""
+        self.writer.begin(self._next_seq(), FLAG_ACK_REQ)
+        return self.writer
+
+    async def send(self) -> bool:
+        """Transmit the frame started with begin() until it is acked.
+        Returns False when it was not acked after max_retries retries."""
+        frame = self.writer.frame()
+        self._wait_seq = header(frame)[1]
+        self.sent += 1
+        timeout = self.ack_timeout_ms
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self.retries += 1
+                self._acked.clear()
+                await self.alora.send_async(frame)
+                try:
+                    await asyncio.wait_for_ms(self._acked.wait(), timeout + random.getrandbits(8))
+                    self.acked += 1
+                    return True
+                except asyncio.TimeoutError:
+                    timeout *= self.backoff
+            self.failed += 1
+            return False
+        finally:
+            self._wait_seq = -1
+
+    async def run(self) -> None:
+        """Receive loop, run it as a task"""
+        ring = self.alora.ring
+        async for pkt in self.alora.packets():
+            try:
+                node, seq, _ = header(pkt)
+            except ValueError:
+                self.invalid += 1
+                continue
+            try:
+                await self._received(pkt, node, seq, ring)
+            except Exception:
+                # A malformed record, or on_frame choking on one; the next
+                # packet must still get through
+                self.invalid += 1
+
+    async def _received(self, pkt, node: int, seq: int, ring) -> None:
+        peer = self._peer(node)
+        peer.rssi = ring.rssi
+        peer.snr = ring.snr
+        peer.last_ms = ring.ticks
+        for msg_type, data in records(pkt):
+            if msg_type == MSG_ACK:
+                self._ack(peer, data)
+        if self.acks and flags(pkt) & FLAG_ACK_REQ:
+            # Ack duplicates too, the first ACK may have been lost
+            await self._send_ack(node, seq, peer.rssi, peer.snr)
+        if seq == peer.last_seq:
+            peer.duplicates += 1
+            return
+        peer.last_seq = seq
+        peer.frames += 1
+        if self.on_frame:
+            self.on_frame(node, seq, pkt)
+
+    def _ack(self, peer: Peer, data) -> None:
+        node, seq, rssi, snr = fields(MSG_ACK, data)
+        if node != self.node_id:
+            return
+        peer.acks += 1
+        peer.heard_rssi = rssi
+        peer.heard_snr = snr * 0.25
+        if seq == self._wait_seq:
+            self._acked.set()
+
+    async def _send_ack(self, node: int, seq: int, rssi: int, snr: float) -> None:
+        # ACK frames take a fresh seq so the peer never drops one as a duplicate
+        w = self._ack_writer
+        w.begin(self._next_seq())
+        w.add_fields(MSG_ACK, node, seq, rssi, int(snr * 4))
+        await self.alora.send_async(w.frame())
+
+    def _peer(self, node: int) -> Peer:
+        peer = self.peers.get(node)
+        if peer is None:
+            if len(self.peers) >= self._max_peers:
+                now = time.ticks_ms()
+                oldest = max(self.peers, key=lambda n: time.ticks_diff(now, self.peers[n].last_ms))
+                del self.peers[oldest]
+            peer = self.peers[node] = Peer()
+        return peer
@@ -0,0 +1,119 @@
+import time
+from lora import LoRa
+
+
+class TxScheduler:
+    """
+    Transmit scheduler that keeps the radio inside a duty-cycle budget.
+
+    The budget is a token bucket of airtime: it holds at most max_burst_ms
+    of airtime and refills at the rest of the duty cycle, so that a full
+    bucket plus what flows in over window_ms never exceeds
+    duty_cycle * window_ms in any window. A send is only started when the
+    budget covers its time on air (LoRa.airtime_us), so callers submit as
+    often as they like and poll; the bucket decides when packets actually
+    go out.
+
+    Queued messages submitted with the same key are coalesced: the newer
+    payload replaces the older one in place, so a burst of status updates
+    costs a single transmission.
+
+    Attributes:
+        lora (LoRa): The radio used to send.
+        duty_cycle (float): Allowed fraction of time on air, 0.01 = 1%.
+        sent (int): Packets sent.
+        coalesced (int): Submissions merged into an already queued message.
+        dropped (int): Submissions dropped because the queue was full.
+    """
+
+    lora: LoRa
+    duty_cycle: float
+
+    def __init__(self,
+                 lora: LoRa,
+                 duty_cycle: float = 0.01,
+                 window_ms: int = 3_600_000,
+                 max_burst_ms: int = None,
+                 max_queue: int = 4,
+                 ) -> None:
+        """
+        Args:
+            lora (LoRa): The radio used to send.
+            duty_cycle (float): Allowed fraction of time on air.
+            window_ms (int): Window the duty cycle is measured over.
+            max_burst_ms (int): Airtime that may go out back to back, a
+                tenth of the window's budget by default. The larger, the
+                slower the bucket refills (duty_cycle minus
+                max_burst_ms / window_ms).
+            max_queue (int): Messages held while waiting for budget.
+        """
+        self.lora = lora
+        self.duty_cycle = duty_cycle
+        if max_burst_ms is None:
+            max_burst_ms = duty_cycle * window_ms / 10
+        elif max_burst_ms >= duty_cycle * window_ms:
+            raise ValueError('max_burst_ms must be below duty_cycle * window_ms')
+        self._capacity_us = max_burst_ms * 1000
+        # Airtime us earned per elapsed ms
+        self._rate = 1000 * (duty_cycle - max_burst_ms / window_ms)
+        self._budget_us = self._capacity_us
+        self._last_ms = time.ticks_ms()
+        self._max_queue = max_queue
+        self._queue = []
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def _refill(self) -> None:
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self._last_ms)
+        self._last_ms = now
+        self._budget_us = min(self._capacity_us, self._budget_us + elapsed * self._rate)
+
+    def submit(self, payload, key=None) -> bool:
+        """Queue payload. Returns False when the queue is full and it was dropped."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if key is not None:
+            for item in self._queue:
+                if item[0] == key:
+                    item[1] = payload
+                    self.coalesced += 1
+                    return True
+        if len(self._queue) >= self._max_queue:
+            self.dropped += 1
+            return False
+        self._queue.append([key, payload])
+        return True
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def ready_in_ms(self, nbytes: int = -1) -> int:
+        """Milliseconds until the next queued message (or an nbytes payload)
+        fits the budget, 0 if it can go now, -1 if the queue is empty"""
+        if nbytes < 0:
+            if not self._queue:
+                return -1
+            nbytes = len(self._queue[0][1])
+        self._refill()
+        missing = self.lora.airtime_us(nbytes) - self._budget_us
+        if missing <= 0:
+            return 0
+        return int(missing / self._rate) + 1
+
+    def poll(self) -> bool:
+        """Start sending the next queued message if the budget allows it.
+        Returns True when a send was started."""
+        if not self._queue or self.lora.tx_busy():
+            return False
+        self._refill()
+        payload = self._queue[0][1]
+        airtime = self.lora.airtime_us(len(payload))
+        if airtime > self._budget_us:
+            return False
+        self._queue.pop(0)
+        self._budget_us -= airtime
+        self.lora.send(payload, wait=False)
+        self.sent += 1
+        return True
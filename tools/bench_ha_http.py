@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Per-call latency of HA REST calls, urequests style vs shared/http_client.py.
+
+Starts a stand-in HA server on localhost (HTTP/1.1, keep-alive, the JSON
+HA returns for the calls HAClient makes) and times the call mix of the
+garage door button: get_state, turn_on and an event.
+
+- "urequests": what HAClient did before; per call a new header dict, a new
+  TCP connection, the request line and headers written one by one (like
+  urequests does), the connection closed after the response.
+- "keep-alive": HttpClient, the connection kept between calls, static
+  headers pre-encoded, one write per request.
+
+Host times are far below a Pico W's, where the TCP handshake and the
+per-write lwIP overhead dominate. --rtt-ms makes the server wait that long
+per request and once more for a new connection (the handshake round trip)
+to show WiFi latency; the connection counts are what carries over.
+
+    python3 tools/bench_ha_http.py [--rtt-ms 10] [--calls 200]
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import host_shim
+
+host_shim.install()
+
+from http_client import HttpClient
+
+TOKEN = "x" * 183   # the length of an HA long-lived access token
+STATE = {"entity_id": "input_boolean.gdo_run", "state": "on", "attributes": {"friendly_name": "GDO run"},
+         "last_changed": "2026-10-18T09:00:00+00:00", "last_updated": "2026-10-18T09:00:00+00:00"}
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Stand-in HA: GET /api/states/<id>, POST /api/services/... and /api/events/..."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body in one segment, like HA (aiohttp) sends them
+    wbufsize = -1
+    rtt = 0.0
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        Handler.connections += 1
+        time.sleep(self.rtt)
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, data):
+        time.sleep(self.rtt)
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(STATE)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/api/events/"):
+            self._reply({"message": "Event {} fired.".format(self.path[12:])})
+        else:
+            self._reply([STATE])
+
+
+def legacy_request(addr, method, path, data=None):
+    """The urequests request path, as HAClient used it"""
+    headers = {
+        "Authorization": f"Bearer {TOKEN}",
+        "Content-Type": "application/json"
+    }
+    s = socket.socket()
+    s.settimeout(5)
+    s.connect(addr)
+    f = s.makefile("rwb", 0)
+    try:
+        f.write(b"%s /%s HTTP/1.0\r\n" % (method.encode(), path[1:].encode()))
+        f.write(b"Host: %s\r\n" % ("%s:%d" % addr).encode())
+        for k in headers:
+            f.write(k.encode())
+            f.write(b": ")
+            f.write(headers[k].encode())
+            f.write(b"\r\n")
+        if data is not None:
+            body = json.dumps(data).encode()
+            f.write(b"Content-Length: %d\r\n" % len(body))
+        f.write(b"\r\n")
+        if data is not None:
+            f.write(body)
+        status = int(f.readline().split(None, 2)[1])
+        length = 0
+        while True:
+            line = f.readline()
+            if not line or line == b"\r\n":
+                break
+            if line.lower().startswith(b"content-length:"):
+                length = int(line[15:])
+        body = f.read(length)
+    finally:
+        s.close()
+    return status, json.loads(body)
+
+
+def button_press(request):
+    request("GET", "/api/states/input_boolean.gdo_run")
+    request("POST", "/api/services/input_boolean/turn_on", {"entity_id": "input_boolean.gdo_run"})
+    request("POST", "/api/events/mbx_update", {"nodes": {"2": {"state": "on", "rssi": -92}}})
+
+
+def measure(request, calls):
+    Handler.connections = 0
+    button_press(request)
+    t0 = time.perf_counter()
+    for _ in range(calls // 3):
+        button_press(request)
+    ms = (time.perf_counter() - t0) * 1e3 / (calls // 3 * 3)
+    return ms, Handler.connections
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rtt-ms", type=float, nargs="*", default=[0, 10])
+    parser.add_argument("--calls", type=int, default=150)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    addr = server.server_address
+
+    print("{:>7} {:<12} {:>9} {:>12}".format("rtt ms", "client", "ms/call", "connections"))
+    for rtt in args.rtt_ms:
+        Handler.rtt = rtt / 1000
+        calls = args.calls if rtt == 0 else max(30, args.calls // 5)
+        ms, conns = measure(lambda m, p, d=None: legacy_request(addr, m, p, d), calls)
+        print("{:>7} {:<12} {:>9.2f} {:>12}".format(rtt, "urequests", ms, conns))
+        http = HttpClient("http://%s:%d" % addr, {
+            "Authorization": f"Bearer {TOKEN}",
+            "Content-Type": "application/json"
+        })
+        ms, conns = measure(http.request, calls)
+        print("{:>7} {:<12} {:>9.2f} {:>12}".format(rtt, "keep-alive", ms, conns))
+        http.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
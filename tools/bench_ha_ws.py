@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""shared/ha_ws.py against a stand-in Home Assistant WebSocket API.
+
+StandInHA speaks the part of the HA WebSocket API HAWebSocket uses (the
+upgrade, auth, subscribe_entities with its "a"/"c" events, pings) on
+localhost. The run, in real time with short timings, checks and reports:
+
+- connect: time until the subscribed states are in the cache (live)
+- push: latency from a state change in "HA" to on_change, and that every
+  change arrived
+- fragments: changes sent in three fragments with a ping between each,
+  all applied and every ping answered
+- split head: HA stalls in the middle of a frame header; the connection
+  is dropped and made again instead of reading on out of step
+- drop: HA closes the connection; time until live again
+- silent: HA stops answering (no data, no pongs); time to notice via the
+  ping and be live again
+- down: HA unreachable for a while; reconnect attempts (backoff doubling)
+
+    python3 tools/bench_ha_ws.py
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import sys
+import time
+import types
+
+import host_shim
+
+host_shim.install()
+
+TOKEN = "stand-in-token"
+ENTITY = "input_boolean.gdo_run"
+
+config = types.ModuleType("config")
+config.HA_URL = "http://127.0.0.1:0"
+config_private = types.ModuleType("config_private")
+config_private.HA_TOKEN = TOKEN
+sys.modules.update(config=config, config_private=config_private)
+
+from internal.logging import Logger
+from internal.ha_cache import StateCache
+from internal.ha_ws import HAWebSocket
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class StandInHA:
+    """Just enough of HA's WebSocket API for HAWebSocket"""
+
+    def __init__(self):
+        self.states = {ENTITY: "off", "sun.sun": "above_horizon"}
+        self.subs = []      # (writer, id, entity_ids)
+        self.conns = []
+        self.silent = False
+        self.connections = 0
+        self.pongs = 0
+        self.server = None
+
+    async def start(self, port=0):
+        self.server = await asyncio.start_server(self._client, "127.0.0.1", port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.drop()
+
+    def drop(self):
+        for w in self.conns:
+            w.close()
+        self.conns = []
+        self.subs = []
+
+    def set_state(self, entity_id, state, fragments=1):
+        self.states[entity_id] = state
+        for w, sub_id, ids in self.subs:
+            if entity_id in ids and not self.silent:
+                payload = json.dumps({"id": sub_id, "type": "event", "event": {
+                    "c": {entity_id: {"+": {"s": state, "lc": time.time(), "c": "01H"}}}}}).encode()
+                step = -(-len(payload) // fragments)
+                for i in range(0, len(payload), step):
+                    if i:
+                        # Control frames may come between fragments
+                        self._send(w, 0x9, b"mid")
+                    self._send(w, 0x0 if i else 0x1, payload[i:i + step], fin=i + step >= len(payload))
+
+    @staticmethod
+    def _send(w, op, payload, fin=True):
+        n = len(payload)
+        op |= 0x80 if fin else 0
+        head = bytes((op, n)) if n < 126 else bytes((op, 126)) + n.to_bytes(2, "big")
+        w.write(head + payload)
+
+    async def _frame(self, r):
+        head = await r.readexactly(2)
+        n = head[1] & 0x7f
+        if n == 126:
+            n = int.from_bytes(await r.readexactly(2), "big")
+        mask = await r.readexactly(4)
+        data = await r.readexactly(n)
+        return head[0] & 0x0f, bytes(b ^ mask[i & 3] for i, b in enumerate(data))
+
+    async def _client(self, r, w):
+        self.connections += 1
+        self.conns.append(w)
+        try:
+            key = b""
+            while True:
+                line = await r.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"sec-websocket-key:"):
+                    key = line.split(b":", 1)[1].strip()
+            accept = base64.b64encode(hashlib.sha1(key + GUID).digest())
+            w.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                    b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+            self._send(w, 0x1, b'{"type": "auth_required", "ha_version": "2026.10.0"}')
+            while True:
+                op, data = await self._frame(r)
+                if self.silent:
+                    continue
+                if op == 0x9:
+                    self._send(w, 0xA, data)
+                    continue
+                if op == 0xA:
+                    self.pongs += 1
+                    continue
+                if op == 0x8:
+                    break
+                msg = json.loads(data)
+                if msg["type"] == "auth":
+                    ok = msg["access_token"] == TOKEN
+                    self._send(w, 0x1, json.dumps({"type": "auth_ok" if ok else "auth_invalid"}).encode())
+                elif msg["type"] == "subscribe_entities":
+                    ids = msg["entity_ids"]
+                    self._send(w, 0x1, json.dumps({"id": msg["id"], "type": "result", "success": True, "result": None}).encode())
+                    self._send(w, 0x1, json.dumps({"id": msg["id"], "type": "event", "event": {"a": {
+                        e: {"s": self.states[e], "a": {"friendly_name": e}, "c": "01H", "lc": time.time()}
+                        for e in ids if e in self.states}}}).encode())
+                    self.subs.append((w, msg["id"], ids))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            w.close()
+
+
+async def until(cond, limit_s=10.0):
+    t0 = time.perf_counter()
+    while not cond():
+        if time.perf_counter() - t0 > limit_s:
+            raise TimeoutError("condition not met")
+        await asyncio.sleep(0.001)
+    return (time.perf_counter() - t0) * 1000
+
+
+async def main():
+    ha = StandInHA()
+    port = await ha.start()
+    cache = StateCache(ttl_ms=30_000)
+    seen = []
+    ws = HAWebSocket(Logger(Logger.ERROR), cache, [ENTITY],
+                     on_change=lambda e, s: seen.append((time.perf_counter(), s)),
+                     url="http://127.0.0.1:%d" % port,
+                     ping_ms=300, min_backoff_ms=100, max_backoff_ms=1600)
+    task = asyncio.create_task(ws.run())
+
+    print("{:<10} {:>10}  {}".format("step", "ms", "check"))
+    ms = await until(lambda: ws.connected)
+    print("{:<10} {:>10.1f}  cached {} = {!r}, live".format("connect", ms, ENTITY, cache.get(ENTITY)))
+
+    lat = []
+    for i in range(50):
+        state = "on" if i % 2 == 0 else "off"
+        n = len(seen)
+        t0 = time.perf_counter()
+        ha.set_state(ENTITY, state)
+        await until(lambda: len(seen) > n)
+        lat.append((seen[-1][0] - t0) * 1000)
+        assert seen[-1][1] == state and cache.get(ENTITY) == state
+    lat.sort()
+    print("{:<10} {:>10.2f}  50 changes, all delivered, p50 {:.2f} ms, max {:.2f} ms".format(
+        "push", sum(lat) / len(lat), lat[len(lat) // 2], lat[-1]))
+
+    pongs = ha.pongs
+    t0 = time.perf_counter()
+    for i in range(10):
+        state = "on" if i % 2 == 0 else "off"
+        n = len(seen)
+        ha.set_state(ENTITY, state, fragments=3)
+        await until(lambda: len(seen) > n and ha.pongs - pongs == 2 * (i + 1))
+        assert seen[-1][1] == state and cache.get(ENTITY) == state
+    print("{:<10} {:>10.2f}  10 changes in 3 fragments, all applied, {} pings between answered".format(
+        "fragments", (time.perf_counter() - t0) * 100, ha.pongs - pongs))
+
+    reconnects = ws.reconnects
+    ha.silent = True
+    for w, _, _ in ha.subs:
+        w.write(b"\x81")
+    t0 = time.perf_counter()
+    await until(lambda: not ws.connected)
+    lost = (time.perf_counter() - t0) * 1000
+    ha.silent = False
+    ha.drop()
+    ms = await until(lambda: ws.connected)
+    assert ws.reconnects == reconnects + 1
+    print("{:<10} {:>10.1f}  dropped {:.0f} ms into the stalled header (ping_ms 300), live again".format(
+        "split head", lost + ms, lost))
+
+    ha.drop()
+    await until(lambda: not ws.connected)
+    assert cache.get(ENTITY, 0) is None    # not live: max_age 0 asks HA again
+    ms = await until(lambda: ws.connected)
+    print("{:<10} {:>10.1f}  live again after min_backoff 100 ms, reconnects {}".format("drop", ms, ws.reconnects))
+
+    ha.silent = True
+    t0 = time.perf_counter()
+    await until(lambda: not ws.connected)
+    lost = (time.perf_counter() - t0) * 1000
+    ha.silent = False
+    ha.drop()
+    ms = await until(lambda: ws.connected)
+    print("{:<10} {:>10.1f}  silence noticed after {:.0f} ms (ping_ms 300, twice)".format("silent", lost + ms, lost))
+
+    await ha.stop()
+    await until(lambda: not ws.connected)
+    before = ws.reconnects
+    await asyncio.sleep(3.2)
+    tries = ws.reconnects - before
+    ha.set_state(ENTITY, "on")
+    await ha.start(port)
+    ms = await until(lambda: ws.connected)
+    print("{:<10} {:>10.1f}  {} attempts in 3.2 s down (100, 200, 400 ... ms), state on HA: {!r}".format(
+        "down", ms, tries, cache.get(ENTITY)))
+    print("\nconnections served {}, states received {}".format(ha.connections, ws.updates))
+    task.cancel()
+    ha.drop()
+    await asyncio.sleep(0.05)
+    ha.server.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Peak memory of reading an HA state response, whole vs picked fields.
+
+Feeds HA-like /api/states responses (attributes of growing size, like a
+weather entity's forecast) to HttpClient from memory and measures the peak
+bytes allocated per call (tracemalloc) and host time:
+
+- "urequests": what HAClient.get_state did before; the whole body read,
+  response.text decoded from it, then response.json() over all of it.
+- "whole body": HttpClient.request, body read at once and json.loads'ed.
+- "pick": HttpClient.request(pick=("state", "attributes.friendly_name")),
+  the body parsed by JsonPicker in 256 byte pieces as it is read; the
+  name comes last, so all of it is parsed. Also chunked.
+- "pick state": pick=("state",) as get_state does; parsing stops after
+  the second key, the rest is only read off the connection.
+
+Before that it checks that JsonPicker stops at the last picked value,
+scalar or not, whatever follows (here, truncated JSON).
+
+CPython objects are larger than MicroPython's; the ratios carry over, and
+on a Pico W the whole-body rows need that much contiguous heap.
+
+    python3 tools/bench_json_pick.py
+"""
+import io
+import json
+import time
+import tracemalloc
+
+import host_shim
+
+host_shim.install()
+
+from http_client import HttpClient
+from json_pick import JsonPicker
+
+PICK = ("state", "attributes.friendly_name")
+
+
+def state(forecast_days):
+    return {
+        "entity_id": "weather.home",
+        "state": "partlycloudy",
+        "attributes": {
+            "temperature": 12.3,
+            "humidity": 81,
+            "forecast": [{"datetime": "2026-10-%02dT12:00:00+00:00" % (1 + d % 28), "condition": "rainy",
+                          "temperature": 14.0 + d % 7, "templow": 6.5, "precipitation": 1.2,
+                          "wind_bearing": 225.0, "wind_speed": 18.4} for d in range(forecast_days)],
+            "friendly_name": "Home",
+        },
+        "last_changed": "2026-10-18T09:00:00.000000+00:00",
+        "last_updated": "2026-10-18T09:00:00.000000+00:00",
+        "context": {"id": "01HXYZ", "parent_id": None, "user_id": None},
+    }
+
+
+class Conn(io.RawIOBase):
+    """A connection with a canned response; writes go nowhere"""
+
+    def __init__(self, response):
+        self.src = io.BytesIO(response)
+
+    def write(self, b):
+        return len(b)
+
+    def readinto(self, b):
+        return self.src.readinto(b)
+
+    def readline(self, size=-1):
+        return self.src.readline(size)
+
+    def read(self, n=-1):
+        return self.src.read(n)
+
+
+def response(body, chunked):
+    if chunked:
+        parts = [body[i:i + 1000] for i in range(0, len(body), 1000)]
+        body = b"".join(b"%x\r\n%s\r\n" % (len(p), p) for p in parts) + b"0\r\n\r\n"
+        head = b"Transfer-Encoding: chunked\r\n"
+    else:
+        head = b"Content-Length: %d\r\n" % len(body)
+    return b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n" + head + b"\r\n" + body
+
+
+def legacy(resp):
+    # urequests: .text then .json() of the whole body
+    f = io.BytesIO(resp)
+    f.readline()
+    length = 0
+    while True:
+        line = f.readline()
+        if line == b"\r\n":
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line[15:])
+    content = f.read(length)
+    text = str(content, "utf-8")
+    data = json.loads(content)
+    return {"state": data["state"], "attributes.friendly_name": data["attributes"]["friendly_name"]}, len(text)
+
+
+def check_stops():
+    for path, doc, want in (("a", b'{"a": 5, "b": [1,2', 5), ("a", b'{"a": "on", "b": [1,2', "on"),
+                            ("x.a", b'{"x": {"a": true}, "b": [1,2', True), ("a", b'{"a": [1, 2]}, "b', [1, 2])):
+        for step in (len(doc), 1):
+            p = JsonPicker((path,))
+            for i in range(0, len(doc), step):
+                p.feed(doc[i:i + step])
+            assert p.done() and p.values == {path: want}, (doc, step, p.values)
+    print("JsonPicker stops at the last picked value\n")
+
+
+def measure(fn, rounds=20):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    us = (time.perf_counter() - t0) * 1e6 / rounds
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    out = fn()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return out, peak, us
+
+
+def main() -> None:
+    http = HttpClient("http://127.0.0.1:8123", {"Content-Type": "application/json"}, max_conns=0)
+    req = http._encode("GET", "/api/states/weather.home", None)
+    check_stops()
+    print("{:>8} {:<12} {:>11} {:>9}".format("body B", "path", "peak bytes", "us/call"))
+    for days in (0, 30, 120, 480):
+        body = json.dumps(state(days)).encode()
+        resp = response(body, chunked=False)
+        resp_chunked = response(body, chunked=True)
+        want, _ = legacy(resp)
+        rows = (
+            ("urequests", lambda: legacy(resp)[0]),
+            ("whole body", lambda: json.loads(http._exchange((Conn(b""), Conn(resp)), req)[1])),
+            ("pick", lambda: http._exchange((Conn(b""), Conn(resp)), req, PICK)[1]),
+            ("pick chunked", lambda: http._exchange((Conn(b""), Conn(resp_chunked)), req, PICK)[1]),
+            ("pick state", lambda: http._exchange((Conn(b""), Conn(resp)), req, ("state",))[1]),
+        )
+        for name, fn in rows:
+            out, peak, us = measure(fn)
+            if name == "pick state":
+                assert out == {"state": want["state"]}, out
+            elif name != "whole body":
+                assert out == want, (name, out)
+            print("{:>8} {:<12} {:>11} {:>9.0f}".format(len(body), name, peak, us))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Per-call cost of shared/logging.py on a host.
+
+Compares the Logger against the original one (message formatted by the
+caller's f-string, timestamp built from localtime on every line) for a
+DEBUG call filtered out at INFO, and for an INFO line that is printed
+(to a discarding stream). Reports host time per call and the peak bytes
+allocated during one call (tracemalloc). The payload is a 1 kB response body, like the one
+HAClient.get_state logs at DEBUG.
+
+Also counts the file writes FileSink makes for 1000 lines, with a 4 kB
+block against writing every line (block of 1 byte), and the bytes the same
+lines take as text and as binary records (tools/log_decode.py reads them).
+
+    python3 tools/bench_logging.py
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import host_shim
+
+host_shim.install()
+
+from logging import Logger, FileSink
+
+ROUNDS = 2000
+BODY = '{"entity_id": "input_boolean.x", "state": "on", "attributes": {}, "pad": "%s"}' % ("x" * 950)
+
+
+class LegacyLogger(Logger):
+    """The formatting path the Logger started with."""
+
+    def debug(self, source, msg, end="\n"):
+        self._log(self.DEBUG, source, msg, end=end)
+
+    def info(self, source, msg, end="\n"):
+        self._log(self.INFO, source, msg, end=end)
+
+    def _log(self, level, source, msg, args=(), end="\n"):
+        if level < self.level:
+            return
+        message = str(msg)
+        t = time.localtime()
+        ms = time.ticks_ms() % 1000
+        ts = "{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}.{:03d}".format(t[0], t[1], t[2], t[3], t[4], t[5], ms)
+        print("[{}] {} {} - {}".format(ts, self._LEVEL_NAMES.get(level, str(level)), str(source), message), end=end)
+
+
+class _Null(io.TextIOBase):
+    def write(self, s):
+        return len(s)
+
+
+def measure(fn):
+    stdout = sys.stdout
+    sys.stdout = _Null()
+    try:
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(ROUNDS):
+            fn()
+        us = (time.perf_counter() - t0) * 1e6 / ROUNDS
+        # Bytes allocated at the peak of one call, above what was live before
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] - base
+        tracemalloc.stop()
+    finally:
+        sys.stdout = stdout
+    return us, peak
+
+
+def main() -> None:
+    legacy = LegacyLogger(Logger.INFO)
+    lazy = Logger(Logger.INFO)
+    body = BODY
+    cases = (
+        ("debug filtered", "legacy f-string", lambda: legacy.debug("HAClient.get_state", f"Raw Response Body: {body}")),
+        ("debug filtered", "lazy args", lambda: lazy.debug("HAClient.get_state", "Raw Response Body: {}", body)),
+        ("info printed", "legacy f-string", lambda: legacy.info("MbxMon.monitor", f"Sending frame with {3} events")),
+        ("info printed", "lazy args", lambda: lazy.info("MbxMon.monitor", "Sending frame with {} events", 3)),
+    )
+    print("{:<16} {:<16} {:>9} {:>12}".format("case", "logger", "us/call", "peak bytes"))
+    for case, name, fn in cases:
+        print("{:<16} {:<16} {:>9.2f} {:>12}".format(case, name, *measure(fn)))
+    print("\nA filtered lazy call formats nothing; printed lines reuse the per-second timestamp.")
+
+    print("\n{:<16} {:>8} {:>10} {:>10} {:>9}".format("file sink", "lines", "writes", "rotations", "us/line"))
+    with tempfile.TemporaryDirectory() as d:
+        for block in (1, 4096):
+            sink = FileSink(os.path.join(d, "log%d.txt" % block), block=block, max_bytes=32768)
+            logger = Logger(Logger.INFO, sinks=[sink])
+            t0 = time.perf_counter()
+            for i in range(1000):
+                logger.info("MbxMon.monitor", "Sending frame with {} events, last ping #{}", 3, i)
+            logger.flush()
+            us = (time.perf_counter() - t0) * 1e6 / 1000
+            print("{:<16} {:>8} {:>10} {:>10} {:>9.1f}".format("block %d" % block, 1000, sink.writes, sink.rotations, us))
+
+        print("\n{:<16} {:>8} {:>10} {:>10} {:>9}".format("encoding", "lines", "bytes", "B/line", "us/line"))
+        for binary in (False, True):
+            sink = FileSink(os.path.join(d, "enc%d.log" % binary), binary=binary, max_bytes=1 << 20)
+            logger = Logger(Logger.INFO, sinks=[sink])
+            t0 = time.perf_counter()
+            for i in range(250):
+                logger.info("MbxMon.monitor", "✉️ Sending frame with {} events, last ping #{}", 3, i)
+                logger.info("global", "💤 ZZZzzz... {} ms", 60000)
+                logger.info("MbxMon.tx_done", "✅ Sent successfully")
+                logger.info("HAClient.get_state", "✓ State: {}", "on")
+            logger.flush()
+            us = (time.perf_counter() - t0) * 1e6 / 1000
+            size = os.stat(sink.path)[6]
+            print("{:<16} {:>8} {:>10} {:>10.1f} {:>9.1f}".format(
+                "binary" if binary else "text", 1000, size, size / 1000, us))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Count SPI traffic of LoRa radio bring-up on a host.
+
+Compares the driver's shadow-register configuration against the original
+read-modify-write setters: the constructor alone, the constructor followed
+by the setters mbx-mon/main.py used to call, mbx-mon's bring-up now that it
+passes the settings to the constructor, and a configure() call changing SF
+and bandwidth on a running radio. Every case also checks that both drivers
+leave identical modem registers.
+
+    python3 tools/bench_lora_config.py
+"""
+import host_shim
+
+host_shim.install()
+
+from lora import LoRa, REG_MODEM_CONFIG_1, REG_MODEM_CONFIG_2, REG_MODEM_CONFIG_3, REG_LNA, REG_PA_CONFIG, \
+    REG_DETECTION_OPTIMIZE, REG_DETECTION_THRESHOLD, BANDWIDTHS
+
+MAIN_SETTINGS = dict(spreading_factor=10, coding_rate=5, bandwidth=250000, preamble_length=8, sync_word=0x12, crc=True)
+CHECKED = (REG_MODEM_CONFIG_1, REG_MODEM_CONFIG_2, REG_DETECTION_OPTIMIZE, REG_DETECTION_THRESHOLD, REG_PA_CONFIG)
+
+
+class LegacyLoRa(LoRa):
+    """The read-modify-write setters the driver started with."""
+
+    def __init__(self, spi, **kw):
+        self.spi = spi
+        self.cs = kw['cs']
+        self.rx = kw['rx']
+        self._cmd = bytearray(2)
+        self._resp = bytearray(2)
+        self._addr = bytearray(1)
+        self._hold = 0
+        self._irq_pending = False
+        self.mode_ms = [0] * 8
+        self._mode = 0
+        self._mode_since = 0
+        self._read(0x42)
+        self.sleep()
+        self.set_frequency(kw.get('frequency', 915.0))
+        self.set_bandwidth(kw.get('bandwidth', 250000))
+        self.set_spreading_factor(kw.get('spreading_factor', 10))
+        self.set_coding_rate(kw.get('coding_rate', 5))
+        self.set_preamble_length(kw.get('preamble_length', 8))
+        self.set_crc(kw.get('crc', False))
+        self._write(REG_LNA, self._read(REG_LNA) | 0x03)
+        self._write(REG_MODEM_CONFIG_3, 0x00)
+        self.set_tx_power(kw.get('tx_power', 24))
+        self._implicit = kw.get('implicit', False)
+        self.set_sync_word(kw.get('sync_word', 0x12))
+        self._write(0x0e, 0)
+        self._write(0x0f, 0)
+        self.standby()
+
+    def configure(self, **kw):
+        for k, v in kw.items():
+            getattr(self, 'set_' + k)(v)
+
+    # Inherited setters (frequency, power, ...) write straight through
+    _write_cfg = LoRa._write
+
+    def set_spreading_factor(self, sf):
+        self._write(REG_DETECTION_OPTIMIZE, 0xc5 if sf == 6 else 0xc3)
+        self._write(REG_DETECTION_THRESHOLD, 0x0c if sf == 6 else 0x0a)
+        self._sf = sf
+        reg2 = self._read(REG_MODEM_CONFIG_2)
+        self._write(REG_MODEM_CONFIG_2, (reg2 & 0x0f) | ((sf << 4) & 0xf0))
+        self._write(REG_MODEM_CONFIG_3, 0x08 if (sf > 10 and self._bandwidth < 250000) else 0x00)
+
+    def set_bandwidth(self, bw):
+        self._bandwidth = bw
+        i = 9
+        for j in range(len(BANDWIDTHS) - 1):
+            if bw <= BANDWIDTHS[j]:
+                i = j
+                break
+        x = self._read(REG_MODEM_CONFIG_1) & 0x0f
+        self._write(REG_MODEM_CONFIG_1, x | (i << 4))
+
+    def set_coding_rate(self, denom):
+        cr = min(max(denom, 5), 8) - 4
+        reg1 = self._read(REG_MODEM_CONFIG_1)
+        self._write(REG_MODEM_CONFIG_1, (reg1 & 0xf1) | (cr << 1))
+
+    def set_crc(self, crc=False):
+        reg2 = self._read(REG_MODEM_CONFIG_2)
+        self._write(REG_MODEM_CONFIG_2, reg2 | 0x04 if crc else reg2 & 0xfb)
+
+
+def make(cls):
+    cs = host_shim.Pin("CS", value=1)
+    spi = host_shim.RegisterSPI(cs)
+    # SX1276 reset values
+    spi.regs[REG_MODEM_CONFIG_1] = 0x72
+    spi.regs[REG_MODEM_CONFIG_2] = 0x70
+    spi.regs[REG_LNA] = 0x20
+    return cls, spi, cs
+
+
+def ctor(lora_cls, spi, cs):
+    return lora_cls(spi, cs=cs, rx=None)
+
+
+def main_py_setters(lora_cls, spi, cs):
+    lora = lora_cls(spi, cs=cs, rx=None, frequency=915.0)
+    for k, v in MAIN_SETTINGS.items():
+        getattr(lora, 'set_' + k)(v)
+
+
+def ctor_settings(lora_cls, spi, cs):
+    lora_cls(spi, cs=cs, rx=None, frequency=915.0, **MAIN_SETTINGS)
+
+
+def reconfigure(lora_cls, spi, cs):
+    lora = lora_cls(spi, cs=cs, rx=None, frequency=915.0, **MAIN_SETTINGS)
+    spi.reset_counters()
+    lora.configure(spreading_factor=8, bandwidth=125000)
+
+
+# (case, legacy bring-up, current bring-up)
+CASES = (
+    ("constructor, defaults", ctor, ctor),
+    ("constructor + main.py setters", main_py_setters, main_py_setters),
+    ("mbx-mon bring-up", main_py_setters, ctor_settings),
+    ("configure(sf, bw) when running", reconfigure, reconfigure),
+)
+
+
+def run(lora_cls, fn):
+    cls, spi, cs = make(lora_cls)
+    fn(cls, spi, cs)
+    return spi.transactions, bytes(spi.regs[r] for r in CHECKED)
+
+
+def main() -> None:
+    print("{:<32} {:>8} {:>8}".format("SPI transactions", "legacy", "current"))
+    for case, legacy_fn, current_fn in CASES:
+        old, old_regs = run(LegacyLoRa, legacy_fn)
+        new, new_regs = run(LoRa, current_fn)
+        assert old_regs == new_regs, (case, old_regs.hex(), new_regs.hex())
+        print("{:<32} {:>8} {:>8}".format(case, old, new))
+
+
+if __name__ == "__main__":
+    main()
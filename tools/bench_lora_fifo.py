@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Benchmark register and FIFO access in shared/lora.py on a host.
+
+Compares the driver against the original register layer (fresh buffers per
+access, one register write per FIFO byte) using the counting `RegisterSPI`
+from host_shim. Reports SPI calls, CS transactions, temporary buffers handed
+to the SPI and host time for single register read/write pairs and, per
+payload size, for TX (`send`) and RX (the DIO0 receive handler, both with
+the on_recv callback and filling a PacketRing).
+
+    python3 tools/bench_lora_fifo.py
+"""
+import time
+
+import host_shim
+
+host_shim.install()
+
+from lora import LoRa, PacketRing, REG_FIFO, REG_PAYLOAD_LENGTH, REG_FIFO_RX_CURRENT_ADDR, REG_RX_NB_BYTES, REG_IRQ_FLAGS, MAX_PKT_LENGTH, TX_BASE_ADDR
+
+ROUNDS = 50
+IRQ_RX_DONE = 0x40
+
+
+class LegacyLoRa(LoRa):
+    """The register layer and per-byte FIFO loops the driver started with."""
+
+    def _transfer(self, addr, x=0x00):
+        resp = bytearray(1)
+        self.cs.value(0)
+        self.spi.write(bytes([addr]))
+        self.spi.write_readinto(bytes([x]), resp)
+        self.cs.value(1)
+        return resp
+
+    def _read(self, addr):
+        x = self._transfer(addr & 0x7f)
+        return int.from_bytes(x, 'big')
+
+    def _write(self, addr, x):
+        self._transfer(addr | 0x80, x)
+
+    def _dio0(self):
+        f = self._get_irq_flags()
+        if f & 0x20 == 0:
+            if self._on_recv:
+                self._on_recv(self._read_payload())
+
+    def write_packet(self, b):
+        n = self._read(REG_PAYLOAD_LENGTH)
+        m = len(b)
+        p = MAX_PKT_LENGTH - TX_BASE_ADDR
+        if n + m > p:
+            raise ValueError('Max payload length is ' + str(p))
+        for i in range(m):
+            self._write(REG_FIFO, b[i])
+        self._write(REG_PAYLOAD_LENGTH, n + m)
+
+    def _read_payload(self):
+        self._write(0x0d, self._read(REG_FIFO_RX_CURRENT_ADDR))
+        n = self._read(REG_RX_NB_BYTES)
+        payload = bytearray()
+        for i in range(n):
+            payload.append(self._read(REG_FIFO))
+        return bytes(payload)
+
+
+def make(cls):
+    cs = host_shim.Pin("CS", value=1)
+    spi = host_shim.RegisterSPI(cs)
+    lora = cls(spi, cs=cs, rx=None)
+    spi.track(lora._cmd, lora._resp, lora._addr, lora._rx_status)
+    return lora, spi
+
+
+def measure_regs(cls):
+    lora, spi = make(cls)
+    spi.reset_counters()
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        lora._write(REG_PAYLOAD_LENGTH, lora._read(REG_PAYLOAD_LENGTH))
+    us = (time.perf_counter() - t0) * 1e6 / ROUNDS
+    return (spi.calls // ROUNDS, spi.transactions // ROUNDS, spi.temp_buffers // ROUNDS, us)
+
+
+def measure(cls, size):
+    lora, spi = make(cls)
+    payload = bytes(range(size))
+    spi.track(payload)
+
+    spi.reset_counters()
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        lora.send(payload)
+    tx_us = (time.perf_counter() - t0) * 1e6 / ROUNDS
+    tx = (spi.calls // ROUNDS, spi.transactions // ROUNDS, spi.temp_buffers // ROUNDS, tx_us)
+
+    got = []
+    lora._on_recv = got.append
+    spi.fifo[:size] = payload
+    spi.regs[REG_FIFO_RX_CURRENT_ADDR] = 0
+    spi.regs[REG_RX_NB_BYTES] = size
+    spi.reset_counters()
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        spi.regs[REG_IRQ_FLAGS] = IRQ_RX_DONE
+        lora._irq_dio0(None)
+    rx_us = (time.perf_counter() - t0) * 1e6 / ROUNDS
+    assert len(got) == ROUNDS and got[-1] == payload
+    rx = (spi.calls // ROUNDS, spi.transactions // ROUNDS, spi.temp_buffers // ROUNDS, rx_us)
+    return tx, rx
+
+
+def measure_ring(size):
+    lora, spi = make(LoRa)
+    ring = PacketRing(4)
+    for views in ring._views:
+        spi.track(*views)
+    lora.set_rx_ring(ring)
+    payload = bytes(range(size))
+    spi.fifo[:size] = payload
+    spi.regs[REG_FIFO_RX_CURRENT_ADDR] = 0
+    spi.regs[REG_RX_NB_BYTES] = size
+    spi.reset_counters()
+    t0 = time.perf_counter()
+    for _ in range(ROUNDS):
+        spi.regs[REG_IRQ_FLAGS] = IRQ_RX_DONE
+        lora._irq_dio0(None)
+        got = ring.get()
+    us = (time.perf_counter() - t0) * 1e6 / ROUNDS
+    assert got == payload
+    return (spi.calls // ROUNDS, spi.transactions // ROUNDS, spi.temp_buffers // ROUNDS, us)
+
+
+def main() -> None:
+    print("{:>5} {:>4} {:>7} {:>7} {:>6} {:>6} {:>9}".format(
+        "size", "dir", "driver", "calls", "txns", "temps", "us/op"))
+    for name, cls in (("legacy", LegacyLoRa), ("current", LoRa)):
+        print("{:>5} {:>4} {:>7} {:>7} {:>6} {:>6} {:>9.1f}".format("-", "r+w", name, *measure_regs(cls)))
+    for size in (16, 64, 128, 255):
+        for name, cls in (("legacy", LegacyLoRa), ("current", LoRa)):
+            tx, rx = measure(cls, size)
+            for d, r in (("tx", tx), ("rx", rx)):
+                print("{:>5} {:>4} {:>7} {:>7} {:>6} {:>6} {:>9.1f}".format(size, d, name, *r))
+        print("{:>5} {:>4} {:>7} {:>7} {:>6} {:>6} {:>9.1f}".format(size, "rx", "ring", *measure_ring(size)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Throughput and latency of the LoRa stack over the simulated airwave.
+
+Runs the real driver, ReliableLink and MbxMon against sx127x_sim radios on
+a virtual clock (SPI at 1 MHz, mbx-mon's SF10/250 kHz settings):
+
+- airtime: LoRa.airtime_us against the simulator's model of the chip
+- raw: back-to-back blocking sends into a PacketRing, per payload size;
+  latency is send() call to packet in the receiver's ring
+- rx during send: a packet that lands while the receiver is inside send()
+  (its RxDone IRQ held back) is delivered, and TxDone still comes on time
+- reliable: ReliableLink ping/ACK with increasing packet loss; latency is
+  send() call to ACK matched
+- mbx-mon: MbxMon.monitor() for two virtual hours against a receiver; fails
+  if any hour has more airtime than the duty cycle allows
+- adr: MbxMon with LinkAdr against an acking receiver for two hours, the
+  link fading by 12 dB after the first
+- energy: an hour of MbxMon with a frame a minute, default and low-power
+  mode, with the EnergyMeter estimate
+- mailbox: an hour of event driven MbxMon (door switch, heartbeat) with
+  three bouncy mail deliveries, against pinging every minute, and with its
+  INFO log shipped in the frames (log_ship.ShipSink)
+
+    python3 tools/bench_lora_link.py
+"""
+import asyncio
+import os
+import sys
+
+import sx127x_sim
+
+air = sx127x_sim.install()
+sys.path.insert(0, os.path.join(sx127x_sim.host_shim.ROOT, "mbx-mon"))
+
+from host_shim import Pin
+from lora import LoRa, PacketRing
+from lora_async import AsyncLoRa
+from lora_reliable import ReliableLink
+from lora_frame import FrameWriter, FLAG_ACK_REQ, MSG_ACK, MSG_PING, MSG_MAILBOX, MSG_LOG, header, flags, records, fields
+from logging import Logger
+
+SETTINGS = dict(frequency=915.0, spreading_factor=10, coding_rate=5, bandwidth=250000, preamble_length=8,
+                sync_word=0x12, crc=True)
+PACKETS = 50
+FRAMES = 100
+
+
+def pair(name, **link):
+    a = air.radio(name + ".node")
+    b = air.radio(name + ".gw")
+    air.link(a, b, **link)
+    return a, b, LoRa(a, cs=a.cs, rx=a.dio0, **SETTINGS), LoRa(b, cs=b.cs, rx=b.dio0, **SETTINGS)
+
+
+def bench_airtime():
+    a, _, lora, _ = pair("airtime")
+    for n in (1, 16, 64, 255):
+        assert abs(lora.airtime_us(n) - a.airtime_us(n)) < 1, n
+    lora.configure(spreading_factor=12, bandwidth=125000)
+    for n in (1, 16, 64, 255):
+        assert abs(lora.airtime_us(n) - a.airtime_us(n)) < 1, n
+    print("airtime_us matches the simulated chip (SF10/250k, SF12/125k with LDRO)\n")
+
+
+def bench_raw():
+    print("{:<8} {:>10} {:>10} {:>10} {:>10}".format("raw", "airtime", "latency", "pkt/s", "B/s"))
+    for size in (16, 64, 255):
+        _, _, node, gw = pair("raw%d" % size)
+        ring = PacketRing(4)
+        gw.set_rx_ring(ring)
+        gw.recv()
+        arrived = []
+        ring.notify = lambda: arrived.append(air.now_us)
+        payload = bytes(size)
+        latency = 0.0
+        t0 = air.now_us
+        for _ in range(PACKETS):
+            t = air.now_us
+            node.send(payload)
+            # The receiver's IRQ ran when the packet ended, right before TxDone was polled
+            latency += arrived[-1] - t
+            assert ring.get() == payload
+        elapsed = (air.now_us - t0) / 1e6
+        gw.standby()
+        print("{:<8} {:>8.1f}ms {:>8.1f}ms {:>10.2f} {:>10.0f}".format(
+            size, node.airtime_us(size) / 1000, latency / PACKETS / 1000, PACKETS / elapsed, PACKETS * size / elapsed))
+    print()
+
+
+def bench_rx_during_send():
+    _, _, node, gw = pair("race")
+    ring = PacketRing(4)
+    gw.set_rx_ring(ring)
+    tx_done = []
+    gw.on_tx_done(lambda: tx_done.append(air.now_us))
+    gw.recv()
+    node.send(b"node", wait=False)
+    arrives = air.now_us + node.airtime_us(4)
+
+    def begin_packet():
+        # Inside send(): the RxDone IRQ of the node's packet is deferred
+        air.sleep_us(arrives - air.now_us + 1000)
+        LoRa.begin_packet(gw)
+
+    gw.begin_packet = begin_packet
+    gw.send(b"gateway", wait=False)
+    assert gw.tx_busy() and not tx_done, "deferred RxDone taken for TxDone"
+    assert ring.get() == b"node" and ring.get() is None
+    gw.wait_tx()
+    assert len(tx_done) == 1 and ring.get() is None, "own payload received"
+    print("rx during send: packet delivered, TxDone after {:.1f}ms\n".format((tx_done[0] - arrives) / 1000))
+
+
+async def ping(node, gw, loss):
+    node_link = ReliableLink(node, node_id=1, max_retries=4, ack_timeout_ms=600, acks=False)
+    delivered = []
+    gw_link = ReliableLink(gw, node_id=0, on_frame=lambda n, seq, frame: delivered.append(seq))
+    asyncio.create_task(node_link.run())
+    asyncio.create_task(gw_link.run())
+    node.recv()
+    gw.recv()
+    total = worst = 0.0
+    for i in range(FRAMES):
+        w = node_link.begin()
+        w.add_fields(MSG_PING, i)
+        t = air.now_us
+        await node_link.send()
+        dt = air.now_us - t
+        total += dt
+        worst = max(worst, dt)
+        await asyncio.sleep_ms(1000)
+    node.standby()
+    gw.standby()
+    peer = gw_link.peers[1]
+    print("{:<8} {:>9.1f}ms {:>9.1f}ms {:>8} {:>8} {:>8} {:>8}".format(
+        "%d%%" % (loss * 100), total / FRAMES / 1000, worst / 1000, node_link.acked, node_link.retries,
+        len(delivered), peer.duplicates))
+
+
+def bench_reliable():
+    print("{:<8} {:>11} {:>11} {:>8} {:>8} {:>8} {:>8}".format(
+        "loss", "mean", "max", "acked", "retries", "unique", "dups"))
+    for loss in (0.0, 0.1, 0.3):
+        a, b, node, gw = pair("rel%d" % (loss * 100), rssi=-105, snr=-1.0, loss=loss)
+        asyncio.run(ping(AsyncLoRa(node), AsyncLoRa(gw), loss))
+    print()
+
+
+class _Stop(BaseException):
+    # MbxMon.monitor() catches Exception
+    pass
+
+
+def run_for(mon, seconds):
+    # Stop monitor() at its first sleep after the time is up
+    end = air.now_us + seconds * 1e6
+    sleep_us = air.sleep_us
+    lightsleep_us = air.lightsleep_us
+
+    def until_end(sleep):
+        def sleep_until_end(us=None):
+            if air.now_us >= end:
+                raise _Stop()
+            sleep(us)
+        return sleep_until_end
+
+    air.sleep_us = until_end(sleep_us)
+    air.lightsleep_us = until_end(lightsleep_us)
+    try:
+        mon.monitor()
+    except _Stop:
+        pass
+    finally:
+        air.sleep_us = sleep_us
+        air.lightsleep_us = lightsleep_us
+
+
+def bench_mbxmon():
+    from mbxmon import MbxMon
+    a, b, node, gw = pair("mbx")
+    ring = PacketRing(8)
+    gw.set_rx_ring(ring)
+    gw.recv()
+    frames = []
+    ring.notify = lambda: frames.append(header(ring.get())[2])
+    sent = []
+    tx_done = a.tx_done
+
+    def log_tx(tx):
+        sent.append((tx.start_us, tx.end_us))
+        tx_done(tx)
+
+    a.tx_done = log_tx
+    mon = MbxMon(node, Logger(Logger.ERROR), Pin("LED"), Pin("RED"), Pin("GREEN"))
+    run_for(mon, 2 * 3600)
+    gw.standby()
+    # Busiest hour: the one starting at some frame
+    worst = 0
+    for start, _ in sent:
+        worst = max(worst, sum(min(e, start + 3600e6) - s for s, e in sent if start <= s < start + 3600e6))
+    duty = mon.scheduler.duty_cycle
+    assert worst <= duty * 3600e6, "%.2f%% airtime in an hour" % (worst / 36e6)
+    print("mbx-mon, 2 h: {} frames, {} pings, {:.2f}% airtime, busiest hour {:.2f}% (limit {:.0f}%)".format(
+        len(frames), sum(frames), a.tx_airtime_us / 72e6, worst / 36e6, duty * 100))
+
+
+def acking_gateway(gw, received=None):
+    # Minimal gateway in IRQ context: ack every frame that asks for it
+    w = FrameWriter(0)
+
+    def on_recv(pkt):
+        node, seq, _ = header(pkt)
+        if received is not None:
+            received.append(bytes(pkt))
+        if flags(pkt) & FLAG_ACK_REQ:
+            w.begin(seq)
+            w.add_fields(MSG_ACK, node, seq, gw.get_rssi(), int(gw.get_snr() * 4))
+            gw.send(w.frame(), wait=False)
+
+    gw.on_recv(on_recv)
+    gw.on_tx_done(gw.recv)
+    gw.recv()
+
+
+def bench_adr():
+    from mbxmon import MbxMon
+    from lora_adr import LinkAdr
+    a, b, node, gw = pair("adr", rssi=-100, snr=4.0)
+    acking_gateway(gw)
+    powers = {}
+    tx_done = a.tx_done
+
+    def count_power(tx):
+        powers[tx.power] = powers.get(tx.power, 0) + 1
+        tx_done(tx)
+
+    a.tx_done = count_power
+    adr = LinkAdr(node, spreading_factor=10, tx_power=17)
+    mon = MbxMon(node, Logger(Logger.ERROR), Pin("LED"), Pin("RED"), Pin("GREEN"), min_interval_ms=10_000, adr=adr)
+    run_for(mon, 3600)
+    air.link(a, b, rssi=-112, snr=-8.0)
+    run_for(mon, 3600)
+    gw.standby()
+    print("adr, 2 h: {} frames, {} lost, {} changes, frames per dBm {}".format(
+        a.tx_packets, adr.lost, adr.changes, dict(sorted(powers.items()))))
+
+
+def bench_energy():
+    from mbxmon import MbxMon
+    from lora_adr import LinkAdr
+    print("\n{:<10} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+        "energy 1h", "r.sleep", "standby", "tx", "rx", "mcu run", "mcu slp", "mAh", "days"))
+    for low_power in (False, True):
+        a, b, node, gw = pair("energy%d" % low_power, rssi=-100, snr=4.0)
+        acking_gateway(gw)
+        adr = LinkAdr(node, spreading_factor=10, tx_power=17)
+        mon = MbxMon(node, Logger(Logger.ERROR), Pin("LED"), Pin("RED"), Pin("GREEN"), min_interval_ms=60_000,
+                     adr=adr, low_power=low_power)
+        run_for(mon, 3600)
+        gw.standby()
+        r = mon.energy.report()
+        print("{:<10} {:>7.0f}s {:>7.0f}s {:>7.1f}s {:>7.1f}s {:>7.0f}s {:>7.0f}s {:>8.2f} {:>8.0f}".format(
+            "low power" if low_power else "default", r["radio_sleep_ms"] / 1000, r["radio_standby_ms"] / 1000,
+            r["radio_tx_ms"] / 1000, r["radio_rx_ms"] / 1000, r["mcu_run_ms"] / 1000, r["mcu_sleep_ms"] / 1000,
+            r["mah"], mon.energy.battery_days(2000)))
+
+
+def bounce(door, t_us, level, bounces=4):
+    # A reed switch chatters for a few ms before it settles
+    for i in range(bounces):
+        air.at(t_us + i * 1500, lambda v=i % 2: door.value(level ^ v ^ 1))
+    air.at(t_us + bounces * 1500, lambda: door.value(level))
+
+
+def bench_mailbox():
+    from mbxmon import MbxMon
+    from lora_adr import LinkAdr
+    from log_ship import ShipSink
+    print("\n{:<12} {:>8} {:>8} {:>8} {:>8}   {}".format("mailbox 1h", "frames", "airtime", "mA", "days", "reports"))
+    for door_switch, logs in ((False, False), (True, False), (True, True)):
+        a, b, node, gw = pair("door%d%d" % (door_switch, logs), rssi=-100, snr=4.0)
+        received = []
+        acking_gateway(gw, received)
+        door = Pin("DOOR", value=0)
+        t0 = air.now_us
+        # Mail at 10 min (open, close), 25 min (opened twice in a row), 40 min
+        for t, level in ((600, 1), (604, 0), (1500, 1), (1502, 0), (1503, 1), (1506, 0), (2400, 1), (2403, 0)):
+            bounce(door, t0 + t * 1e6, level)
+        adr = LinkAdr(node, spreading_factor=10, tx_power=17)
+        ship = ShipSink(max_bytes=512) if logs else None
+        logger = Logger(Logger.INFO, sinks=[ship]) if logs else Logger(Logger.ERROR)
+        mon = MbxMon(node, logger, Pin("LED"), Pin("RED"), Pin("GREEN"), min_interval_ms=60_000,
+                     adr=adr, low_power=True, door_pin=door if door_switch else None, log_ship=ship)
+        run_for(mon, 3600)
+        gw.standby()
+        reports = [fields(MSG_MAILBOX, data) for pkt in received for t, data in records(pkt) if t == MSG_MAILBOX]
+        # The last (heartbeat) wait may run past the hour, compare mean currents
+        print("{:<12} {:>8} {:>7.1f}s {:>8.3f} {:>8.0f}   {}".format(
+            "door + logs" if logs else "door switch" if door_switch else "ping 1/min", a.tx_packets,
+            a.tx_airtime_us / 1e6, mon.energy.average_ma(), mon.energy.battery_days(2000), reports))
+        if logs:
+            lines = [bytes(data) for pkt in received for t, data in records(pkt) if t == MSG_LOG]
+            print("{:<12} {} lines shipped ({} B), {} dropped, {} queued".format(
+                "", len(lines), sum(len(x) for x in lines), ship.dropped, len(ship.lines)))
+
+
+def main() -> None:
+    bench_airtime()
+    bench_raw()
+    bench_rx_during_send()
+    bench_reliable()
+    bench_mbxmon()
+    bench_adr()
+    bench_energy()
+    bench_mailbox()
+    print("\nairwave: {} sent, {} delivered, {} lost, {} collisions".format(
+        air.sent, air.delivered, air.lost, air.collisions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Host shim - lets the MicroPython modules in this repo run under CPython
+
+Installs stand-ins for the `machine` and `micropython` modules and adds the
+MicroPython-only helpers to `time` (sleep_ms, ticks_ms, ticks_diff, ...).
+Call `install()` before importing any device code; it also puts `shared/` on
+sys.path:
+
+    import host_shim
+    host_shim.install()
+    from lora import LoRa
+
+`RegisterSPI` is a minimal SX127x stand-in: a register file plus FIFO behind
+the `machine.SPI` interface. It counts SPI calls, CS transactions, bytes on
+the wire and temporary buffers so driver changes can be measured on a host.
+"""
+
+import os
+import sys
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED = os.path.join(ROOT, "shared")
+
+_T0 = time.monotonic_ns()
+
+
+def _ticks_ms():
+  return ((time.monotonic_ns() - _T0) // 1000000) & 0x3fffffff
+
+
+def _ticks_us():
+  return ((time.monotonic_ns() - _T0) // 1000) & 0x3fffffff
+
+
+def _ticks_add(t, delta):
+  return (t + delta) & 0x3fffffff
+
+
+def _ticks_diff(a, b):
+  d = (a - b) & 0x3fffffff
+  return d - 0x40000000 if d & 0x20000000 else d
+
+
+class Pin:
+  """GPIO stand-in. Listeners are notified on every level change and the
+  registered IRQ handler runs on matching edges (like a soft IRQ)."""
+
+  IN = 0
+  OUT = 1
+  PULL_UP = 1
+  PULL_DOWN = 2
+  IRQ_FALLING = 4
+  IRQ_RISING = 8
+
+  # IRQ handlers run so far, on any pin
+  irqs = 0
+
+  def __init__(self, id=None, mode=-1, pull=-1, value=None):
+    self.id = id
+    self._value = 0 if value is None else value
+    self._handler = None
+    self._trigger = 0
+    self.listeners = []
+
+  def init(self, mode=-1, pull=-1, value=None):
+    if value is not None:
+      self.value(value)
+
+  def value(self, v=None):
+    if v is None:
+      return self._value
+    v = 1 if v else 0
+    old = self._value
+    self._value = v
+    if old != v:
+      for fn in self.listeners:
+        fn(v)
+      if self._handler:
+        if (v and self._trigger & Pin.IRQ_RISING) or (not v and self._trigger & Pin.IRQ_FALLING):
+          Pin.irqs += 1
+          self._handler(self)
+    return None
+
+  def on(self):
+    self.value(1)
+
+  def off(self):
+    self.value(0)
+
+  def toggle(self):
+    self.value(not self._value)
+
+  def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+    self._handler = handler
+    self._trigger = trigger if handler else 0
+
+
+class PWM:
+  def __init__(self, pin, freq=0, duty_u16=0):
+    self.pin = pin
+
+  def init(self, freq=0, duty_u16=0):
+    pass
+
+  def freq(self, f=None):
+    pass
+
+  def duty_u16(self, d=None):
+    pass
+
+  def deinit(self):
+    pass
+
+
+class RegisterSPI:
+  """`machine.SPI` stand-in backed by an SX127x style register file.
+
+  The first byte of a CS transaction is the address (bit 7 set for a write);
+  following bytes auto-increment the address, except the FIFO register which
+  streams through the FIFO at REG_FIFO_ADDR_PTR. Writing REG_IRQ_FLAGS clears
+  the written bits. Entering TX mode completes the transmission at once.
+  """
+
+  REG_FIFO = 0x00
+  REG_OP_MODE = 0x01
+  REG_FIFO_ADDR_PTR = 0x0d
+  REG_IRQ_FLAGS = 0x12
+  REG_VERSION = 0x42
+
+  def __init__(self, cs):
+    self.regs = bytearray(0x80)
+    self.fifo = bytearray(256)
+    self.regs[self.REG_VERSION] = 0x12
+    self.cs = cs
+    cs.listeners.append(self._cs_changed)
+    self._addr = None
+    self._wr = False
+    self._known = set()
+    self.reset_counters()
+
+  def reset_counters(self):
+    self.calls = 0
+    self.transactions = 0
+    self.bytes = 0
+    self.temp_buffers = 0
+
+  def track(self, *bufs):
+    """Mark long-lived buffers so they are not counted as temporaries."""
+    for b in bufs:
+      self._known.add(id(b))
+
+  def _count(self, buf):
+    self.calls += 1
+    if id(buf) not in self._known:
+      self.temp_buffers += 1
+
+  def _cs_changed(self, v):
+    if v == 0:
+      self.transactions += 1
+    self._addr = None
+
+  # Register side effects, overridden by richer simulators
+
+  def read_reg(self, addr):
+    if addr == self.REG_FIFO:
+      ptr = self.regs[self.REG_FIFO_ADDR_PTR]
+      self.regs[self.REG_FIFO_ADDR_PTR] = (ptr + 1) & 0xff
+      return self.fifo[ptr]
+    return self.regs[addr]
+
+  def write_reg(self, addr, value):
+    if addr == self.REG_FIFO:
+      ptr = self.regs[self.REG_FIFO_ADDR_PTR]
+      self.regs[self.REG_FIFO_ADDR_PTR] = (ptr + 1) & 0xff
+      self.fifo[ptr] = value
+    elif addr == self.REG_IRQ_FLAGS:
+      self.regs[addr] &= ~value & 0xff
+    elif addr == self.REG_OP_MODE:
+      self.regs[addr] = value
+      if value & 0x07 == 0x03:
+        # TX completes instantly: set TxDone and fall back to standby
+        self.regs[self.REG_IRQ_FLAGS] |= 0x08
+        self.regs[addr] = (value & 0xf8) | 0x01
+    else:
+      self.regs[addr] = value
+
+  def _xfer(self, out):
+    self.bytes += 1
+    if self.cs.value():
+      return 0
+    if self._addr is None:
+      self._addr = out & 0x7f
+      self._wr = bool(out & 0x80)
+      return 0
+    addr = self._addr
+    if self._wr:
+      self.write_reg(addr, out)
+      res = 0
+    else:
+      res = self.read_reg(addr)
+    if addr != self.REG_FIFO:
+      self._addr = (addr + 1) & 0x7f
+    return res
+
+  # machine.SPI interface
+
+  def init(self, *args, **kw):
+    pass
+
+  def write(self, buf):
+    self._count(buf)
+    for b in buf:
+      self._xfer(b)
+
+  def read(self, nbytes, write=0x00):
+    self.calls += 1
+    self.temp_buffers += 1
+    return bytes(self._xfer(write) for _ in range(nbytes))
+
+  def readinto(self, buf, write=0x00):
+    self._count(buf)
+    for i in range(len(buf)):
+      buf[i] = self._xfer(write)
+
+  def write_readinto(self, write_buf, read_buf):
+    self._count(write_buf)
+    self._count(read_buf)
+    self.calls -= 1
+    for i in range(len(write_buf)):
+      read_buf[i] = self._xfer(write_buf[i])
+
+
+class SPI(RegisterSPI):
+  """Constructor-compatible `machine.SPI` so device scripts can import it."""
+
+  def __init__(self, id=0, *args, **kw):
+    RegisterSPI.__init__(self, Pin("CS", value=1))
+
+
+def _schedule(fn, arg):
+  fn(arg)
+
+
+class ThreadSafeFlag:
+  """asyncio.ThreadSafeFlag stand-in; wait() clears the flag like on device."""
+
+  def __init__(self):
+    self._event = None
+    self._pending = False
+
+  def _ev(self):
+    import asyncio
+    if self._event is None:
+      self._event = asyncio.Event()
+      if self._pending:
+        self._event.set()
+    return self._event
+
+  def set(self):
+    try:
+      self._ev().set()
+    except RuntimeError:
+      self._pending = True
+
+  def clear(self):
+    self._pending = False
+    if self._event is not None:
+      self._event.clear()
+
+  async def wait(self):
+    await self._ev().wait()
+    self._event.clear()
+    self._pending = False
+
+
+def install():
+  """Register the fake modules and time helpers and put shared/ on sys.path."""
+  if "machine" not in sys.modules:
+    machine = types.ModuleType("machine")
+    machine.Pin = Pin
+    machine.PWM = PWM
+    machine.SPI = SPI
+    machine.idle = lambda: None
+    machine.lightsleep = lambda ms=0: time.sleep(ms / 1000)
+    machine.deepsleep = lambda ms=0: time.sleep(ms / 1000)
+    machine.freq = lambda *a: 125000000
+    sys.modules["machine"] = machine
+  if "micropython" not in sys.modules:
+    mp = types.ModuleType("micropython")
+    mp.const = lambda x: x
+    mp.schedule = _schedule
+    mp.alloc_emergency_exception_buf = lambda n: None
+    sys.modules["micropython"] = mp
+  import gc
+  if not hasattr(gc, "mem_free"):
+    gc.mem_free = lambda: 1 << 20
+    gc.mem_alloc = lambda: 0
+  time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+  time.sleep_us = lambda us: time.sleep(us / 1000000)
+  time.ticks_ms = _ticks_ms
+  time.ticks_us = _ticks_us
+  time.ticks_add = _ticks_add
+  time.ticks_diff = _ticks_diff
+  # shared/logging.py shadows the stdlib module; let asyncio bind the real
+  # one first, then hand the name over to the device Logger
+  import asyncio
+  asyncio.ThreadSafeFlag = ThreadSafeFlag
+  asyncio.sleep_ms = lambda ms: asyncio.sleep(ms / 1000)
+  asyncio.wait_for_ms = lambda aw, ms: asyncio.wait_for(aw, ms / 1000)
+  if SHARED not in sys.path:
+    sys.modules.pop("logging", None)
+    sys.path.insert(0, SHARED)
+  if "internal" not in sys.modules:
+    # The gateway and garage controller import shared modules from their
+    # internal/ package (symlinks); here it is shared/ itself
+    internal = types.ModuleType("internal")
+    internal.__path__ = [SHARED]
+    sys.modules["internal"] = internal
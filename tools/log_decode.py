@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Decode binary logs written by shared/logging.py back into text lines.
+
+Reads files from FileSink(binary=True) (or any stream of BinaryEncoder
+records) and prints them the way the console sink would have:
+
+    python3 tools/log_decode.py mbxmon.blog.1 mbxmon.blog
+    python3 tools/log_decode.py --epoch 2000 mbxmon.blog
+
+--epoch is the year the device's time.time() counts from (1970 on the rp2).
+"""
+import argparse
+import calendar
+import struct
+import time
+
+import host_shim
+
+host_shim.install()
+
+from logging import Logger, REC_LOG, REC_SOURCE, REC_TEMPLATE, REC_TIME, LOG_HEADER, TIME_HEADER, DEF_HEADER, \
+    ARG_INT8, ARG_INT16, ARG_INT, ARG_FLOAT, ARG_STR, ARG_BOOL, ARG_NONE, NO_TEMPLATE
+
+LOG_LEN = struct.calcsize(LOG_HEADER)
+TIME_LEN = struct.calcsize(TIME_HEADER)
+DEF_LEN = struct.calcsize(DEF_HEADER)
+
+
+def _args(data, i, argc):
+    args = []
+    for _ in range(argc):
+        kind = data[i]
+        i += 1
+        if kind == ARG_INT8:
+            args.append(struct.unpack_from(">b", data, i)[0])
+            i += 1
+        elif kind == ARG_INT16:
+            args.append(struct.unpack_from(">h", data, i)[0])
+            i += 2
+        elif kind == ARG_INT:
+            args.append(struct.unpack_from(">i", data, i)[0])
+            i += 4
+        elif kind == ARG_FLOAT:
+            args.append(round(struct.unpack_from(">f", data, i)[0], 6))
+            i += 4
+        elif kind == ARG_STR:
+            n = data[i]
+            args.append(bytes(data[i + 1:i + 1 + n]).decode("utf-8", "replace"))
+            i += 1 + n
+        elif kind == ARG_BOOL:
+            args.append(bool(data[i]))
+            i += 1
+        elif kind == ARG_NONE:
+            args.append(None)
+        else:
+            raise ValueError("Unknown arg type 0x%02x at %d" % (kind, i - 1))
+    return args, i
+
+
+def decode(data, epoch=1970):
+    """Yield the text line of every REC_LOG in data; definitions and
+    REC_TIME update the string tables and the clock as they come"""
+    offset = calendar.timegm((epoch, 1, 1, 0, 0, 0))
+    sources = {}
+    templates = {}
+    sec = 0
+    i = 0
+    while i < len(data):
+        kind = data[i]
+        if kind in (REC_SOURCE, REC_TEMPLATE):
+            _, ident, n = struct.unpack_from(DEF_HEADER, data, i)
+            text = bytes(data[i + DEF_LEN:i + DEF_LEN + n]).decode("utf-8", "replace")
+            (sources if kind == REC_SOURCE else templates)[ident] = text
+            i += DEF_LEN + n
+        elif kind == REC_TIME:
+            sec = struct.unpack_from(TIME_HEADER, data, i)[1]
+            i += TIME_LEN
+        elif kind == REC_LOG:
+            _, level, ms, src, tpl, argc = struct.unpack_from(LOG_HEADER, data, i)
+            args, i = _args(data, i + LOG_LEN, argc)
+            if tpl == NO_TEMPLATE:
+                msg, args = args[0], args[1:]
+            else:
+                msg = templates.get(tpl, "<template %d>" % tpl)
+            try:
+                message = msg.format(*args) if args else msg
+            except (IndexError, KeyError, ValueError):
+                message = "%s %r" % (msg, args)
+            t = time.gmtime(sec + offset)
+            yield "[{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}.{:03d}] {} {} - {}".format(
+                t[0], t[1], t[2], t[3], t[4], t[5], ms, Logger._LEVEL_NAMES.get(level, str(level)),
+                sources.get(src, "<source %d>" % src), message)
+        else:
+            raise ValueError("Unknown record type 0x%02x at %d" % (kind, i))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="binary log files, oldest first")
+    parser.add_argument("--epoch", type=int, default=1970, help="year the device's time.time() counts from")
+    opts = parser.parse_args()
+    for path in opts.files:
+        with open(path, "rb") as f:
+            for line in decode(f.read(), opts.epoch):
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
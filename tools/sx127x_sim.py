@@ -0,0 +1,412 @@
+"""
+SX127x simulator - several LoRa radios on a virtual airwave
+
+Builds on host_shim: `SimRadio` is a `RegisterSPI` whose register file
+behaves like the SX1276 LoRa modem (operating modes, FIFO TX/RX base
+addresses, IRQ flags, DIO0 mapping, packet RSSI/SNR), and an `Airwave`
+links the radios. A packet is on air for the time the transmitter's modem
+registers give (SF, bandwidth, coding rate, preamble, header, CRC, LDRO),
+radios receiving on the same channel get it when it ends, and packets that
+overlap on a channel or arrive below the demodulation floor of their SF are
+lost. Link RSSI/SNR are given for 17 dBm and follow the TX power setting.
+
+Time is virtual. Every SPI byte costs 8 bit times at `spi_hz`, and
+`time.sleep*`, `machine.idle`/`lightsleep` and asyncio (through a virtual
+event loop used by `asyncio.run`) skip ahead to the next radio event, so an
+hour of traffic runs in seconds and latencies are reproducible. DIO0 edges
+are delivered when no CS is asserted, like a soft IRQ, and end a
+lightsleep like on the rp2.
+
+    import sx127x_sim
+    air = sx127x_sim.install()
+    from lora import LoRa
+    a, b = air.radio("a"), air.radio("b")
+    node = LoRa(a, cs=a.cs, rx=a.dio0, frequency=915.0)
+    gateway = LoRa(b, cs=b.cs, rx=b.dio0, frequency=915.0)
+    air.link(a, b, rssi=-110, snr=-2.5, loss=0.1)
+
+Call `install()` instead of `host_shim.install()` and before importing any
+device code (the driver binds sleep/ticks/idle at import).
+"""
+
+import asyncio
+import heapq
+import math
+import random
+import selectors
+import time
+
+import host_shim
+
+REG_FIFO = 0x00
+REG_OP_MODE = 0x01
+REG_FRF_MSB = 0x06
+REG_FRF_LSB = 0x08
+REG_PA_CONFIG = 0x09
+REG_LNA = 0x0c
+REG_FIFO_TX_BASE_ADDR = 0x0e
+REG_FIFO_RX_BASE_ADDR = 0x0f
+REG_FIFO_RX_CURRENT_ADDR = 0x10
+REG_IRQ_FLAGS = 0x12
+REG_RX_NB_BYTES = 0x13
+REG_PKT_SNR_VALUE = 0x19
+REG_PKT_RSSI_VALUE = 0x1a
+REG_MODEM_CONFIG_1 = 0x1d
+REG_MODEM_CONFIG_2 = 0x1e
+REG_PREAMBLE_MSB = 0x20
+REG_PREAMBLE_LSB = 0x21
+REG_PAYLOAD_LENGTH = 0x22
+REG_MODEM_CONFIG_3 = 0x26
+REG_SYNC_WORD = 0x39
+REG_DIO_MAPPING_1 = 0x40
+
+MODE_STDBY = 0x01
+MODE_TX = 0x03
+MODE_RX_CONTINUOUS = 0x05
+MODE_RX_SINGLE = 0x06
+
+IRQ_TX_DONE = 0x08
+IRQ_CRC_ERROR = 0x20
+IRQ_RX_DONE = 0x40
+
+BANDWIDTHS = (7800, 10400, 15600, 20800, 31250, 41700, 62500, 125000, 250000, 500000)
+
+# (rssi dBm, snr dB, loss probability) at REF_POWER of radio pairs without a link()
+DEFAULT_LINK = (-60, 9.5, 0.0)
+REF_POWER = 17
+
+# Lowest SNR (dB) demodulated per spreading factor
+SNR_FLOOR = {6: -5.0, 7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}
+
+_TICKS_MASK = 0x3fffffff
+
+
+class Transmission:
+  """A packet on air."""
+
+  def __init__(self, radio, payload, channel, start_us, end_us):
+    self.radio = radio
+    self.power = radio.tx_power()
+    self.payload = payload
+    self.channel = channel
+    self.start_us = start_us
+    self.end_us = end_us
+    self.collided = False
+    self.aborted = False
+
+
+class Airwave:
+  """Virtual clock, event queue and the shared channel of the SimRadios.
+
+  Counters: sent (packets put on air), delivered (packet receptions),
+  lost (receptions dropped by link loss or collisions), collisions
+  (overlapping transmission pairs).
+  """
+
+  def __init__(self, spi_hz=1_000_000, seed=1):
+    self.now_us = 0.0
+    self.us_per_byte = 8_000_000 / spi_hz
+    self.random = random.Random(seed)
+    self.radios = []
+    self._links = {}
+    self._events = []
+    self._n = 0
+    self._running = False
+    self._on_air = []
+    self.sent = 0
+    self.delivered = 0
+    self.lost = 0
+    self.collisions = 0
+
+  def radio(self, name="radio"):
+    """A new SimRadio on this airwave"""
+    return SimRadio(self, name)
+
+  def link(self, a, b, rssi=-60, snr=9.5, loss=0.0):
+    """Set the RSSI/SNR a and b hear each other with at REF_POWER and the
+    probability a packet between them is lost"""
+    self._links[(a, b)] = self._links[(b, a)] = (rssi, snr, loss)
+
+  # Virtual time
+
+  def at(self, t_us, fn):
+    """Run fn() at virtual time t_us"""
+    self._n += 1
+    heapq.heappush(self._events, (t_us, self._n, fn))
+
+  def advance(self, us):
+    """Let us microseconds pass without running events (CPU/SPI time)"""
+    self.now_us += us
+
+  def run_due(self):
+    """Run the events that are due. Nested calls (from an event handler
+    doing SPI) return at once, the outer call picks up what they left."""
+    if self._running:
+      return
+    self._running = True
+    try:
+      while self._events and self._events[0][0] <= self.now_us:
+        heapq.heappop(self._events)[2]()
+    finally:
+      self._running = False
+
+  def wait(self, us=None):
+    """Pass time until the next event, but at most us microseconds (no
+    limit when None), and run what falls due"""
+    if self._events and (us is None or self._events[0][0] <= self.now_us + us):
+      self.now_us = max(self.now_us, self._events[0][0])
+    elif us is None:
+      raise RuntimeError("Simulation stalled: nothing left to wait for")
+    else:
+      self.now_us += us
+    self.run_due()
+
+  def sleep_us(self, us):
+    """Pass us microseconds, running the events in between"""
+    end = self.now_us + us
+    if self._running:
+      # Sleeping inside an event handler, the outer run_due catches up
+      self.now_us = end
+      return
+    while self._events and self._events[0][0] <= end:
+      self.now_us = max(self.now_us, self._events[0][0])
+      self.run_due()
+    self.now_us = max(self.now_us, end)
+
+  def lightsleep_us(self, us=None):
+    """sleep_us that returns after the first pin IRQ, like
+    machine.lightsleep; without us it waits for one"""
+    irqs = host_shim.Pin.irqs
+    if us is None:
+      while host_shim.Pin.irqs == irqs:
+        self.wait()
+      return
+    end = self.now_us + us
+    if self._running:
+      self.now_us = end
+      return
+    while self._events and self._events[0][0] <= end:
+      self.now_us = max(self.now_us, self._events[0][0])
+      self.run_due()
+      if host_shim.Pin.irqs != irqs:
+        return
+    self.now_us = max(self.now_us, end)
+
+  def ticks_us(self):
+    return int(self.now_us) & _TICKS_MASK
+
+  def ticks_ms(self):
+    return int(self.now_us // 1000) & _TICKS_MASK
+
+  # Channel
+
+  def transmit(self, radio, payload, airtime_us):
+    tx = Transmission(radio, payload, radio.channel(), self.now_us, self.now_us + airtime_us)
+    for other in self._on_air:
+      if other.channel == tx.channel:
+        other.collided = tx.collided = True
+        self.collisions += 1
+    self._on_air.append(tx)
+    self.sent += 1
+    self.at(tx.end_us, lambda: self._finish(tx))
+    return tx
+
+  def _finish(self, tx):
+    self._on_air.remove(tx)
+    if tx.aborted:
+      return
+    tx.radio.tx_done(tx)
+    for r in self.radios:
+      if r is tx.radio or not r.hears(tx):
+        continue
+      rssi, snr, loss = self._links.get((tx.radio, r), DEFAULT_LINK)
+      rssi += tx.power - REF_POWER
+      snr += tx.power - REF_POWER
+      if tx.collided or snr < SNR_FLOOR[tx.channel[2]] or (loss and self.random.random() < loss):
+        self.lost += 1
+        continue
+      r.rx_done(tx.payload, rssi, snr)
+      self.delivered += 1
+
+
+class SimRadio(host_shim.RegisterSPI):
+  """One simulated SX1276 behind the `machine.SPI` interface.
+
+  Pass the radio as the driver's spi, `cs` as its cs pin and `dio0` as
+  its rx pin. Counters: tx_packets, rx_packets, tx_airtime_us.
+  """
+
+  def __init__(self, air, name="radio"):
+    self.air = air
+    self.name = name
+    self.dio0 = host_shim.Pin(name + ".DIO0")
+    host_shim.RegisterSPI.__init__(self, host_shim.Pin(name + ".CS", value=1))
+    # Power-on values of the registers the model looks at
+    self.regs[REG_OP_MODE] = MODE_STDBY
+    self.regs[REG_FRF_MSB:REG_FRF_LSB + 1] = b"\x6c\x80\x00"
+    self.regs[REG_PA_CONFIG] = 0x4f
+    self.regs[REG_LNA] = 0x20
+    self.regs[REG_MODEM_CONFIG_1] = 0x72
+    self.regs[REG_MODEM_CONFIG_2] = 0x70
+    self.regs[REG_PREAMBLE_LSB] = 0x08
+    self.regs[REG_SYNC_WORD] = 0x12
+    self._tx = None
+    self._rx_since = None
+    self.tx_packets = 0
+    self.rx_packets = 0
+    self.tx_airtime_us = 0.0
+    air.radios.append(self)
+
+  def channel(self):
+    """What a receiver has to match: frequency, bandwidth, SF, sync word"""
+    r = self.regs
+    return bytes(r[REG_FRF_MSB:REG_FRF_LSB + 1]), r[REG_MODEM_CONFIG_1] >> 4, r[REG_MODEM_CONFIG_2] >> 4, \
+        r[REG_SYNC_WORD]
+
+  def tx_power(self):
+    """Output power in dBm set by REG_PA_CONFIG"""
+    pa = self.regs[REG_PA_CONFIG]
+    return 2 + (pa & 0x0f) if pa & 0x80 else pa & 0x0f
+
+  def airtime_us(self, n):
+    """Time on air of an n byte payload with the current modem registers"""
+    r = self.regs
+    mc1 = r[REG_MODEM_CONFIG_1]
+    mc2 = r[REG_MODEM_CONFIG_2]
+    sf = mc2 >> 4
+    t_sym = (1 << sf) * 1000000 / BANDWIDTHS[mc1 >> 4]
+    de = (r[REG_MODEM_CONFIG_3] >> 3) & 1
+    ih = mc1 & 1
+    crc = (mc2 >> 2) & 1
+    cr = (mc1 >> 1) & 7
+    preamble = (r[REG_PREAMBLE_MSB] << 8) | r[REG_PREAMBLE_LSB]
+    x = 8 * n - 4 * sf + 28 + 16 * crc - 20 * ih
+    symbols = 8 + max(math.ceil(x / (4 * (sf - 2 * de))) * (cr + 4), 0)
+    return (preamble + 4.25 + symbols) * t_sym
+
+  def hears(self, tx):
+    # In RX on the same channel since before the preamble started
+    return self._rx_since is not None and self._rx_since <= tx.start_us and self.channel() == tx.channel
+
+  # Events from the airwave
+
+  def tx_done(self, tx):
+    self._tx = None
+    self.tx_packets += 1
+    self.tx_airtime_us += tx.end_us - tx.start_us
+    self.regs[REG_IRQ_FLAGS] |= IRQ_TX_DONE
+    self.regs[REG_OP_MODE] = (self.regs[REG_OP_MODE] & 0xf8) | MODE_STDBY
+    self._update_dio0()
+
+  def rx_done(self, payload, rssi, snr):
+    base = self.regs[REG_FIFO_RX_BASE_ADDR]
+    for i, b in enumerate(payload):
+      self.fifo[(base + i) & 0xff] = b
+    r = self.regs
+    r[REG_FIFO_RX_CURRENT_ADDR] = base
+    r[REG_RX_NB_BYTES] = len(payload)
+    hf = r[REG_FRF_MSB] >= 0xc3  # 779 MHz and up
+    r[REG_PKT_RSSI_VALUE] = min(max(rssi + (157 if hf else 164), 0), 255)
+    r[REG_PKT_SNR_VALUE] = int(snr * 4) & 0xff
+    r[REG_IRQ_FLAGS] |= IRQ_RX_DONE
+    self.rx_packets += 1
+    if self.regs[REG_OP_MODE] & 0x07 == MODE_RX_SINGLE:
+      self._set_mode((self.regs[REG_OP_MODE] & 0xf8) | MODE_STDBY)
+    self._update_dio0()
+
+  def _update_dio0(self):
+    mapping = self.regs[REG_DIO_MAPPING_1] >> 6
+    flags = self.regs[REG_IRQ_FLAGS]
+    level = (mapping == 0 and flags & IRQ_RX_DONE) or (mapping == 1 and flags & IRQ_TX_DONE)
+    self.dio0.value(1 if level else 0)
+
+  # Register side effects
+
+  def _set_mode(self, value):
+    old = self.regs[REG_OP_MODE] & 0x07
+    mode = value & 0x07
+    self.regs[REG_OP_MODE] = value
+    if old == MODE_TX and mode != MODE_TX and self._tx:
+      self._tx.aborted = True
+      self._tx = None
+    if mode == MODE_TX and old != MODE_TX:
+      n = self.regs[REG_PAYLOAD_LENGTH]
+      base = self.regs[REG_FIFO_TX_BASE_ADDR]
+      payload = bytes(self.fifo[(base + i) & 0xff] for i in range(n))
+      self._tx = self.air.transmit(self, payload, self.airtime_us(n))
+    if mode in (MODE_RX_CONTINUOUS, MODE_RX_SINGLE):
+      if self._rx_since is None:
+        self._rx_since = self.air.now_us
+    else:
+      self._rx_since = None
+
+  def write_reg(self, addr, value):
+    if addr == REG_OP_MODE:
+      self._set_mode(value)
+    else:
+      host_shim.RegisterSPI.write_reg(self, addr, value)
+
+  def _xfer(self, out):
+    if not self.cs.value():
+      self.air.advance(self.air.us_per_byte)
+    return host_shim.RegisterSPI._xfer(self, out)
+
+  def _cs_changed(self, v):
+    host_shim.RegisterSPI._cs_changed(self, v)
+    if v:
+      # Transaction over: DIO0 follows the new flags/mapping, IRQs may run
+      self._update_dio0()
+      self.air.run_due()
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+  # Never blocks: instead of waiting for the timeout it moves virtual time
+
+  def __init__(self, air):
+    super().__init__()
+    self._air = air
+
+  def select(self, timeout=None):
+    ready = super().select(0)
+    if ready:
+      return ready
+    self._air.wait(None if timeout is None else timeout * 1000000)
+    return []
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+  """asyncio loop running on the airwave's virtual clock"""
+
+  def __init__(self, air):
+    super().__init__(_VirtualSelector(air))
+    self._air = air
+
+  def time(self):
+    return self._air.now_us / 1000000
+
+
+class _VirtualPolicy(asyncio.DefaultEventLoopPolicy):
+
+  def __init__(self, air):
+    super().__init__()
+    self._air = air
+
+  def new_event_loop(self):
+    return VirtualEventLoop(self._air)
+
+
+def install(air=None):
+  """host_shim.install() with time, machine.idle/lightsleep and asyncio
+  running on air's virtual clock. Returns the Airwave."""
+  host_shim.install()
+  air = air or Airwave()
+  time.sleep = lambda s: air.sleep_us(s * 1000000)
+  time.sleep_ms = lambda ms: air.sleep_us(ms * 1000)
+  time.sleep_us = air.sleep_us
+  time.ticks_ms = air.ticks_ms
+  time.ticks_us = air.ticks_us
+  import machine
+  machine.idle = lambda: air.wait(1000)
+  machine.lightsleep = lambda ms=0: air.lightsleep_us(ms * 1000 if ms else None)
+  asyncio.set_event_loop_policy(_VirtualPolicy(air))
+  return air